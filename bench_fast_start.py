@@ -0,0 +1,142 @@
+"""
+Cold start (Popen of a fresh interpreter) vs. warm start (fork from zygote.py).
+
+Measures time-to-ready of a script that imports the usual hosted-bot stack,
+then keeps N instances alive and compares RSS with USS/PSS to show how much
+memory the zygote children share copy-on-write.
+
+    python bench_fast_start.py --starts 20 --instances 10
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import psutil
+
+import zygote
+
+SCRIPT = """
+import sys, time
+{imports}
+print("ready", flush=True)
+time.sleep({hold})
+"""
+
+
+def wait_ready(log_path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
+                if "ready" in f.read():
+                    return True
+        except FileNotFoundError:
+            pass
+        time.sleep(0.001)
+    raise TimeoutError(f"script did not become ready: {log_path}")
+
+
+def cold_start(script, cwd, log_path):
+    log = open(log_path, "w")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script], cwd=cwd, stdout=log, stderr=log, stdin=subprocess.PIPE)
+    wait_ready(log_path)
+    elapsed = time.perf_counter() - t0
+    log.close()
+    return proc.pid, elapsed
+
+
+def warm_start(sock, script, cwd, log_path):
+    log = open(log_path, "w")
+    r, w = os.pipe()
+    t0 = time.perf_counter()
+    pid = zygote.spawn(sock, script, cwd, r, log.fileno())
+    wait_ready(log_path)
+    elapsed = time.perf_counter() - t0
+    os.close(r)
+    os.close(w)
+    log.close()
+    return pid, elapsed
+
+
+def memory(pids):
+    rss = uss = pss = 0
+    for pid in pids:
+        try:
+            info = psutil.Process(pid).memory_full_info()
+            rss += info.rss
+            uss += info.uss
+            pss += getattr(info, "pss", 0)
+        except psutil.Error:
+            pass
+    return rss, uss, pss
+
+
+def kill(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, 9)
+        except OSError:
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+def run(label, start_fn, starts, instances):
+    times, pids = [], []
+    for i in range(max(starts, instances)):
+        pid, elapsed = start_fn(i)
+        times.append(elapsed * 1000)
+        pids.append(pid)
+        if len(pids) > instances:
+            kill([pids.pop(0)])
+    rss, uss, pss = memory(pids)
+    mb = 1024 * 1024
+    print(f"{label:<5} start ms  p50 {statistics.median(times):7.1f}  "
+          f"p95 {sorted(times)[int(len(times) * 0.95) - 1]:7.1f}  min {min(times):7.1f}")
+    print(f"{label:<5} {len(pids)} alive   RSS {rss / mb:7.1f} MB  USS {uss / mb:7.1f} MB  PSS {pss / mb:7.1f} MB")
+    kill(pids)
+    return statistics.median(times), uss
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--starts", type=int, default=20)
+    ap.add_argument("--instances", type=int, default=10, help="instances kept alive for the memory comparison")
+    ap.add_argument("--preload", default=zygote.DEFAULT_PRELOAD)
+    args = ap.parse_args()
+
+    modules = [m for m in args.preload.split(",") if m]
+    available = zygote.preload(modules)
+    work = tempfile.mkdtemp(prefix="bench_fast_start_")
+    script = os.path.join(work, "bot_script.py")
+    with open(script, "w") as f:
+        f.write(SCRIPT.format(imports="\n".join(f"import {m}" for m in available), hold=600))
+    print(f"script imports: {', '.join(available) or '(none installed)'}")
+
+    cold_ms, cold_uss = run("cold", lambda i: cold_start(script, work, os.path.join(work, f"cold{i}.log")),
+                            args.starts, args.instances)
+
+    sock = os.path.join(work, "zygote.sock")
+    t0 = time.perf_counter()
+    zproc = zygote.start_server(sock, preload_modules=available)
+    print(f"zygote boot {(time.perf_counter() - t0) * 1000:.0f} ms (one-off)")
+    try:
+        warm_ms, warm_uss = run("warm", lambda i: warm_start(sock, script, work, os.path.join(work, f"warm{i}.log")),
+                                args.starts, args.instances)
+    finally:
+        zproc.terminate()
+        zproc.wait()
+
+    print(f"speedup p50 x{cold_ms / warm_ms:.1f}, private memory (USS) x{cold_uss / max(warm_uss, 1):.1f} smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Headless run of the "⚡ Bot Speed" suite against a local fake Bot API.
+
+    python bench_speed.py --rounds 50 --json speed.json
+    python bench_speed.py --rounds 50 --baseline speed.json   # exit 1 on regression
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+from fake_bot_api import FakeBotAPI
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated network latency per API call")
+    ap.add_argument("--json", help="write p50/p95/p99 per component to this file")
+    ap.add_argument("--baseline", help="compare against a previous --json output")
+    ap.add_argument("--tolerance", type=float, default=1.5, help="allowed p95 ratio vs. baseline")
+    args = ap.parse_args()
+
+    # Keep the benchmark away from the real database and upload folders.
+    work = tempfile.mkdtemp(prefix="bench_speed_")
+    os.environ.setdefault("UPLOAD_BOTS_DIR", os.path.join(work, "upload_bots"))
+    os.environ.setdefault("IROTECH_DIR", os.path.join(work, "inf"))
+    os.environ.setdefault("BOT_TOKEN", "1:bench")
+
+    server = FakeBotAPI(latency_ms=args.latency_ms).start()
+    import telebot
+    telebot.apihelper.API_URL = server.api_url
+    import bot
+
+    samples = bot.run_speed_suite(chat_id=1, rounds=args.rounds)
+    server.stop()
+    print(bot.format_speed_report(samples).replace("```", "").strip())
+
+    summary = {
+        name: {p: round(bot.percentile(vals, int(p[1:])), 3) for p in ("p50", "p95", "p99")}
+        for name, vals in samples.items()
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rounds": args.rounds, "latency_ms": args.latency_ms, "components": summary}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)["components"]
+        failed = []
+        for name, cur in summary.items():
+            ref = base.get(name, {}).get("p95")
+            if ref and cur["p95"] > ref * args.tolerance:
+                failed.append(f"{name}: p95 {cur['p95']:.1f}ms > {ref:.1f}ms x {args.tolerance}")
+        if failed:
+            print("REGRESSION:\n  " + "\n  ".join(failed))
+            sys.exit(1)
+        print("No regression vs. baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Benchmark of the per-user state store (bot.StateStore) against the old
+layout: {user_id: [(file_name, file_type), ...]} with linear scans for
+(user, file) lookups and a full list rebuild on every save/remove.
+
+    python bench_state_store.py                        # 100k users / 500k files
+    python bench_state_store.py --users 10000 --files 50000 --json state.json
+
+The DB is a throwaway SQLite file filled with --files rows; --heavy-users
+users get --heavy-files files each (admins may keep up to ADMIN_LIMIT).
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+
+def legacy_lookup(files: list, file_name: str):
+    return next((x[1] for x in files if x[0] == file_name), None)
+
+
+def legacy_save(cache: dict, user_id: int, file_name: str, file_type: str):
+    files = cache.get(user_id)
+    if files is not None:
+        cache[user_id] = [(fn, ft) for fn, ft in files if fn != file_name] + [(file_name, file_type)]
+
+
+def legacy_remove(cache: dict, user_id: int, file_name: str):
+    files = cache.get(user_id)
+    if files is not None:
+        cache[user_id] = [x for x in files if x[0] != file_name]
+
+
+def timed(fn, n: int) -> float:
+    """Nanoseconds per call."""
+    t0 = time.perf_counter_ns()
+    fn()
+    return (time.perf_counter_ns() - t0) / max(n, 1)
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--files", type=int, default=500_000)
+    ap.add_argument("--heavy-users", type=int, default=20)
+    ap.add_argument("--heavy-files", type=int, default=999)
+    ap.add_argument("--lookups", type=int, default=1_000_000)
+    ap.add_argument("--writes", type=int, default=100_000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    work = tempfile.mkdtemp(prefix="bench_state_")
+    os.environ.setdefault("UPLOAD_BOTS_DIR", os.path.join(work, "upload_bots"))
+    os.environ.setdefault("IROTECH_DIR", os.path.join(work, "inf"))
+    os.environ.setdefault("BOT_TOKEN", "1:bench")
+    os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot
+
+    # --- fill the DB ---
+    heavy = list(range(1, args.heavy_users + 1))
+    rows = [(uid, f"job_{i}.py", "py") for uid in heavy for i in range(args.heavy_files)]
+    remaining = args.files - len(rows)
+    light = list(range(args.heavy_users + 1, args.users + 1))
+    for i in range(remaining):
+        uid = light[i % len(light)] if i < len(light) else rng.choice(light)
+        rows.append((uid, f"bot_{i}.{'py' if i % 4 else 'js'}", "py" if i % 4 else "js"))
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(bot.DATABASE_PATH)
+    conn.executemany("INSERT OR REPLACE INTO user_files (user_id, file_name, file_type) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    print(f"DB: {len(rows)} files for {args.users} users ({args.heavy_users} with {args.heavy_files}) "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+    by_user = {}
+    for uid, fn, ft in rows:
+        by_user.setdefault(uid, []).append((fn, ft))
+    users = list(by_user)
+    results = {"params": vars(args)}
+
+    # --- memory: both layouts built from the same fresh full scan ---
+    def scan():
+        conn = sqlite3.connect(bot.DATABASE_PATH)
+        grouped = {}
+        for uid, fn, ft in conn.execute("SELECT user_id, file_name, file_type FROM user_files"):
+            grouped.setdefault(uid, []).append((fn, ft))
+        conn.close()
+        return grouped
+
+    def build_legacy():
+        return {uid: [(fn, ft) for fn, ft in files] for uid, files in scan().items()}
+
+    def build_store():
+        s = bot.StateStore(args.users)
+        for uid, files in scan().items():
+            s.load_files(uid, files)
+        return s
+
+    legacy, legacy_bytes = measure_memory(build_legacy)
+    _, store_bytes = measure_memory(build_store)
+    results["memory_bytes_per_file"] = {"legacy": round(legacy_bytes / len(rows), 1),
+                                        "store": round(store_bytes / len(rows), 1)}
+
+    # --- cold load through the DB path (one query per user), every user once ---
+    bot.user_state = store = bot.StateStore(args.users)
+    t0 = time.perf_counter()
+    for uid in users:
+        bot.get_user_files(uid)
+    results["load_users_per_s"] = round(len(users) / (time.perf_counter() - t0))
+    assert store.cached_files() == len(rows)
+
+    # --- (user, file) lookups: hits on light and heavy users, plus misses ---
+    probes = []
+    for _ in range(args.lookups):
+        uid = rng.choice(heavy) if heavy and rng.random() < 0.1 else rng.choice(users)
+        fn = rng.choice(by_user[uid])[0] if rng.random() < 0.9 else "missing.py"
+        probes.append((uid, fn))
+    results["lookup_ns"] = {
+        "legacy": round(timed(lambda: [legacy_lookup(legacy[u], f) for u, f in probes], len(probes))),
+        "store": round(timed(lambda: [bot.get_user_file_type(u, f) for u, f in probes], len(probes))),
+    }
+    heavy_probes = [(u, f) for u, f in probes if u in by_user and len(by_user[u]) >= args.heavy_files]
+    if heavy_probes:
+        results["heavy_lookup_ns"] = {
+            "legacy": round(timed(lambda: [legacy_lookup(legacy[u], f) for u, f in heavy_probes], len(heavy_probes))),
+            "store": round(timed(lambda: [bot.get_user_file_type(u, f) for u, f in heavy_probes], len(heavy_probes))),
+        }
+
+    # --- in-memory save/remove (the DB write itself is the same for both) ---
+    writes = [(rng.choice(users), f"new_{i}.py") for i in range(args.writes)]
+
+    def legacy_churn():
+        for uid, fn in writes:
+            legacy_save(legacy, uid, fn, "py")
+            legacy_remove(legacy, uid, fn)
+
+    def store_churn():
+        for uid, fn in writes:
+            store.put_file(uid, fn, "py")
+            store.remove_file(uid, fn)
+
+    results["save_remove_ns"] = {"legacy": round(timed(legacy_churn, len(writes))),
+                                 "store": round(timed(store_churn, len(writes)))}
+
+    # --- concurrent readers/writers through the real DB functions ---
+    # Threads work on disjoint users; afterwards every touched user must match the DB.
+    own = [users[i::args.threads][:200] for i in range(args.threads)]
+    errors = []
+
+    def worker(mine):
+        r = random.Random(id(mine))
+        try:
+            for n in range(300):
+                uid = r.choice(mine)
+                fn = f"t_{n % 7}.py"
+                if n % 3 == 0:
+                    bot.save_user_file(uid, fn, "py")
+                elif n % 3 == 1:
+                    bot.remove_user_file_db(uid, fn)
+                else:
+                    bot.get_user_file_type(uid, fn)
+                    len(bot.get_user_files(uid))
+        except Exception as e:
+            errors.append(repr(e))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(mine,)) for mine in own]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    conc_s = time.perf_counter() - t0
+    conn = sqlite3.connect(bot.DATABASE_PATH)
+    mismatched = 0
+    for mine in own:
+        for uid in mine:
+            db = dict(conn.execute("SELECT file_name, file_type FROM user_files WHERE user_id=?", (uid,)).fetchall())
+            mismatched += db != dict(bot.get_user_files(uid))
+    conn.close()
+    results["concurrent"] = {"threads": args.threads, "ops_per_s": round(args.threads * 300 / conc_s),
+                             "errors": errors[:5], "mismatched_users": mismatched}
+
+    print(f"load (DB -> store):   {results['load_users_per_s']:>10} users/s")
+    print(f"{'':22}{'legacy':>10}{'store':>10}")
+    print(f"{'bytes per file':<22}{results['memory_bytes_per_file']['legacy']:>10}{results['memory_bytes_per_file']['store']:>10}")
+    for key, label in (("lookup_ns", "lookup ns"), ("heavy_lookup_ns", "heavy-user lookup ns"),
+                       ("save_remove_ns", "save+remove ns")):
+        if key in results:
+            print(f"{label:<22}{results[key]['legacy']:>10}{results[key]['store']:>10}")
+    c = results["concurrent"]
+    print(f"concurrent: {c['threads']} threads, {c['ops_per_s']} DB ops/s, "
+          f"{len(c['errors'])} errors, {c['mismatched_users']} users out of sync with the DB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if c["errors"] or c["mismatched_users"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
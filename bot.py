@@ -1,36 +1,89 @@
 import os
 import sys
 import re
+import ast
+import hashlib
+import hmac
 import time
 import json
 import atexit
 import shutil
+import stat
+import gzip
 import signal
 import zipfile
 import sqlite3
-import psutil
 import tempfile
 import logging
 import threading
 import subprocess
-import requests
+import random
+import queue
+import heapq
+import importlib
+import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as futures_wait
+from contextlib import contextmanager
+from functools import wraps, partial
+from urllib.parse import quote
+
+# Startup timeline in ms, see startup_report() and `python bot.py --startup-profile`
+_BOOT_T0 = time.perf_counter()
+startup_marks = {}
+
+def mark_startup(name: str):
+    startup_marks.setdefault(name, round((time.perf_counter() - _BOOT_T0) * 1000, 1))
+
+def startup_report() -> str:
+    return " | ".join(f"{k} {v:.0f}ms" for k, v in startup_marks.items())
+
+class _LazyModule:
+    """Module proxy that imports on first attribute access (keeps it off the startup path)."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return getattr(module, attr)
+
+psutil = _LazyModule("psutil")
+requests = _LazyModule("requests")
 
 import telebot
 from telebot import types
 
+mark_startup("telebot_imported")
+
 # --- Flask Keep Alive (Railway uses PORT) ---
-from flask import Flask
 from threading import Thread
 
-app = Flask("")
+app = None  # built by run_flask(); Flask is only imported on the keep-alive thread
 
-@app.route("/")
-def home():
-    return "I'am Atx File Host"
+def create_app():
+    from flask import Flask
+    flask_app = Flask("")
+
+    @flask_app.route("/")
+    def home():
+        return "I'am Atx File Host"
+
+    register_control_api(flask_app)
+    return flask_app
 
 def run_flask():
+    global app
+    app = create_app()
+    mark_startup("flask_ready")
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port)
 
@@ -54,23 +107,154 @@ FREE_USER_LIMIT = int(os.environ.get("FREE_USER_LIMIT", "2"))
 SUBSCRIBED_USER_LIMIT = int(os.environ.get("SUBSCRIBED_USER_LIMIT", "15"))
 ADMIN_LIMIT = int(os.environ.get("ADMIN_LIMIT", "999"))
 OWNER_LIMIT = float("inf")
+TIER_LIMITS = {"owner": OWNER_LIMIT, "admin": ADMIN_LIMIT, "premium": SUBSCRIBED_USER_LIMIT, "free": FREE_USER_LIMIT}
+TIER_LABELS = {"owner": "👑 Owner", "admin": "🛡️ Admin", "premium": "⭐ Premium", "free": "🆓 Free User"}
+_MB = 1024 * 1024
+TIER_DISK_QUOTAS = {
+    "owner": float("inf"),
+    "admin": int(os.environ.get("DISK_QUOTA_ADMIN_MB", "5000")) * _MB,
+    "premium": int(os.environ.get("DISK_QUOTA_PREMIUM_MB", "500")) * _MB,
+    "free": int(os.environ.get("DISK_QUOTA_FREE_MB", "50")) * _MB,
+}
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-UPLOAD_BOTS_DIR = os.path.join(BASE_DIR, "upload_bots")
-IROTECH_DIR = os.path.join(BASE_DIR, "inf")
+UPLOAD_BOTS_DIR = os.environ.get("UPLOAD_BOTS_DIR", os.path.join(BASE_DIR, "upload_bots"))
+IROTECH_DIR = os.environ.get("IROTECH_DIR", os.path.join(BASE_DIR, "inf"))
 DATABASE_PATH = os.path.join(IROTECH_DIR, "bot_data.db")
 
 os.makedirs(UPLOAD_BOTS_DIR, exist_ok=True)
 os.makedirs(IROTECH_DIR, exist_ok=True)
 
+# Control API on the Flask app (see CONTROL API); disabled unless a token is set.
+CONTROL_API_TOKEN = os.environ.get("CONTROL_API_TOKEN", "")
+
+# Self-hosted Bot API server (or the load-test fake); default is api.telegram.org.
+BOT_API_URL = os.environ.get("BOT_API_URL", "").rstrip("/")
+if BOT_API_URL:
+    telebot.apihelper.API_URL = BOT_API_URL + "/bot{0}/{1}"
+    telebot.apihelper.FILE_URL = BOT_API_URL + "/file/bot{0}/{1}"
+
 # Initialize bot
 bot = telebot.TeleBot(TOKEN, threaded=True)
 
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "5000"))
+
+class UserRecord:
+    __slots__ = ("files", "active", "version")
+
+    def __init__(self):
+        self.files = None    # {file_name: file_type} once loaded from the DB
+        self.active = None   # None until looked up
+        self.version = 0
+
+
+class StateStore:
+    """
+    Thread-safe per-user state (file index, active flag) loaded on demand and
+    bounded as an LRU of `maxsize` users. (user, file) lookups are dict hits.
+    Every change stamps the record with a new store-wide version, so anything
+    derived from a record stays valid while its version is unchanged, even
+    across eviction and reload.
+    """
+    NOT_LOADED = object()
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.version = 0
+        self._users = OrderedDict()  # {user_id: UserRecord}, least recently used first
+        self._lock = threading.Lock()
+
+    def _record(self, user_id: int, create: bool = False):
+        rec = self._users.get(user_id)
+        if rec is not None:
+            self._users.move_to_end(user_id)
+        elif create:
+            rec = self._users[user_id] = UserRecord()
+            while len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+        return rec
+
+    def _changed(self, rec: UserRecord):
+        self.version += 1
+        rec.version = self.version
+
+    def user_version(self, user_id: int) -> int:
+        with self._lock:
+            rec = self._users.get(user_id)
+            return rec.version if rec else 0
+
+    def listing(self, user_id: int):
+        """[(file_name, file_type), ...], or None if not loaded."""
+        with self._lock:
+            rec = self._record(user_id)
+            if rec is None or rec.files is None:
+                return None
+            return list(rec.files.items())
+
+    def count(self, user_id: int):
+        with self._lock:
+            rec = self._record(user_id)
+            if rec is None or rec.files is None:
+                return None
+            return len(rec.files)
+
+    def file_type(self, user_id: int, file_name: str):
+        """file_type, None if the user has no such file, or NOT_LOADED."""
+        with self._lock:
+            rec = self._record(user_id)
+            if rec is None or rec.files is None:
+                return self.NOT_LOADED
+            return rec.files.get(file_name)
+
+    def load_files(self, user_id: int, rows) -> list:
+        with self._lock:
+            rec = self._record(user_id, create=True)
+            rec.files = {fn: sys.intern(ft) for fn, ft in rows}
+            self._changed(rec)
+            return list(rec.files.items())
+
+    def put_file(self, user_id: int, file_name: str, file_type: str):
+        with self._lock:
+            rec = self._record(user_id)
+            if rec is not None and rec.files is not None:
+                rec.files[file_name] = sys.intern(file_type)
+                self._changed(rec)
+
+    def remove_file(self, user_id: int, file_name: str):
+        with self._lock:
+            rec = self._record(user_id)
+            if rec is not None and rec.files is not None and rec.files.pop(file_name, None) is not None:
+                self._changed(rec)
+
+    def is_active(self, user_id: int):
+        """True/False, or None if not looked up yet."""
+        with self._lock:
+            rec = self._record(user_id)
+            return rec.active if rec else None
+
+    def set_active(self, user_id: int, active: bool):
+        with self._lock:
+            rec = self._record(user_id, create=True)
+            if rec.active != active:
+                rec.active = active
+                self._changed(rec)
+
+    def __len__(self):
+        return len(self._users)
+
+    def cached_files(self) -> int:
+        with self._lock:
+            return sum(len(rec.files) for rec in self._users.values() if rec.files)
+
 # Runtime memory
 bot_scripts = {}            # {script_key: {...}}
+stats = {"total_files": 0, "total_users": 0}  # aggregate counters, see STATS
+running_keys = {}           # {script_key: owner_id}
+running_by_user = {}        # {user_id: running script count}
 user_subscriptions = {}     # {user_id: {'expiry': datetime}}
-user_files = {}             # {user_id: [(file_name, file_type), ...]}
-active_users = set()
+premium_users = set()       # cached tier: users whose subscription hasn't expired yet
+_expiry_heap = []           # [(expiry, user_id)] min-heap, see SUBSCRIPTIONS
+user_state = StateStore(USER_CACHE_SIZE)  # per-user files + active flag, see get_user_files()
 admin_ids = {ADMIN_ID, OWNER_ID}
 bot_locked = False
 
@@ -81,12 +265,188 @@ logging.basicConfig(
 )
 logger = logging.getLogger("bot")
 
-DB_LOCK = threading.Lock()
+
+# =========================
+# TRACING / PROFILING
+# =========================
+# Spans are sampled per root span (a handler, or a DB/subprocess call made
+# outside any handler); children inherit the decision. 0 disables tracing.
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(IROTECH_DIR, "traces.jsonl"))
+PROFILE_MAX_SECONDS = int(os.environ.get("PROFILE_MAX_SECONDS", "120"))
+
+_trace_local = threading.local()
+_trace_queue = queue.Queue(maxsize=10000)
+_trace_writer_started = False
+_trace_writer_lock = threading.Lock()
+_profile_lock = threading.Lock()
+
+def _trace_writer():
+    while True:
+        batch = [_trace_queue.get()]
+        while len(batch) < 500:
+            try:
+                batch.append(_trace_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                for rec in batch:
+                    f.write(json.dumps(rec, default=str) + "\n")
+        except Exception as e:
+            logger.error(f"Trace export failed: {e}")
+        finally:
+            for _ in batch:
+                _trace_queue.task_done()
+
+def _export_span(rec: dict):
+    global _trace_writer_started
+    if not _trace_writer_started:
+        with _trace_writer_lock:
+            if not _trace_writer_started:
+                threading.Thread(target=_trace_writer, daemon=True, name="trace-writer").start()
+                _trace_writer_started = True
+    try:
+        _trace_queue.put_nowait(rec)
+    except queue.Full:
+        pass  # drop spans rather than block the hot path
+
+def flush_traces(timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while _trace_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+@contextmanager
+def trace_span(name: str, **attrs):
+    if TRACE_SAMPLE_RATE <= 0:
+        yield
+        return
+    stack = getattr(_trace_local, "stack", None)
+    if stack is None:
+        stack = _trace_local.stack = []
+    if stack:
+        parent = stack[-1]
+        sampled, trace_id, parent_id = parent["sampled"], parent["trace_id"], parent["span_id"]
+    else:
+        sampled = random.random() < TRACE_SAMPLE_RATE
+        trace_id, parent_id = os.urandom(8).hex(), None
+    frame = {"sampled": sampled, "trace_id": trace_id, "span_id": os.urandom(4).hex(), "attrs": attrs}
+    stack.append(frame)
+    start_wall = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - t0) * 1000
+        stack.pop()
+        if sampled:
+            _export_span({
+                "trace_id": trace_id,
+                "span_id": frame["span_id"],
+                "parent_id": parent_id,
+                "name": name,
+                "ts": start_wall,
+                "duration_ms": round(duration_ms, 3),
+                "thread": threading.current_thread().name,
+                "error": error,
+                **frame["attrs"],
+            })
+
+def trace_annotate(**attrs):
+    """Attach attributes to the innermost open span of this thread."""
+    stack = getattr(_trace_local, "stack", None)
+    if stack:
+        stack[-1]["attrs"].update(attrs)
+
+def traced(name: str):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace_span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+class TracedLock:
+    """threading.Lock that reports contention (time spent waiting) as a span."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if TRACE_SAMPLE_RATE <= 0:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            with trace_span(f"{self.name}.wait"):
+                self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        return False
+
+    def acquire(self, *args, **kwargs):
+        return self._lock.acquire(*args, **kwargs)
+
+    def release(self):
+        self._lock.release()
+
+# Every Bot API round trip goes through apihelper._make_request.
+_orig_make_request = telebot.apihelper._make_request
+
+def _traced_make_request(token, method_name, *args, **kwargs):
+    with trace_span(f"api.{method_name}"):
+        result = _orig_make_request(token, method_name, *args, **kwargs)
+    if method_name == "getUpdates" and "first_update" not in startup_marks:
+        mark_startup("first_poll")
+        if result:
+            mark_startup("first_update")
+            logger.info(f"Startup: {startup_report()}")
+    return result
+
+telebot.apihelper._make_request = _traced_make_request
+
+def capture_profile(seconds: float, interval: float = 0.005) -> str:
+    """
+    Statistical profiler: samples every thread's stack (not just the caller's,
+    which is all cProfile would see) and returns folded stacks, the input
+    format of flamegraph.pl / speedscope.
+    """
+    counts = {}
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(tid, str(tid)))
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        time.sleep(interval)
+    return "\n".join(f"{k} {v}" for k, v in sorted(counts.items())) + "\n"
+
+DB_LOCK = TracedLock("db.lock")
 
 
 # =========================
 # DATABASE
 # =========================
+def _add_column_if_missing(c, table: str, column: str, decl: str):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in c.fetchall()}:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
 def init_db():
     logger.info(f"Initializing DB: {DATABASE_PATH}")
     conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
@@ -94,6 +454,7 @@ def init_db():
 
     c.execute("""CREATE TABLE IF NOT EXISTS subscriptions
                  (user_id INTEGER PRIMARY KEY, expiry TEXT)""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_expiry ON subscriptions (expiry)")
 
     c.execute("""CREATE TABLE IF NOT EXISTS user_files
                  (user_id INTEGER, file_name TEXT, file_type TEXT,
@@ -113,6 +474,39 @@ def init_db():
                   file_name TEXT,
                   file_type TEXT,
                   created_at TEXT)""")
+    _add_column_if_missing(c, "pending_approvals", "content_hash", "TEXT")
+    _add_column_if_missing(c, "pending_approvals", "risk_score", "INTEGER DEFAULT 0")
+
+    # Pre-scan results, keyed by sha256 of the uploaded bytes
+    c.execute("""CREATE TABLE IF NOT EXISTS scan_cache
+                 (content_hash TEXT PRIMARY KEY,
+                  risk_score INTEGER,
+                  findings TEXT,
+                  scanned_at TEXT)""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS approved_hashes
+                 (content_hash TEXT PRIMARY KEY, approved_at TEXT)""")
+
+    # Scheduled (cron / interval) runs, see SCHEDULED RUNS
+    c.execute("""CREATE TABLE IF NOT EXISTS script_schedules
+                 (user_id INTEGER, file_name TEXT,
+                  spec TEXT,
+                  max_runtime INTEGER,
+                  overlap TEXT,
+                  PRIMARY KEY (user_id, file_name))""")
+    c.execute("""CREATE TABLE IF NOT EXISTS script_runs
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  file_name TEXT,
+                  started_at TEXT,
+                  finished_at TEXT,
+                  exit_code INTEGER,
+                  status TEXT)""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_script_runs_file ON script_runs (user_id, file_name, id)")
+
+    # Scratch row rewritten by the ⚡ Bot Speed sqlite probe
+    c.execute("""CREATE TABLE IF NOT EXISTS speed_probe
+                 (id INTEGER PRIMARY KEY, ts TEXT)""")
 
     c.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (OWNER_ID,))
     if ADMIN_ID != OWNER_ID:
@@ -122,6 +516,10 @@ def init_db():
     conn.close()
 
 def load_data():
+    """
+    Load the small global tables and the aggregate counts. Per-user data
+    (files, active flag) is loaded on demand by get_user_files / is_active_user.
+    """
     logger.info("Loading DB data into memory...")
     conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
     c = conn.cursor()
@@ -130,20 +528,20 @@ def load_data():
     c.execute("SELECT user_id, expiry FROM subscriptions")
     for user_id, expiry in c.fetchall():
         try:
-            user_subscriptions[int(user_id)] = {"expiry": datetime.fromisoformat(expiry)}
+            user_id, expiry = int(user_id), datetime.fromisoformat(expiry)
         except Exception:
-            pass
-
-    # user files
-    c.execute("SELECT user_id, file_name, file_type FROM user_files")
-    for user_id, fn, ft in c.fetchall():
-        user_id = int(user_id)
-        user_files.setdefault(user_id, []).append((fn, ft))
-
-    # active users
-    c.execute("SELECT user_id FROM active_users")
-    for (uid,) in c.fetchall():
-        active_users.add(int(uid))
+            continue
+        user_subscriptions[user_id] = {"expiry": expiry}
+        if expiry > datetime.now():
+            premium_users.add(user_id)
+        # already-lapsed rows are expired as soon as the scheduler starts
+        heapq.heappush(_expiry_heap, (expiry, user_id))
+
+    # counts for the stats aggregate
+    c.execute("SELECT COUNT(*) FROM user_files")
+    stats["total_files"] = c.fetchone()[0]
+    c.execute("SELECT COUNT(*) FROM active_users")
+    stats["total_users"] = c.fetchone()[0]
 
     # admins
     c.execute("SELECT user_id FROM admins")
@@ -151,77 +549,213 @@ def load_data():
         admin_ids.add(int(uid))
 
     conn.close()
-    logger.info(f"Loaded: users={len(active_users)}, subs={len(user_subscriptions)}, admins={len(admin_ids)}")
+    logger.info(f"Loaded: users={stats['total_users']}, files={stats['total_files']}, subs={len(user_subscriptions)}, admins={len(admin_ids)}")
 
 init_db()
 load_data()
+mark_startup("db_ready")
 
 
 # =========================
 # DB OPERATIONS
 # =========================
+@traced("db.is_active_user")
+def is_active_user(user_id: int) -> bool:
+    active = user_state.is_active(user_id)
+    if active is not None:
+        return active
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM active_users WHERE user_id=?", (user_id,))
+        found = c.fetchone() is not None
+        conn.close()
+        # under DB_LOCK so a concurrent add_active_user can't be overwritten
+        user_state.set_active(user_id, found)
+    return found
+
+@traced("db.add_active_user")
 def add_active_user(user_id: int):
-    active_users.add(user_id)
     with DB_LOCK:
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
         c = conn.cursor()
         c.execute("INSERT OR IGNORE INTO active_users (user_id) VALUES (?)", (user_id,))
+        added = c.rowcount > 0
         conn.commit()
         conn.close()
-
+        user_state.set_active(user_id, True)
+    if added:
+        stats_user_added(user_id)
+
+@traced("db.get_user_files")
+def get_user_files(user_id: int) -> list:
+    """[(file_name, file_type), ...] for one user, read from the DB on a cache miss."""
+    files = user_state.listing(user_id)
+    if files is not None:
+        return files
+    # Load under DB_LOCK so a concurrent save/remove can't be overwritten by a stale read.
+    with DB_LOCK:
+        files = user_state.listing(user_id)
+        if files is None:
+            conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+            c = conn.cursor()
+            c.execute("SELECT file_name, file_type FROM user_files WHERE user_id=?", (user_id,))
+            files = user_state.load_files(user_id, c.fetchall())
+            conn.close()
+    return files
+
+def get_user_file_type(user_id: int, file_name: str):
+    """file_type of one of the user's files, or None if there is no such file."""
+    ft = user_state.file_type(user_id, file_name)
+    if ft is StateStore.NOT_LOADED:
+        ft = dict(get_user_files(user_id)).get(file_name)
+    return ft
+
+@traced("db.save_user_file")
 def save_user_file(user_id: int, file_name: str, file_type: str):
     with DB_LOCK:
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
         c = conn.cursor()
+        c.execute("SELECT 1 FROM user_files WHERE user_id=? AND file_name=?", (user_id, file_name))
+        is_new = c.fetchone() is None
         c.execute(
             "INSERT OR REPLACE INTO user_files (user_id, file_name, file_type) VALUES (?, ?, ?)",
             (user_id, file_name, file_type),
         )
         conn.commit()
         conn.close()
+        user_state.put_file(user_id, file_name, file_type)
+    if is_new:
+        stats_file_added(user_id)
 
-    user_files.setdefault(user_id, [])
-    user_files[user_id] = [(fn, ft) for fn, ft in user_files[user_id] if fn != file_name]
-    user_files[user_id].append((file_name, file_type))
-
+@traced("db.remove_user_file_db")
 def remove_user_file_db(user_id: int, file_name: str):
     with DB_LOCK:
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
         c = conn.cursor()
         c.execute("DELETE FROM user_files WHERE user_id=? AND file_name=?", (user_id, file_name))
+        removed = c.rowcount > 0
         conn.commit()
         conn.close()
+        user_state.remove_file(user_id, file_name)
+    if removed:
+        stats_file_removed(user_id)
 
-    if user_id in user_files:
-        user_files[user_id] = [x for x in user_files[user_id] if x[0] != file_name]
-        if not user_files[user_id]:
-            del user_files[user_id]
+@traced("db.save_subscription")
+def save_subscription_db(user_id: int, expiry: datetime):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO subscriptions (user_id, expiry) VALUES (?, ?)",
+            (user_id, expiry.isoformat()),
+        )
+        conn.commit()
+        conn.close()
+
+@traced("db.delete_subscription")
+def delete_subscription_db(user_id: int):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("DELETE FROM subscriptions WHERE user_id=?", (user_id,))
+        conn.commit()
+        conn.close()
 
-def add_pending_approval(user_id: int, chat_id: int, file_name: str, file_type: str) -> int:
+@traced("db.add_pending_approval")
+def add_pending_approval(user_id: int, chat_id: int, file_name: str, file_type: str,
+                         content_hash: str = None, risk_score: int = 0) -> int:
     with DB_LOCK:
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
         c = conn.cursor()
         c.execute(
-            "INSERT INTO pending_approvals (user_id, chat_id, file_name, file_type, created_at) VALUES (?, ?, ?, ?, ?)",
-            (user_id, chat_id, file_name, file_type, datetime.now().isoformat()),
+            "INSERT INTO pending_approvals (user_id, chat_id, file_name, file_type, created_at, content_hash, risk_score) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, chat_id, file_name, file_type, datetime.now().isoformat(), content_hash, risk_score),
         )
         conn.commit()
         pid = c.lastrowid
         conn.close()
         return pid
 
+@traced("db.get_pending_approval")
 def get_pending_approval(pending_id: int):
     with DB_LOCK:
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
         c = conn.cursor()
         c.execute(
-            "SELECT id, user_id, chat_id, file_name, file_type FROM pending_approvals WHERE id=?",
+            "SELECT id, user_id, chat_id, file_name, file_type, content_hash FROM pending_approvals WHERE id=?",
             (pending_id,),
         )
         row = c.fetchone()
         conn.close()
         return row
 
+@traced("db.list_pending_approvals")
+def list_pending_approvals(offset: int, limit: int):
+    """Pending uploads, riskiest first: [(id, user_id, file_name, file_type, risk_score, findings_json)]."""
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM pending_approvals")
+        total = c.fetchone()[0]
+        c.execute(
+            "SELECT p.id, p.user_id, p.file_name, p.file_type, COALESCE(p.risk_score, 0), s.findings "
+            "FROM pending_approvals p LEFT JOIN scan_cache s ON s.content_hash = p.content_hash "
+            "ORDER BY COALESCE(p.risk_score, 0) DESC, p.id LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        rows = c.fetchall()
+        conn.close()
+        return total, rows
+
+@traced("db.get_scan_cache")
+def get_scan_cache(content_hash: str):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("SELECT risk_score, findings FROM scan_cache WHERE content_hash=?", (content_hash,))
+        row = c.fetchone()
+        conn.close()
+    if not row:
+        return None
+    return row[0], json.loads(row[1] or "[]")
+
+@traced("db.save_scan_cache")
+def save_scan_cache(content_hash: str, risk_score: int, findings: list):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO scan_cache (content_hash, risk_score, findings, scanned_at) VALUES (?, ?, ?, ?)",
+            (content_hash, risk_score, json.dumps(findings), datetime.now().isoformat()),
+        )
+        conn.commit()
+        conn.close()
+
+@traced("db.mark_hash_approved")
+def mark_hash_approved(content_hash: str):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR IGNORE INTO approved_hashes (content_hash, approved_at) VALUES (?, ?)",
+            (content_hash, datetime.now().isoformat()),
+        )
+        conn.commit()
+        conn.close()
+
+@traced("db.is_hash_approved")
+def is_hash_approved(content_hash: str) -> bool:
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM approved_hashes WHERE content_hash=?", (content_hash,))
+        row = c.fetchone()
+        conn.close()
+        return row is not None
+
+@traced("db.delete_pending_approval")
 def delete_pending_approval(pending_id: int):
     with DB_LOCK:
         conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
@@ -230,6 +764,85 @@ def delete_pending_approval(pending_id: int):
         conn.commit()
         conn.close()
 
+@traced("db.save_schedule")
+def save_schedule_db(user_id: int, file_name: str, spec: str, max_runtime: int, overlap: str):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO script_schedules (user_id, file_name, spec, max_runtime, overlap) VALUES (?, ?, ?, ?, ?)",
+            (user_id, file_name, spec, max_runtime, overlap),
+        )
+        conn.commit()
+        conn.close()
+
+@traced("db.delete_schedule")
+def delete_schedule_db(user_id: int, file_name: str):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("DELETE FROM script_schedules WHERE user_id=? AND file_name=?", (user_id, file_name))
+        conn.commit()
+        conn.close()
+
+def load_schedules_db() -> list:
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("SELECT user_id, file_name, spec, max_runtime, overlap FROM script_schedules")
+        rows = c.fetchall()
+        conn.close()
+    return rows
+
+@traced("db.add_script_run")
+def add_script_run(user_id: int, file_name: str, status: str = "running") -> int:
+    """Insert a run row and trim that file's history to SCHEDULE_RUN_HISTORY rows."""
+    now = datetime.now().isoformat(timespec="seconds")
+    finished = now if status != "running" else None
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO script_runs (user_id, file_name, started_at, finished_at, status) VALUES (?, ?, ?, ?, ?)",
+            (user_id, file_name, now, finished, status),
+        )
+        run_id = c.lastrowid
+        c.execute(
+            "DELETE FROM script_runs WHERE user_id=? AND file_name=? AND id < ("
+            "SELECT MIN(id) FROM (SELECT id FROM script_runs WHERE user_id=? AND file_name=? ORDER BY id DESC LIMIT ?))",
+            (user_id, file_name, user_id, file_name, SCHEDULE_RUN_HISTORY),
+        )
+        conn.commit()
+        conn.close()
+    return run_id
+
+@traced("db.finish_script_run")
+def finish_script_run_db(run_id: int, exit_code, status: str):
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute(
+            "UPDATE script_runs SET finished_at=?, exit_code=?, status=? WHERE id=? AND status='running'",
+            (datetime.now().isoformat(timespec="seconds"), exit_code, status, run_id),
+        )
+        conn.commit()
+        conn.close()
+
+@traced("db.get_script_runs")
+def get_script_runs(user_id: int, file_name: str, limit: int = 10) -> list:
+    """[(started_at, finished_at, exit_code, status), ...] newest first."""
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute(
+            "SELECT started_at, finished_at, exit_code, status FROM script_runs "
+            "WHERE user_id=? AND file_name=? ORDER BY id DESC LIMIT ?",
+            (user_id, file_name, limit),
+        )
+        rows = c.fetchall()
+        conn.close()
+    return rows
+
 
 # =========================
 # HELPERS
@@ -240,25 +853,40 @@ def get_user_folder(user_id: int) -> str:
     return p
 
 def get_user_file_limit(user_id: int):
-    if user_id == OWNER_ID:
-        return OWNER_LIMIT
-    if user_id in admin_ids:
-        return ADMIN_LIMIT
-    if user_id in user_subscriptions and user_subscriptions[user_id].get("expiry", datetime.min) > datetime.now():
-        return SUBSCRIBED_USER_LIMIT
-    return FREE_USER_LIMIT
+    return TIER_LIMITS[get_user_tier(user_id)]
 
 def get_user_file_count(user_id: int) -> int:
-    return len(user_files.get(user_id, []))
+    count = user_state.count(user_id)
+    return count if count is not None else len(get_user_files(user_id))
+
+def reply_or_log(message_obj, text: str, **kwargs):
+    """bot.reply_to, or just a log line for unattended (scheduled) starts."""
+    if message_obj is None:
+        logger.info(f"[unattended] {text}")
+        return None
+    return bot.reply_to(message_obj, text, **kwargs)
+
+def md_escape(text) -> str:
+    """Escape user/script-controlled text for legacy Markdown messages."""
+    text = str(text)
+    for ch in ("_", "*", "`", "["):
+        text = text.replace(ch, "\\" + ch)
+    return text
 
 def is_bot_running(script_owner_id: int, file_name: str) -> bool:
     script_key = f"{script_owner_id}_{file_name}"
     info = bot_scripts.get(script_key)
     if not info or not info.get("process"):
         return False
+    if isinstance(info["process"], RemoteProcess):
+        if info["process"].poll() is None:
+            return True
+        drop_script(script_key, info)
+        return False
     try:
-        p = psutil.Process(info["process"].pid)
-        return p.is_running() and p.status() != psutil.STATUS_ZOMBIE
+        with trace_span("psutil.is_running"):
+            p = psutil.Process(info["process"].pid)
+            return p.is_running() and p.status() != psutil.STATUS_ZOMBIE
     except Exception:
         # cleanup
         try:
@@ -266,114 +894,1192 @@ def is_bot_running(script_owner_id: int, file_name: str) -> bool:
                 info["log_file"].close()
         except Exception:
             pass
-        bot_scripts.pop(script_key, None)
+        drop_script(script_key, info)
         return False
 
-def kill_process_tree(process_info: dict):
-    process = process_info.get("process")
-    script_key = process_info.get("script_key", "N/A")
+KILL_TIMEOUT = float(os.environ.get("KILL_TIMEOUT", "3"))
+SHUTDOWN_GRACE = float(os.environ.get("SHUTDOWN_GRACE", "8"))
+
+def _proc_alive(p) -> bool:
     try:
-        if process_info.get("log_file") and hasattr(process_info["log_file"], "close") and not process_info["log_file"].closed:
+        return p.is_running() and p.status() != psutil.STATUS_ZOMBIE
+    except Exception:
+        return False
+
+def _wait_until_gone(procs: list, timeout: float) -> list:
+    """
+    Poll until every process has exited or the deadline passes. Unlike
+    psutil.wait_procs, zombies (e.g. grandchildren whose parent never reaps) count as gone.
+    """
+    deadline = time.monotonic() + timeout
+    alive = [p for p in procs if _proc_alive(p)]
+    while alive and time.monotonic() < deadline:
+        time.sleep(0.1)
+        alive = [p for p in alive if _proc_alive(p)]
+    return alive
+
+def terminate_process_trees(process_infos: list, timeout: float) -> int:
+    """
+    SIGTERM every process tree at once, wait for all of them against a single
+    deadline, then SIGKILL whatever is left. Returns the number of processes killed.
+    """
+    remote = [i for i in process_infos if isinstance(i.get("process"), RemoteProcess)]
+    # Remote nodes stop their share in parallel with the local SIGTERM/wait below.
+    remote_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="remote-stop") if remote else None
+    remote_stop = remote_pool.submit(stop_remote, remote, timeout) if remote else None
+    procs = []
+    for info in process_infos:
+        log_file = info.get("log_file")
+        if log_file and hasattr(log_file, "close") and not log_file.closed:
             try:
-                process_info["log_file"].close()
+                log_file.close()
             except Exception:
                 pass
+        process = info.get("process")
+        if not process or not hasattr(process, "pid") or isinstance(process, RemoteProcess):
+            continue
+        try:
+            parent = psutil.Process(process.pid)
+            procs.extend(parent.children(recursive=True))
+            procs.append(parent)
+        except Exception:
+            pass
 
-        if not process or not hasattr(process, "pid"):
-            return
+    for p in procs:
+        try:
+            p.terminate()
+        except Exception:
+            pass
+    alive = _wait_until_gone(procs, timeout)
+    for p in alive:
+        try:
+            p.kill()
+        except Exception:
+            pass
+    if alive:
+        _wait_until_gone(alive, 1)
 
-        pid = process.pid
-        parent = psutil.Process(pid)
-        children = parent.children(recursive=True)
-        for ch in children:
-            try:
-                ch.terminate()
-            except Exception:
-                try:
-                    ch.kill()
-                except Exception:
-                    pass
-        psutil.wait_procs(children, timeout=1)
+    # Reap our direct children so Popen doesn't keep zombies around.
+    for info in process_infos:
         try:
-            parent.terminate()
-            parent.wait(timeout=1)
+            info["process"].poll()
         except Exception:
-            try:
-                parent.kill()
-            except Exception:
-                pass
+            pass
+    remote_killed = 0
+    if remote_pool:
+        remote_killed = remote_stop.result()
+        remote_pool.shutdown()
+    return len(alive) + remote_killed
 
-        logger.info(f"Killed process tree for {script_key} (PID {pid})")
+@traced("subprocess.kill_tree")
+def kill_process_tree(process_info: dict):
+    script_key = process_info.get("script_key", "N/A")
+    try:
+        killed = terminate_process_trees([process_info], KILL_TIMEOUT)
+        pid = getattr(process_info.get("process"), "pid", None)
+        logger.info(f"Stopped process tree for {script_key} (PID {pid}, {killed} force-killed)")
     except Exception as e:
         logger.error(f"kill_process_tree error {script_key}: {e}", exc_info=True)
 
 
 # =========================
-# MENU / MARKUP
+# STATS (maintained incrementally, served in O(1))
 # =========================
-def create_reply_keyboard_main_menu(user_id: int):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
+STATS_LOCK = threading.Lock()
+ADMIN_STATS_TTL = int(os.environ.get("ADMIN_STATS_TTL", "60"))
+_admin_stats_cache = {"at": 0.0, "text": ""}
 
-    base = [
-        ["📢 Updates Channel"],
-        ["📤 Upload File", "📂 Check Files"],
-        ["⚡ Bot Speed", "📊 Statistics"],
-        ["📞 @AHMED_SNDE"]
-    ]
-    admin_extra = [
-        ["🔒 Lock Bot", "🟢 Running All Code"],
-        ["📢 Broadcast"],
-    ]
+def stats_user_added(user_id: int):
+    with STATS_LOCK:
+        stats["total_users"] += 1
 
-    rows = base + (admin_extra if user_id in admin_ids else [])
-    for row in rows:
-        markup.add(*[types.KeyboardButton(x) for x in row])
-    return markup
+def stats_file_added(user_id: int):
+    with STATS_LOCK:
+        stats["total_files"] += 1
 
-def create_main_menu_inline(user_id: int):
-    m = types.InlineKeyboardMarkup(row_width=2)
-    m.add(types.InlineKeyboardButton("📢 Updates Channel", url=UPDATE_CHANNEL))
-    m.add(types.InlineKeyboardButton("📤 Upload File", callback_data="upload"),
-          types.InlineKeyboardButton("📂 Check Files", callback_data="check_files"))
-    m.add(types.InlineKeyboardButton("⚡ Bot Speed", callback_data="speed"),
-          types.InlineKeyboardButton("📊 Statistics", callback_data="stats"))
-    if user_id in admin_ids:
-        m.add(types.InlineKeyboardButton("🔒 Lock/Unlock", callback_data="toggle_lock"))
-    m.add(types.InlineKeyboardButton("📞 @AHMED_SNDE", url=f"https://t.me/{YOUR_USERNAME.replace('@','')}"))
-    return m
+def stats_file_removed(user_id: int):
+    with STATS_LOCK:
+        stats["total_files"] = max(0, stats["total_files"] - 1)
 
-def create_control_buttons(script_owner_id: int, file_name: str, is_running: bool):
-    m = types.InlineKeyboardMarkup(row_width=2)
-    if is_running:
-        m.add(
-            types.InlineKeyboardButton("🔴 Stop", callback_data=f"stop_{script_owner_id}_{file_name}"),
-            types.InlineKeyboardButton("🔄 Restart", callback_data=f"restart_{script_owner_id}_{file_name}")
-        )
-        m.add(
-            types.InlineKeyboardButton("🗑️ Delete", callback_data=f"delete_{script_owner_id}_{file_name}"),
-            types.InlineKeyboardButton("📜 Logs", callback_data=f"logs_{script_owner_id}_{file_name}")
-        )
-    else:
-        m.add(
-            types.InlineKeyboardButton("🟢 Start", callback_data=f"start_{script_owner_id}_{file_name}"),
-            types.InlineKeyboardButton("🗑️ Delete", callback_data=f"delete_{script_owner_id}_{file_name}")
-        )
-        m.add(types.InlineKeyboardButton("📜 View Logs", callback_data=f"logs_{script_owner_id}_{file_name}"))
-    m.add(types.InlineKeyboardButton("🔙 Back to Files", callback_data="check_files"))
-    return m
+def stats_script_started(script_key: str, owner_id: int):
+    with STATS_LOCK:
+        if script_key in running_keys:
+            return
+        running_keys[script_key] = owner_id
+        running_by_user[owner_id] = running_by_user.get(owner_id, 0) + 1
 
-def approval_markup(pending_id: int):
-    m = types.InlineKeyboardMarkup(row_width=2)
-    m.add(
-        types.InlineKeyboardButton("✅ Approve", callback_data=f"approve_{pending_id}"),
-        types.InlineKeyboardButton("❌ Reject", callback_data=f"reject_{pending_id}")
-    )
-    return m
+def stats_script_stopped(script_key: str):
+    with STATS_LOCK:
+        owner_id = running_keys.pop(script_key, None)
+        if owner_id is None:
+            return
+        n = running_by_user.get(owner_id, 0) - 1
+        if n > 0:
+            running_by_user[owner_id] = n
+        else:
+            running_by_user.pop(owner_id, None)
 
+def drop_script(script_key: str, expected: dict = None):
+    """
+    Forget a stopped/exited script. With `expected`, only drop if the entry is
+    still that one (a restart may already have replaced it).
+    """
+    if expected is not None and bot_scripts.get(script_key) is not expected:
+        return None
+    info = bot_scripts.pop(script_key, None)
+    stats_script_stopped(script_key)
+    if info is not None and info.get("run_id"):
+        finish_scheduled_run(info)
+    return info
+
+def get_stats_snapshot(user_id: int) -> dict:
+    with STATS_LOCK:
+        return {
+            "total_users": stats["total_users"],
+            "total_files": stats["total_files"],
+            "running": len(running_keys),
+            "your_running": running_by_user.get(user_id, 0),
+        }
 
-# =========================
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def _dir_size(path: str) -> int:
+    total = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        total += _dir_size(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        # Hardlinks into the shared node cache aren't the user's bytes.
+                        if st.st_nlink == 1:
+                            total += st.st_size
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return total
+
+def build_admin_stats() -> str:
+    """Extended global stats for admins. Expensive parts are cached for ADMIN_STATS_TTL."""
+    now = time.monotonic()
+    if _admin_stats_cache["text"] and now - _admin_stats_cache["at"] < ADMIN_STATS_TTL:
+        return _admin_stats_cache["text"]
+
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("SELECT user_id, COUNT(*) FROM user_files GROUP BY user_id")
+        file_counts = {int(uid): n for uid, n in c.fetchall()}
+        c.execute("SELECT user_id FROM active_users")
+        user_ids = {int(uid) for (uid,) in c.fetchall()}
+        conn.close()
+
+    tiers = {}  # {tier: [users, files, running]}
+    with STATS_LOCK:
+        running_snapshot = dict(running_by_user)
+    for uid in user_ids | set(file_counts):
+        t = tiers.setdefault(get_user_tier(uid), [0, 0, 0])
+        t[0] += 1
+        t[1] += file_counts.get(uid, 0)
+        t[2] += running_snapshot.get(uid, 0)
+
+    consumers = []
+    for key, info in list(bot_scripts.items()):
+        if info.get("node"):
+            continue  # pid lives on another host
+        try:
+            p = psutil.Process(info["process"].pid)
+            with p.oneshot():
+                cpu = p.cpu_times()
+                consumers.append((p.memory_info().rss, cpu.user + cpu.system, key))
+        except Exception:
+            pass
+
+    lines = ["🏷️ Tiers (users / files / running)"]
+    for tier in ("owner", "admin", "premium", "free"):
+        if tier in tiers:
+            u, f, r = tiers[tier]
+            lines.append(f"  {tier}: {u} / {f} / {r}")
+    lines.append("💾 Top disk users")
+    for uid, size in top_disk_users(5):
+        lines.append(f"  {uid}: {_fmt_bytes(size)}")
+    lines.append("🔥 Top consumers (RSS, CPU time)")
+    for rss, cpu_s, key in heapq.nlargest(5, consumers):
+        lines.append(f"  {key}: {_fmt_bytes(rss)}, {cpu_s:.1f}s")
+
+    if worker_nodes:
+        lines.append("🖥️ Workers (free mem, CPU, running)")
+        for node in worker_nodes:
+            node.refresh()
+            st = node.status
+            if node.healthy and st:
+                lines.append(f"  {node.name}: {_fmt_bytes(st['mem_available'])}, {st['cpu_percent']:.0f}%, {st['running']}")
+            else:
+                lines.append(f"  {node.url}: ❌ unreachable")
+    lines.append(f"🚀 Startup: {startup_report() or 'n/a'}")
+
+    text = "\n".join(lines)
+    _admin_stats_cache.update(at=now, text=text)
+    return text
+
+
+# =========================
+# DISK USAGE (per-user index, reconciled in the background)
+# =========================
+# Every write/delete under upload_bots/<uid>/ that the bot performs itself
+# adjusts disk_usage by the delta, the supervisor adds log growth each tick,
+# and anything else scripts write on their own is picked up by the periodic
+# reconcile.
+DISK_LOCK = threading.Lock()
+DISK_RECONCILE_INTERVAL = int(os.environ.get("DISK_RECONCILE_INTERVAL", "3600"))
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_MB", "5")) * _MB
+disk_usage = {}  # {user_id: bytes}
+
+def _path_size(path: str) -> int:
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return 0
+    if os.path.isdir(path) and not os.path.islink(path):
+        return _dir_size(path)
+    return st.st_size if st.st_nlink == 1 else 0
+
+def get_disk_usage(user_id: int) -> int:
+    with DISK_LOCK:
+        if user_id in disk_usage:
+            return disk_usage[user_id]
+    size = _dir_size(os.path.join(UPLOAD_BOTS_DIR, str(user_id)))
+    with DISK_LOCK:
+        return disk_usage.setdefault(user_id, size)
+
+def disk_usage_add(user_id: int, delta: int):
+    # Users not in the index yet get measured in full on first read.
+    if not delta:
+        return
+    with DISK_LOCK:
+        if user_id in disk_usage:
+            disk_usage[user_id] = max(0, disk_usage[user_id] + delta)
+
+def get_disk_quota(user_id: int) -> float:
+    return TIER_DISK_QUOTAS[get_user_tier(user_id)]
+
+def check_disk_quota(user_id: int, incoming: int, replaced: int = 0):
+    """None if `incoming` bytes fit, otherwise a user-facing error."""
+    quota = get_disk_quota(user_id)
+    used = get_disk_usage(user_id)
+    if used - replaced + incoming <= quota:
+        return None
+    return (f"💾 Disk quota exceeded: {_fmt_bytes(used)} used + {_fmt_bytes(incoming)} new "
+            f"> {_fmt_bytes(quota)} allowed.\nDelete some files first.")
+
+def top_disk_users(n: int = 10):
+    with DISK_LOCK:
+        return heapq.nlargest(n, disk_usage.items(), key=lambda kv: kv[1])
+
+def reconcile_disk_usage():
+    """Full scandir walk; corrects drift in the index."""
+    t0 = time.monotonic()
+    fresh = {}
+    try:
+        with os.scandir(UPLOAD_BOTS_DIR) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False) and entry.name.isdigit():
+                    fresh[int(entry.name)] = _dir_size(entry.path)
+    except OSError:
+        pass
+    with DISK_LOCK:
+        drift = sum(abs(fresh.get(uid, 0) - disk_usage.get(uid, 0)) for uid in set(fresh) | set(disk_usage))
+        disk_usage.clear()
+        disk_usage.update(fresh)
+    logger.info(f"Disk usage reconciled: {len(fresh)} users, drift {_fmt_bytes(drift)}, "
+                f"{(time.monotonic() - t0) * 1000:.0f}ms")
+
+def disk_reconcile_loop():
+    while True:
+        try:
+            reconcile_disk_usage()
+        except Exception as e:
+            logger.error(f"Disk reconcile error: {e}", exc_info=True)
+        time.sleep(DISK_RECONCILE_INTERVAL)
+
+def start_disk_reconciler():
+    threading.Thread(target=disk_reconcile_loop, daemon=True, name="disk-reconcile").start()
+
+def open_script_log(log_path: str, owner_id: int):
+    """Fresh log for a (re)start. O_APPEND so rotate_script_logs can truncate under a live child."""
+    old = _path_size(log_path)
+    log_file = open(log_path, "a", encoding="utf-8", errors="ignore")
+    log_file.truncate(0)
+    disk_usage_add(owner_id, -old)
+    return log_file
+
+def rotate_script_logs():
+    """Account for log growth since the last tick and keep one .log.1
+    generation per script once a log passes LOG_MAX_BYTES."""
+    for key, info in list(bot_scripts.items()):
+        log_path = info.get("log_path")
+        if not log_path:
+            continue
+        try:
+            size = os.path.getsize(log_path)
+        except OSError:
+            continue
+        owner = info.get("script_owner_id")
+        disk_usage_add(owner, size - info.get("log_seen", 0))
+        info["log_seen"] = size
+        if size <= LOG_MAX_BYTES:
+            continue
+        backup = log_path + ".1"
+        old_backup = _path_size(backup)
+        try:
+            shutil.copyfile(log_path, backup)
+            os.truncate(log_path, 0)
+        except OSError as e:
+            logger.warning(f"Log rotation failed for {key}: {e}")
+            continue
+        # log: size -> 0, backup: old_backup -> size; only the old backup is freed.
+        disk_usage_add(owner, -old_backup)
+        info["log_seen"] = 0
+        logger.info(f"Rotated log for {key} ({_fmt_bytes(size)})")
+
+
+SPEED_TEST_ROUNDS = int(os.environ.get("SPEED_TEST_ROUNDS", "5"))
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+def _probe_sqlite_write():
+    with DB_LOCK:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        c = conn.cursor()
+        c.execute("INSERT OR REPLACE INTO speed_probe (id, ts) VALUES (1, ?)", (datetime.now().isoformat(),))
+        conn.commit()
+        conn.close()
+
+def _probe_psutil_scan():
+    for _ in psutil.process_iter(["status"]):
+        pass
+
+def _probe_disk_write():
+    path = os.path.join(UPLOAD_BOTS_DIR, f".speed_probe_{threading.get_ident()}")
+    try:
+        with open(path, "wb") as f:
+            f.write(os.urandom(64 * 1024))
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+@traced("bench.speed_suite")
+def run_speed_suite(chat_id: int, rounds: int = SPEED_TEST_ROUNDS) -> dict:
+    """
+    Time `rounds` Bot API round trips (send, edit, getMe) and local probes.
+    Returns {component: [ms, ...]} measured with a monotonic clock.
+    """
+    samples = {k: [] for k in ("send", "edit", "getMe", "sqlite_write", "psutil_scan", "disk_write")}
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        samples[name].append((time.perf_counter() - t0) * 1000)
+        return result
+
+    for i in range(rounds):
+        msg = timed("send", lambda: bot.send_message(chat_id, f"🏃 Round {i + 1}/{rounds}"))
+        timed("edit", lambda: bot.edit_message_text(f"🏃 Round {i + 1}/{rounds} ✓", chat_id, msg.message_id))
+        timed("getMe", bot.get_me)
+        try:
+            bot.delete_message(chat_id, msg.message_id)
+        except Exception:
+            pass
+        timed("sqlite_write", _probe_sqlite_write)
+        timed("psutil_scan", _probe_psutil_scan)
+        timed("disk_write", _probe_disk_write)
+    return samples
+
+def format_speed_report(samples: dict) -> str:
+    rounds = max((len(v) for v in samples.values()), default=0)
+    lines = [f"{'component':<13}{'p50':>8}{'p95':>8}{'p99':>8}"]
+    for name, vals in samples.items():
+        lines.append(f"{name:<13}{percentile(vals, 50):>8.1f}{percentile(vals, 95):>8.1f}{percentile(vals, 99):>8.1f}")
+    return f"⚡ Bot Speed ({rounds} rounds, ms)\n```\n" + "\n".join(lines) + "\n```"
+
+
+# =========================
+# BACKUP (online, incremental)
+# =========================
+# Snapshots of the DB and upload_bots/ go to BACKUP_DIR:
+#   objects/<h[:2]>/<sha256>.gz   gzip'd file contents, shared by all snapshots
+#   snapshots/<name>.json         {"db": hash, "files": {"<uid>/<path>": [hash, size, mode, mtime_ns]}}
+# The DB is copied with SQLite's online backup API BACKUP_DB_PAGES pages per
+# step, so writers only ever wait for one step. A file whose size and mtime
+# match the previous snapshot reuses its hash without being read, and content
+# already in the store is not compressed again. node_modules (rebuilt from the
+# node cache on start), __pycache__ and script logs are not backed up.
+BACKUP_DIR = os.environ.get("BACKUP_DIR", os.path.join(IROTECH_DIR, "backups"))
+BACKUP_INTERVAL_HOURS = float(os.environ.get("BACKUP_INTERVAL_HOURS", "0"))  # 0 = only /backup and --backup
+BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", "7"))
+BACKUP_WORKERS = int(os.environ.get("BACKUP_WORKERS", "4"))
+BACKUP_DB_PAGES = int(os.environ.get("BACKUP_DB_PAGES", "256"))
+BACKUP_GZIP_LEVEL = int(os.environ.get("BACKUP_GZIP_LEVEL", "6"))
+BACKUP_SKIP_DIRS = {"node_modules", "__pycache__", ".git"}
+BACKUP_LOCK = threading.Lock()
+
+def _backup_object_path(digest: str) -> str:
+    return os.path.join(BACKUP_DIR, "objects", digest[:2], digest + ".gz")
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _store_object(path: str):
+    """Add path's content to the object store; returns (hash, size, newly_stored)."""
+    digest = _hash_file(path)
+    if os.path.exists(_backup_object_path(digest)):
+        return digest, os.path.getsize(path), False
+    # Hash again while compressing: the file may have changed since the first pass.
+    tmp = os.path.join(BACKUP_DIR, "objects", f".{os.getpid()}_{threading.get_ident()}.tmp")
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=BACKUP_GZIP_LEVEL) as out:
+        for chunk in iter(lambda: src.read(1 << 20), b""):
+            h.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    digest = h.hexdigest()
+    dst = _backup_object_path(digest)
+    if os.path.exists(dst):
+        os.remove(tmp)
+        return digest, size, False
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    os.replace(tmp, dst)
+    return digest, size, True
+
+def list_backups() -> list:
+    """Snapshot names, oldest first."""
+    try:
+        names = os.listdir(os.path.join(BACKUP_DIR, "snapshots"))
+    except FileNotFoundError:
+        return []
+    return sorted(n[:-5] for n in names if n.endswith(".json"))
+
+def load_backup_manifest(name: str) -> dict:
+    with open(os.path.join(BACKUP_DIR, "snapshots", name + ".json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def _backup_database(dest: str):
+    src = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    dst = sqlite3.connect(dest)
+    try:
+        with trace_span("backup.db"):
+            src.backup(dst, pages=BACKUP_DB_PAGES, sleep=0.005)
+    finally:
+        dst.close()
+        src.close()
+
+def _backup_files():
+    """(relative path, absolute path) of every regular file to back up."""
+    for dirpath, dirnames, filenames in os.walk(UPLOAD_BOTS_DIR):
+        dirnames[:] = [d for d in dirnames if d not in BACKUP_SKIP_DIRS]
+        for name in filenames:
+            if name.endswith((".log", ".log.1")) or name.startswith(".speed_probe"):
+                continue
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, UPLOAD_BOTS_DIR), path
+
+def run_backup() -> dict:
+    """Take a snapshot; returns stats. Raises RuntimeError if one is already running."""
+    if not BACKUP_LOCK.acquire(blocking=False):
+        raise RuntimeError("a backup is already running")
+    try:
+        t0 = time.perf_counter()
+        os.makedirs(os.path.join(BACKUP_DIR, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(BACKUP_DIR, "snapshots"), exist_ok=True)
+        previous = list_backups()
+        prev_files = load_backup_manifest(previous[-1])["files"] if previous else {}
+
+        name = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if previous and previous[-1] >= name:
+            name = f"{previous[-1]}_1"
+        db_tmp = os.path.join(BACKUP_DIR, f".db_{os.getpid()}.tmp")
+        try:
+            _backup_database(db_tmp)
+            db_hash, db_size, _ = _store_object(db_tmp)
+        finally:
+            if os.path.exists(db_tmp):
+                os.remove(db_tmp)
+
+        def snapshot_file(item):
+            rel, path = item
+            try:
+                st = os.lstat(path)
+                if not stat.S_ISREG(st.st_mode):
+                    return None
+                old = prev_files.get(rel)
+                if old and old[1] == st.st_size and old[3] == st.st_mtime_ns:
+                    return rel, old, False
+                digest, size, stored = _store_object(path)
+            except FileNotFoundError:  # deleted while we walked
+                return None
+            return rel, [digest, size, stat.S_IMODE(st.st_mode), st.st_mtime_ns], stored
+
+        files = {}
+        stored_files = stored_bytes = 0
+        with trace_span("backup.files"), ThreadPoolExecutor(max_workers=BACKUP_WORKERS, thread_name_prefix="backup") as ex:
+            for result in ex.map(snapshot_file, _backup_files()):
+                if result is None:
+                    continue
+                rel, entry, stored = result
+                files[rel] = entry
+                if stored:
+                    stored_files += 1
+                    stored_bytes += entry[1]
+
+        manifest = {"created": datetime.now().isoformat(), "db": db_hash, "db_size": db_size, "files": files}
+        path = os.path.join(BACKUP_DIR, "snapshots", name + ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+        pruned = prune_backups()
+
+        result = {
+            "name": name,
+            "files": len(files),
+            "bytes": sum(e[1] for e in files.values()),
+            "stored_files": stored_files,
+            "stored_bytes": stored_bytes,
+            "db_bytes": db_size,
+            "pruned": pruned,
+            "seconds": round(time.perf_counter() - t0, 2),
+        }
+        logger.info(f"Backup {name}: {result}")
+        return result
+    finally:
+        BACKUP_LOCK.release()
+
+def prune_backups() -> int:
+    """Drop snapshots beyond BACKUP_KEEP and objects no remaining snapshot uses."""
+    names = list_backups()
+    old = names[:-BACKUP_KEEP] if BACKUP_KEEP > 0 else []
+    for name in old:
+        os.remove(os.path.join(BACKUP_DIR, "snapshots", name + ".json"))
+    if not old:
+        return 0
+    keep = set()
+    for name in names[len(old):]:
+        manifest = load_backup_manifest(name)
+        keep.add(manifest["db"])
+        keep.update(e[0] for e in manifest["files"].values())
+    for dirpath, _, filenames in os.walk(os.path.join(BACKUP_DIR, "objects")):
+        for fn in filenames:
+            if fn.endswith(".gz") and fn[:-3] not in keep:
+                os.remove(os.path.join(dirpath, fn))
+    return len(old)
+
+def restore_backup(name: str = None, workers: int = None) -> dict:
+    """
+    Restore the DB and upload_bots/ from a snapshot (default: latest). Run it
+    with the bot stopped (`python bot.py --restore [name]`). Files already
+    matching the snapshot (same size and mtime) are left alone, the rest are
+    decompressed in parallel; files not in the snapshot are not deleted.
+    """
+    names = list_backups()
+    if not names:
+        raise FileNotFoundError(f"no snapshots in {BACKUP_DIR}")
+    name = name or names[-1]
+    manifest = load_backup_manifest(name)
+    t0 = time.perf_counter()
+
+    def unpack(digest: str, dst: str):
+        tmp = f"{dst}.restore.tmp"
+        with gzip.open(_backup_object_path(digest), "rb") as src, open(tmp, "wb") as out:
+            shutil.copyfileobj(src, out, 1 << 20)
+        return tmp
+
+    os.replace(unpack(manifest["db"], DATABASE_PATH), DATABASE_PATH)
+
+    root = os.path.realpath(UPLOAD_BOTS_DIR)
+
+    def restore_file(item) -> bool:
+        rel, (digest, size, mode, mtime_ns) = item
+        dst = os.path.realpath(os.path.join(root, rel))
+        if not dst.startswith(root + os.sep):
+            raise ValueError(f"unsafe path in snapshot: {rel}")
+        try:
+            st = os.stat(dst)
+            if st.st_size == size and st.st_mtime_ns == mtime_ns:
+                return False
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = unpack(digest, dst)
+        os.chmod(tmp, mode)
+        # keep the mtime so the next backup can skip this file without reading it
+        os.utime(tmp, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp, dst)
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers or BACKUP_WORKERS * 2, thread_name_prefix="restore") as ex:
+        written = sum(ex.map(restore_file, manifest["files"].items()))
+    result = {"name": name, "files": len(manifest["files"]), "written": written,
+              "seconds": round(time.perf_counter() - t0, 2)}
+    logger.info(f"Restored {name}: {result}")
+    return result
+
+def backup_loop():
+    while True:
+        time.sleep(BACKUP_INTERVAL_HOURS * 3600)
+        try:
+            run_backup()
+        except Exception as e:
+            logger.error(f"Scheduled backup failed: {e}", exc_info=True)
+
+def start_backup_scheduler():
+    if BACKUP_INTERVAL_HOURS > 0:
+        threading.Thread(target=backup_loop, daemon=True, name="backup").start()
+
+
+# =========================
+# MENU / MARKUP
+# =========================
+def create_reply_keyboard_main_menu(user_id: int):
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
+
+    base = [
+        ["📢 Updates Channel"],
+        ["📤 Upload File", "📂 Check Files"],
+        ["⚡ Bot Speed", "📊 Statistics"],
+        ["📞 @AHMED_SNDE"]
+    ]
+    admin_extra = [
+        ["🔒 Lock Bot", "🟢 Running All Code"],
+        ["📢 Broadcast"],
+    ]
+
+    rows = base + (admin_extra if user_id in admin_ids else [])
+    for row in rows:
+        markup.add(*[types.KeyboardButton(x) for x in row])
+    return markup
+
+def create_main_menu_inline(user_id: int):
+    m = types.InlineKeyboardMarkup(row_width=2)
+    m.add(types.InlineKeyboardButton("📢 Updates Channel", url=UPDATE_CHANNEL))
+    m.add(types.InlineKeyboardButton("📤 Upload File", callback_data="upload"),
+          types.InlineKeyboardButton("📂 Check Files", callback_data="check_files"))
+    m.add(types.InlineKeyboardButton("⚡ Bot Speed", callback_data="speed"),
+          types.InlineKeyboardButton("📊 Statistics", callback_data="stats"))
+    if user_id in admin_ids:
+        m.add(types.InlineKeyboardButton("🔒 Lock/Unlock", callback_data="toggle_lock"))
+    m.add(types.InlineKeyboardButton("📞 @AHMED_SNDE", url=f"https://t.me/{YOUR_USERNAME.replace('@','')}"))
+    return m
+
+def create_control_buttons(script_owner_id: int, file_name: str, is_running: bool):
+    m = types.InlineKeyboardMarkup(row_width=2)
+    if is_running:
+        m.add(
+            types.InlineKeyboardButton("🔴 Stop", callback_data=f"stop_{script_owner_id}_{file_name}"),
+            types.InlineKeyboardButton("🔄 Restart", callback_data=f"restart_{script_owner_id}_{file_name}")
+        )
+        m.add(
+            types.InlineKeyboardButton("⌨️ Send input", callback_data=f"input_{script_owner_id}_{file_name}"),
+            types.InlineKeyboardButton("📣 Reload (SIGHUP)", callback_data=f"sighup_{script_owner_id}_{file_name}")
+        )
+        m.add(
+            types.InlineKeyboardButton("🗑️ Delete", callback_data=f"delete_{script_owner_id}_{file_name}"),
+            types.InlineKeyboardButton("📜 Logs", callback_data=f"logs_{script_owner_id}_{file_name}")
+        )
+    else:
+        m.add(
+            types.InlineKeyboardButton("🟢 Start", callback_data=f"start_{script_owner_id}_{file_name}"),
+            types.InlineKeyboardButton("🗑️ Delete", callback_data=f"delete_{script_owner_id}_{file_name}")
+        )
+        m.add(types.InlineKeyboardButton("📜 View Logs", callback_data=f"logs_{script_owner_id}_{file_name}"))
+    m.add(
+        types.InlineKeyboardButton("⏰ Schedule", callback_data=f"schedule_{script_owner_id}_{file_name}"),
+        types.InlineKeyboardButton("🕘 Runs", callback_data=f"runs_{script_owner_id}_{file_name}")
+    )
+    m.add(types.InlineKeyboardButton("🔙 Back to Files", callback_data="check_files"))
+    return m
+
+def create_schedule_buttons(script_owner_id: int, file_name: str, scheduled: bool):
+    m = types.InlineKeyboardMarkup(row_width=3)
+    m.add(
+        types.InlineKeyboardButton("Every 5m", callback_data=f"sch5m_{script_owner_id}_{file_name}"),
+        types.InlineKeyboardButton("Hourly", callback_data=f"sch1h_{script_owner_id}_{file_name}"),
+        types.InlineKeyboardButton("Daily", callback_data=f"sch1d_{script_owner_id}_{file_name}")
+    )
+    if scheduled:
+        m.add(types.InlineKeyboardButton("❌ Remove schedule", callback_data=f"schoff_{script_owner_id}_{file_name}"))
+    m.add(types.InlineKeyboardButton("🔙 Back", callback_data=f"file_{script_owner_id}_{file_name}"))
+    return m
+
+def approval_markup(pending_id: int):
+    m = types.InlineKeyboardMarkup(row_width=2)
+    m.add(
+        types.InlineKeyboardButton("✅ Approve", callback_data=f"approve_{pending_id}"),
+        types.InlineKeyboardButton("❌ Reject", callback_data=f"reject_{pending_id}")
+    )
+    return m
+
+
+# =========================
+# FAST START (ZYGOTE)
+# =========================
+# FAST_START=1 forks Python scripts from a pre-warmed zygote (zygote.py) that
+# has already imported ZYGOTE_PRELOAD, instead of a cold interpreter start.
+FAST_START = os.environ.get("FAST_START", "0") == "1"
+ZYGOTE_SOCKET = os.path.join(IROTECH_DIR, "zygote.sock")
+ZYGOTE_PRELOAD = os.environ.get("ZYGOTE_PRELOAD", "telebot,requests,bs4")
+_zygote = {"proc": None}
+_zygote_lock = threading.Lock()
+
+class ZygoteProcess:
+    """
+    Popen-like handle for a script forked by the zygote. It is not our child,
+    so liveness comes from psutil and the exit status is not available
+    (returncode is 0 once the process is gone).
+    """
+
+    def __init__(self, pid: int, stdin):
+        self.pid = pid
+        self.stdin = stdin
+        self.returncode = None
+        try:
+            self._create_time = psutil.Process(pid).create_time()
+        except Exception:
+            self._create_time = None
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                p = psutil.Process(self.pid)
+                if p.create_time() != self._create_time or p.status() == psutil.STATUS_ZOMBIE:
+                    self.returncode = 0
+            except Exception:
+                self.returncode = 0
+            if self.returncode is not None and self.stdin and not self.stdin.closed:
+                try:
+                    self.stdin.close()
+                except Exception:
+                    pass
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(f"zygote pid {self.pid}", timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+def _ensure_zygote():
+    import zygote
+    with _zygote_lock:
+        proc = _zygote["proc"]
+        if proc is not None and proc.poll() is None and os.path.exists(ZYGOTE_SOCKET):
+            return
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+        t0 = time.perf_counter()
+        _zygote["proc"] = zygote.start_server(
+            ZYGOTE_SOCKET,
+            log_path=os.path.join(IROTECH_DIR, "zygote.log"),
+            preload_modules=[m.strip() for m in ZYGOTE_PRELOAD.split(",") if m.strip()],
+        )
+        logger.info(f"Zygote started (PID {_zygote['proc'].pid}) in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+def spawn_via_zygote(script_path: str, cwd: str, log_file) -> ZygoteProcess:
+    import zygote
+    _ensure_zygote()
+    r, w = os.pipe()
+    try:
+        pid = zygote.spawn(ZYGOTE_SOCKET, script_path, cwd, r, log_file.fileno())
+    except Exception:
+        os.close(w)
+        raise
+    finally:
+        os.close(r)
+    stdin = open(w, "w", encoding="utf-8", errors="ignore")
+    return ZygoteProcess(pid, stdin)
+
+def warm_zygote():
+    if not FAST_START:
+        return
+    try:
+        _ensure_zygote()
+    except Exception as e:
+        logger.error(f"Zygote warm-up failed: {e}")
+
+def stop_zygote():
+    proc = _zygote["proc"]
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+
+
+# =========================
+# WORKER NODES (optional scale-out)
+# =========================
+# With WORKER_NODES set, scripts are started on worker.py agents instead of
+# as local children; upload_bots/ must be shared between all nodes. Each start
+# goes to the node with the most free memory weighted by idle CPU. Node status
+# and script states are cached, so the supervisor costs one /scripts call per
+# node per tick regardless of how many scripts run there.
+WORKER_NODES = [u.strip().rstrip("/") for u in os.environ.get("WORKER_NODES", "").split(",") if u.strip()]
+WORKER_TOKEN = os.environ.get("WORKER_TOKEN", "")
+WORKER_TIMEOUT = float(os.environ.get("WORKER_TIMEOUT", "5"))
+WORKER_STATUS_TTL = float(os.environ.get("WORKER_STATUS_TTL", "2"))
+WORKER_DOWN_BACKOFF = float(os.environ.get("WORKER_DOWN_BACKOFF", "15"))
+SCRIPT_MEM_ESTIMATE = int(os.environ.get("SCRIPT_MEM_ESTIMATE_MB", "64")) * _MB
+_placement_lock = threading.Lock()
+
+class WorkerNode:
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.status = None
+        self.status_at = 0.0
+        self.scripts = {}
+        self.scripts_at = 0.0
+        self.down_until = 0.0  # /scripts failed: answer from the cached error until then
+        self.down_error = None
+        self.pending = 0  # placements since the last status refresh
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return (self.status or {}).get("node") or self.url
+
+    def call(self, method: str, path: str, payload: dict = None, timeout: float = None):
+        with trace_span(f"worker.{path.strip('/')}", node=self.url):
+            r = requests.request(method, self.url + path, json=payload, timeout=timeout or WORKER_TIMEOUT,
+                                 headers={"X-Worker-Token": WORKER_TOKEN})
+        data = r.json()
+        if r.status_code != 200:
+            raise RuntimeError(f"{self.url}{path}: {data.get('error', r.status_code)}")
+        return data
+
+    def refresh(self):
+        if time.monotonic() - self.status_at < WORKER_STATUS_TTL:
+            return
+        try:
+            self.status = self.call("GET", "/status")
+            self.pending = 0
+            if not self.healthy:
+                logger.info(f"Worker {self.url} is back")
+            self.healthy = True
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Worker {self.url} unreachable: {e}")
+            self.healthy = False
+        self.status_at = time.monotonic()
+
+    def score(self) -> float:
+        free = self.status["mem_available"] - self.pending * SCRIPT_MEM_ESTIMATE
+        idle = 1 - self.status["cpu_percent"] / 100
+        return free * max(idle, 0.05)
+
+    def script_state(self, key: str):
+        """Cached {pid, returncode, started} for key; None if unknown, raises if unreachable."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.down_until:
+                raise RuntimeError(f"{self.url} unreachable: {self.down_error}")
+            if now - self.scripts_at >= SUPERVISOR_INTERVAL / 2:
+                try:
+                    self.scripts = self.call("GET", "/scripts")
+                except Exception as e:
+                    self.scripts_at = time.monotonic()
+                    self.down_until = self.scripts_at + WORKER_DOWN_BACKOFF
+                    self.down_error = e
+                    raise
+                self.scripts_at = time.monotonic()
+            return self.scripts.get(key)
+
+worker_nodes = [WorkerNode(u) for u in WORKER_NODES]
+
+class RemoteProcess:
+    """Popen-like handle for a script running on a worker node."""
+
+    def __init__(self, node: WorkerNode, key: str, pid: int):
+        self.node = node
+        self.key = key
+        self.pid = pid
+        self.stdin = None
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                state = self.node.script_state(self.key)
+            except Exception:
+                return None  # node unreachable: keep it, don't declare it dead
+            if state is None or state["pid"] != self.pid:
+                self.returncode = -1  # worker restarted or forgot it
+            elif state["returncode"] is not None:
+                self.returncode = state["returncode"]
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(f"{self.node.url} {self.key}", timeout)
+            time.sleep(0.2)
+        return self.returncode
+
+    def send_signal(self, sig):
+        self.node.call("POST", "/signal", {"key": self.key, "signal": int(sig)})
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def read_log(self, tail: int) -> str:
+        return self.node.call("GET", f"/logs?key={quote(self.key)}&tail={tail}")["text"]
+
+    def write_input(self, text: str):
+        self.node.call("POST", "/input", {"key": self.key, "text": text})
+
+def pick_worker():
+    with _placement_lock:
+        for node in worker_nodes:
+            node.refresh()
+        live = [n for n in worker_nodes if n.healthy and n.status]
+        if not live:
+            return None
+        best = max(live, key=WorkerNode.score)
+        best.pending += 1
+        return best
+
+def spawn_on_worker(script_key: str, kind: str, script_path: str, cwd: str, log_path: str):
+    """RemoteProcess on the best node, or None when no node is reachable."""
+    node = pick_worker()
+    if node is None:
+        logger.warning(f"No reachable worker node for {script_key}, starting locally")
+        return None
+    resp = node.call("POST", "/start", {"key": script_key, "kind": kind, "script": script_path,
+                                        "cwd": cwd, "log_path": log_path})
+    logger.info(f"Placed {script_key} on {node.name} (PID {resp['pid']})")
+    return RemoteProcess(node, script_key, resp["pid"])
+
+def stop_remote(process_infos: list, timeout: float) -> int:
+    """One /stop per node, all nodes in parallel. Returns the number force-killed."""
+    by_node = {}
+    for info in process_infos:
+        by_node.setdefault(info["process"].node, []).append(info["process"].key)
+    if not by_node:
+        return 0
+    killed = 0
+    with ThreadPoolExecutor(max_workers=len(by_node)) as pool:
+        futures = {pool.submit(node.call, "POST", "/stop", {"keys": keys, "timeout": timeout}, timeout + 5): node
+                   for node, keys in by_node.items()}
+        for fut in as_completed(futures):
+            try:
+                killed += fut.result()["killed"]
+            except Exception as e:
+                logger.error(f"Stopping scripts on {futures[fut].url} failed: {e}")
+    for node in by_node:
+        node.scripts_at = 0.0  # the next poll() sees the exits
+    return killed
+
+def _never_reached(e) -> bool:
+    """True if a requests error happened before the worker saw the request."""
+    from urllib3.exceptions import NewConnectionError
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(e, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+def try_start_remote(script_key: str, kind: str, script_path: str, cwd: str, log_path: str):
+    """
+    Start on a worker node if any are configured; None means start locally.
+    Only an unreachable node falls back to a local start: a rejection or a
+    read timeout raises, as the script may be running on the worker anyway.
+    """
+    if not worker_nodes:
+        return None
+    try:
+        with trace_span("subprocess.remote", script_key=script_key):
+            return spawn_on_worker(script_key, kind, script_path, cwd, log_path)
+    except requests.ConnectionError as e:
+        if not _never_reached(e):
+            raise
+        logger.warning(f"Worker unreachable for {script_key}, starting locally: {e}")
+        return None
+
+
+# =========================
+# INSTALL QUEUE / NODE CACHE
+# =========================
+# Dependency installs + starts run on a bounded pool instead of the handler
+# threads. node_modules are built once per (package.json, lockfile, node
+# version) under NODE_CACHE_DIR and hardlinked into each user folder.
+INSTALL_WORKERS = int(os.environ.get("INSTALL_WORKERS", "2"))
+START_WAIT_SECONDS = float(os.environ.get("START_WAIT_SECONDS", "1"))
+NODE_CACHE_DIR = os.path.join(IROTECH_DIR, "node_cache")
+NODE_LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json")
+
+install_executor = ThreadPoolExecutor(max_workers=INSTALL_WORKERS, thread_name_prefix="install")
+_pip_lock = threading.Lock()
+_installed_requirements = set()  # sha256 of requirements.txt files installed by this process
+_node_cache_locks = {}
+_node_cache_locks_guard = threading.Lock()
+_node_version = {}
+
+def node_version() -> str:
+    if "v" not in _node_version:
+        try:
+            r = subprocess.run(["node", "--version"], capture_output=True, text=True, timeout=10)
+            _node_version["v"] = r.stdout.strip()
+        except Exception:
+            _node_version["v"] = "unknown"
+    return _node_version["v"]
+
+def node_deps_hash(folder: str) -> str:
+    h = hashlib.sha256(node_version().encode())
+    for name in ("package.json",) + NODE_LOCKFILES:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            h.update(name.encode() + b"\0")
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()[:32]
+
+def package_json_main(folder: str):
+    """Entry file of a Node project: "main", else `node <file>` from scripts.start, else index.js & co."""
+    try:
+        with open(os.path.join(folder, "package.json"), "r", encoding="utf-8") as f:
+            pkg = json.load(f)
+    except Exception:
+        return None
+    candidates = []
+    if isinstance(pkg.get("main"), str):
+        candidates.append(pkg["main"])
+    start = (pkg.get("scripts") or {}).get("start")
+    if isinstance(start, str):
+        m = re.search(r"\bnode\s+(\S+)", start)
+        if m:
+            candidates.append(m.group(1))
+    candidates += ["index.js", "main.js", "bot.js", "app.js"]
+
+    root = os.path.abspath(folder)
+    for cand in candidates:
+        rel = os.path.normpath(cand)
+        path = os.path.abspath(os.path.join(root, rel))
+        if not path.startswith(root + os.sep):
+            continue
+        for option in (rel, rel + ".js", os.path.join(rel, "index.js")):
+            if os.path.isfile(os.path.join(root, option)):
+                return option.replace(os.sep, "/")
+    return None
+
+def _build_node_cache(user_folder: str, cache_dir: str):
+    """Install into cache_dir (atomically). Returns an error string or None."""
+    key = os.path.basename(cache_dir)
+    with _node_cache_locks_guard:
+        lock = _node_cache_locks.setdefault(key, threading.Lock())
+    with lock:
+        if os.path.exists(os.path.join(cache_dir, ".complete")):
+            return None
+        npm = shutil.which("npm")
+        if not npm:
+            return "npm is not installed on this host"
+
+        tmp = f"{cache_dir}.tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        has_lock = False
+        for name in ("package.json",) + NODE_LOCKFILES:
+            src = os.path.join(user_folder, name)
+            if os.path.exists(src):
+                shutil.copy2(src, os.path.join(tmp, name))
+                has_lock = has_lock or name in NODE_LOCKFILES
+
+        cmd = [npm, "ci" if has_lock else "install", "--omit=dev", "--no-audit", "--no-fund"]
+        r = subprocess.run(cmd, cwd=tmp, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+        if r.returncode != 0:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return r.stderr or r.stdout or f"npm exited with {r.returncode}"
+
+        # Shared through hardlinks: make the cached files read-only.
+        for dirpath, _, filenames in os.walk(os.path.join(tmp, "node_modules")):
+            for fn in filenames:
+                path = os.path.join(dirpath, fn)
+                if not os.path.islink(path):
+                    try:
+                        os.chmod(path, os.stat(path).st_mode & ~0o222)
+                    except OSError:
+                        pass
+        open(os.path.join(tmp, ".complete"), "w").close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp, cache_dir)
+        logger.info(f"Node cache built: {key}")
+        return None
+
+def link_node_modules(cache_dir: str, user_folder: str):
+    src_root = os.path.join(cache_dir, "node_modules")
+    dst_root = os.path.join(user_folder, "node_modules")
+    if os.path.islink(dst_root) or os.path.isfile(dst_root):
+        os.remove(dst_root)
+    elif os.path.isdir(dst_root):
+        shutil.rmtree(dst_root)
+    if not os.path.isdir(src_root):
+        return  # no dependencies
+
+    for dirpath, dirnames, filenames in os.walk(src_root):
+        rel = os.path.relpath(dirpath, src_root)
+        target = dst_root if rel == "." else os.path.join(dst_root, rel)
+        os.makedirs(target, exist_ok=True)
+        for name in dirnames + filenames:
+            src = os.path.join(dirpath, name)
+            dst = os.path.join(target, name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), dst)
+            elif name in filenames:
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)  # cache on another filesystem
+
+
+# =========================
 # RUNNERS
 # =========================
+@traced("subprocess.pip_install")
 def install_requirements_if_present(user_folder: str, message_obj):
     """
     If requirements.txt exists in user_folder, install it.
@@ -384,34 +2090,121 @@ def install_requirements_if_present(user_folder: str, message_obj):
         return True
 
     try:
-        bot.reply_to(message_obj, "📦 Installing requirements.txt ...")
-        cmd = [sys.executable, "-m", "pip", "install", "-r", req_path]
-        r = subprocess.run(cmd, cwd=user_folder, capture_output=True, text=True, encoding="utf-8", errors="ignore")
-        if r.returncode != 0:
-            err = (r.stderr or r.stdout or "")[:3500]
-            bot.reply_to(message_obj, f"❌ requirements install failed:\n```\n{err}\n```", parse_mode="Markdown")
-            return False
-        bot.reply_to(message_obj, "✅ requirements installed.")
+        with open(req_path, "rb") as f:
+            req_hash = hashlib.sha256(f.read()).hexdigest()
+        if req_hash in _installed_requirements:
+            return True
+        # pip installs share one site-packages; never run two at once.
+        with _pip_lock:
+            if req_hash in _installed_requirements:
+                return True
+            reply_or_log(message_obj, "📦 Installing requirements.txt ...")
+            cmd = [sys.executable, "-m", "pip", "install", "-r", req_path]
+            r = subprocess.run(cmd, cwd=user_folder, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+            if r.returncode != 0:
+                err = (r.stderr or r.stdout or "")[:3500]
+                reply_or_log(message_obj, f"❌ requirements install failed:\n```\n{err}\n```", parse_mode="Markdown")
+                return False
+            _installed_requirements.add(req_hash)
+        reply_or_log(message_obj, "✅ requirements installed.")
         return True
     except Exception as e:
-        bot.reply_to(message_obj, f"❌ requirements install error: {e}")
+        reply_or_log(message_obj, f"❌ requirements install error: {e}")
         return False
 
-def run_script(script_path, script_owner_id, user_folder, file_name, message_obj_for_reply):
+@traced("subprocess.npm_install")
+def install_node_deps_if_present(user_folder: str, message_obj):
+    """
+    If package.json exists in user_folder, make sure its dependencies are in
+    the shared content-hashed cache and hardlink them into user_folder/node_modules.
+    """
+    if not os.path.exists(os.path.join(user_folder, "package.json")):
+        return True
+
+    try:
+        cache_dir = os.path.join(NODE_CACHE_DIR, node_deps_hash(user_folder))
+        if not os.path.exists(os.path.join(cache_dir, ".complete")):
+            reply_or_log(message_obj, "📦 Installing package.json dependencies ...")
+            err = _build_node_cache(user_folder, cache_dir)
+            if err:
+                reply_or_log(message_obj, f"❌ npm install failed:\n```\n{err[:3500]}\n```", parse_mode="Markdown")
+                return False
+            reply_or_log(message_obj, "✅ node modules installed.")
+        link_node_modules(cache_dir, user_folder)
+        return True
+    except Exception as e:
+        reply_or_log(message_obj, f"❌ npm install error: {e}")
+        return False
+
+def _prepare_and_start(owner: int, file_name: str, file_type: str, message_obj, notify_chat_id: int = None, run: dict = None) -> bool:
+    folder = get_user_folder(owner)
+    fp = os.path.join(folder, file_name)
+    if not os.path.exists(fp):
+        reply_or_log(message_obj, "⚠️ File missing. Re-upload.")
+        return False
+
+    ok = install_requirements_if_present(folder, message_obj) and install_node_deps_if_present(folder, message_obj)
+    if not ok:
+        if notify_chat_id:
+            try:
+                bot.send_message(notify_chat_id, "❌ Your code was approved but dependencies failed to install. Re-upload with correct requirements.txt / package.json.")
+            except Exception:
+                pass
+        return False
+
+    runner = run_script if file_type == "py" else run_js_script
+    if not runner(fp, owner, folder, file_name, message_obj, run):
+        return False
+
+    if notify_chat_id:
+        try:
+            bot.send_message(notify_chat_id, f"✅ Approved. Now running `{file_name}`.", parse_mode="Markdown")
+        except Exception:
+            pass
+    return True
+
+def queue_start(owner: int, file_name: str, file_type: str, message_obj=None, notify_chat_id: int = None, run: dict = None):
+    """
+    Install dependencies and start the script on the bounded install pool.
+    Returns a Future of whether it started. message_obj=None (scheduled runs)
+    logs progress instead of replying; `run` is merged into the bot_scripts entry.
+    """
+    def job():
+        try:
+            with trace_span("install_queue.job", file_name=file_name):
+                return _prepare_and_start(owner, file_name, file_type, message_obj, notify_chat_id, run)
+        except Exception as e:
+            logger.error(f"Install/start job failed for {owner}_{file_name}: {e}", exc_info=True)
+            return False
+    return install_executor.submit(job)
+
+def run_script(script_path, script_owner_id, user_folder, file_name, message_obj_for_reply=None, run: dict = None) -> bool:
     script_key = f"{script_owner_id}_{file_name}"
     try:
         log_path = os.path.join(user_folder, f"{os.path.splitext(file_name)[0]}.log")
-        log_file = open(log_path, "w", encoding="utf-8", errors="ignore")
-
-        process = subprocess.Popen(
-            [sys.executable, script_path],
-            cwd=user_folder,
-            stdout=log_file,
-            stderr=log_file,
-            stdin=subprocess.PIPE,
-            encoding="utf-8",
-            errors="ignore"
-        )
+        log_file = open_script_log(log_path, script_owner_id)
+
+        process = try_start_remote(script_key, "py", script_path, user_folder, log_path)
+        if process is not None:
+            log_file.close()  # the worker writes the log itself
+            log_file = None
+        if process is None and FAST_START:
+            try:
+                with trace_span("subprocess.zygote_fork", file_name=file_name):
+                    process = spawn_via_zygote(script_path, user_folder, log_file)
+            except Exception as e:
+                logger.warning(f"Zygote start failed for {script_key}, cold start instead: {e}")
+        if process is None:
+            with trace_span("subprocess.popen", file_name=file_name):
+                process = subprocess.Popen(
+                    [sys.executable, script_path],
+                    cwd=user_folder,
+                    stdout=log_file,
+                    stderr=log_file,
+                    stdin=subprocess.PIPE,
+                    encoding="utf-8",
+                    errors="ignore"
+                )
 
         bot_scripts[script_key] = {
             "process": process,
@@ -420,34 +2213,47 @@ def run_script(script_path, script_owner_id, user_folder, file_name, message_obj
             "script_owner_id": script_owner_id,
             "start_time": datetime.now(),
             "user_folder": user_folder,
+            "log_path": log_path,
             "type": "py",
-            "script_key": script_key
+            "script_key": script_key,
+            "node": process.node.name if isinstance(process, RemoteProcess) else None,
+            **(run or {})
         }
-        bot.reply_to(message_obj_for_reply, f"✅ Started `{file_name}` (PID: {process.pid})", parse_mode="Markdown")
+        stats_script_started(script_key, script_owner_id)
+        where = f" on {process.node.name}" if isinstance(process, RemoteProcess) else ""
+        reply_or_log(message_obj_for_reply, f"✅ Started `{file_name}` (PID: {process.pid}{where})", parse_mode="Markdown")
+        return True
     except Exception as e:
-        bot.reply_to(message_obj_for_reply, f"❌ Start error: {e}")
-        bot_scripts.pop(script_key, None)
+        reply_or_log(message_obj_for_reply, f"❌ Start error: {e}")
+        drop_script(script_key)
         try:
             if "log_file" in locals() and log_file and not log_file.closed:
                 log_file.close()
         except Exception:
             pass
+        return False
 
-def run_js_script(script_path, script_owner_id, user_folder, file_name, message_obj_for_reply):
+def run_js_script(script_path, script_owner_id, user_folder, file_name, message_obj_for_reply=None, run: dict = None) -> bool:
     script_key = f"{script_owner_id}_{file_name}"
     try:
         log_path = os.path.join(user_folder, f"{os.path.splitext(file_name)[0]}.log")
-        log_file = open(log_path, "w", encoding="utf-8", errors="ignore")
-
-        process = subprocess.Popen(
-            ["node", script_path],
-            cwd=user_folder,
-            stdout=log_file,
-            stderr=log_file,
-            stdin=subprocess.PIPE,
-            encoding="utf-8",
-            errors="ignore"
-        )
+        log_file = open_script_log(log_path, script_owner_id)
+
+        process = try_start_remote(script_key, "js", script_path, user_folder, log_path)
+        if process is not None:
+            log_file.close()  # the worker writes the log itself
+            log_file = None
+        if process is None:
+            with trace_span("subprocess.popen", file_name=file_name):
+                process = subprocess.Popen(
+                    ["node", script_path],
+                    cwd=user_folder,
+                    stdout=log_file,
+                    stderr=log_file,
+                    stdin=subprocess.PIPE,
+                    encoding="utf-8",
+                    errors="ignore"
+                )
 
         bot_scripts[script_key] = {
             "process": process,
@@ -456,18 +2262,482 @@ def run_js_script(script_path, script_owner_id, user_folder, file_name, message_
             "script_owner_id": script_owner_id,
             "start_time": datetime.now(),
             "user_folder": user_folder,
+            "log_path": log_path,
             "type": "js",
-            "script_key": script_key
+            "script_key": script_key,
+            "node": process.node.name if isinstance(process, RemoteProcess) else None,
+            **(run or {})
         }
-        bot.reply_to(message_obj_for_reply, f"✅ Started `{file_name}` (PID: {process.pid})", parse_mode="Markdown")
+        stats_script_started(script_key, script_owner_id)
+        where = f" on {process.node.name}" if isinstance(process, RemoteProcess) else ""
+        reply_or_log(message_obj_for_reply, f"✅ Started `{file_name}` (PID: {process.pid}{where})", parse_mode="Markdown")
+        return True
     except Exception as e:
-        bot.reply_to(message_obj_for_reply, f"❌ Start error: {e}")
-        bot_scripts.pop(script_key, None)
+        reply_or_log(message_obj_for_reply, f"❌ Start error: {e}")
+        drop_script(script_key)
         try:
             if "log_file" in locals() and log_file and not log_file.closed:
                 log_file.close()
         except Exception:
             pass
+        return False
+
+
+# =========================
+# SUPERVISOR
+# =========================
+SUPERVISOR_INTERVAL = float(os.environ.get("SUPERVISOR_INTERVAL", "2"))
+
+def reap_exited_scripts():
+    """Drop scripts whose process has exited. Popen.poll() is a single waitpid, no psutil scan."""
+    for key, info in list(bot_scripts.items()):
+        proc = info.get("process")
+        if proc is None:
+            continue
+        code = proc.poll()
+        if code is None:
+            continue
+        try:
+            if info.get("log_file") and not info["log_file"].closed:
+                info["log_file"].close()
+        except Exception:
+            pass
+        if drop_script(key, info) is not None:
+            logger.info(f"Script {key} exited with code {code}")
+
+def supervisor_loop():
+    while True:
+        try:
+            reap_exited_scripts()
+            enforce_max_runtime()
+            rotate_script_logs()
+        except Exception as e:
+            logger.error(f"Supervisor error: {e}", exc_info=True)
+        time.sleep(SUPERVISOR_INTERVAL)
+
+def start_supervisor():
+    threading.Thread(target=supervisor_loop, daemon=True, name="supervisor").start()
+    mark_startup("supervisor_started")
+
+
+# =========================
+# SCHEDULED RUNS
+# =========================
+# A file with a schedule is started by the scheduler when due and reaped by
+# the supervisor when it exits (or is killed after max_runtime), so periodic
+# jobs hold no memory between runs. Specs are 5-field cron ("*/15 * * * *",
+# local time), @hourly/@daily/@weekly/@monthly, or "every <n><s|m|h|d>".
+# Overlap policy when a run is due while the previous one is still up:
+# "skip" (default) records a skipped run, "replace" stops the old run first.
+# Like the expiry heap, `_schedule_heap` entries are never removed: a popped
+# entry is ignored unless it still matches `script_schedules[...]["next"]`.
+SCHEDULE_MIN_INTERVAL = int(os.environ.get("SCHEDULE_MIN_INTERVAL", "60"))
+SCHEDULE_MAX_RUNTIME = int(os.environ.get("SCHEDULE_MAX_RUNTIME", "600"))
+SCHEDULE_RUN_HISTORY = int(os.environ.get("SCHEDULE_RUN_HISTORY", "50"))
+SCHEDULE_OVERLAP_POLICIES = ("skip", "replace")
+SCHEDULE_PRESETS = {"sch5m": "every 5m", "sch1h": "@hourly", "sch1d": "@daily"}
+
+script_schedules = {}  # {(user_id, file_name): {"spec": CronSpec, "max_runtime", "overlap", "next"}}
+_schedule_heap = []
+_schedule_cond = threading.Condition()
+
+class CronSpec:
+    ALIASES = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@weekly": "0 0 * * 0", "@monthly": "0 0 1 * *"}
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+    def __init__(self, text: str):
+        self.text = " ".join(text.split())
+        self.interval = None
+        m = re.fullmatch(r"every\s*(\d+)\s*([smhd])", self.text, re.I)
+        if m:
+            self.interval = int(m.group(1)) * self.UNITS[m.group(2).lower()]
+            if self.interval < SCHEDULE_MIN_INTERVAL:
+                raise ValueError(f"interval must be at least {SCHEDULE_MIN_INTERVAL}s")
+            return
+        fields = self.ALIASES.get(self.text.lower(), self.text).split()
+        if len(fields) != 5:
+            raise ValueError("expected 5 cron fields (min hour day month weekday), @daily or 'every 10m'")
+        self.fields = [self._parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, self.RANGES)]
+        if 7 in self.fields[4]:
+            self.fields[4] = (self.fields[4] - {7}) | {0}  # 0 and 7 are both Sunday
+        self.any_dom = fields[2] == "*"
+        self.any_dow = fields[4] == "*"
+        self.next_after(datetime.now())  # rejects specs that never fire, e.g. Feb 31
+
+    @staticmethod
+    def _parse_field(field: str, lo: int, hi: int) -> frozenset:
+        values = set()
+        for part in field.split(","):
+            rng, _, step = part.partition("/")
+            step = int(step) if step else 1
+            if rng == "*":
+                start, end = lo, hi
+            elif "-" in rng:
+                start, end = (int(x) for x in rng.split("-", 1))
+            else:
+                start = end = int(rng)
+                if step > 1:
+                    end = hi
+            if not (lo <= start <= end <= hi) or step < 1:
+                raise ValueError(f"bad cron field '{field}' (allowed {lo}-{hi})")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, t: datetime) -> bool:
+        dom = t.day in self.fields[2]
+        dow = (t.weekday() + 1) % 7 in self.fields[4]
+        if self.any_dom or self.any_dow:
+            return dom and dow
+        return dom or dow  # cron: both restricted means either may match
+
+    def next_after(self, t: datetime) -> datetime:
+        if self.interval:
+            return t + timedelta(seconds=self.interval)
+        minutes, hours, _, months, _ = self.fields
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"'{self.text}' never fires")
+
+def _push_schedule(key, sched: dict):
+    with _schedule_cond:
+        heapq.heappush(_schedule_heap, (sched["next"], key))
+        _schedule_cond.notify()
+
+def set_schedule(user_id: int, file_name: str, spec: str, max_runtime: int = None, overlap: str = "skip") -> dict:
+    """Parse, persist and arm a schedule. Raises ValueError on a bad spec/policy."""
+    cron = CronSpec(spec)
+    if overlap not in SCHEDULE_OVERLAP_POLICIES:
+        raise ValueError(f"overlap must be one of {', '.join(SCHEDULE_OVERLAP_POLICIES)}")
+    max_runtime = int(max_runtime or SCHEDULE_MAX_RUNTIME)
+    if max_runtime <= 0:
+        raise ValueError("max runtime must be positive")
+    save_schedule_db(user_id, file_name, cron.text, max_runtime, overlap)
+    sched = {"spec": cron, "max_runtime": max_runtime, "overlap": overlap, "next": cron.next_after(datetime.now())}
+    script_schedules[(user_id, file_name)] = sched
+    _push_schedule((user_id, file_name), sched)
+    return sched
+
+def remove_schedule(user_id: int, file_name: str) -> bool:
+    if script_schedules.pop((user_id, file_name), None) is None:
+        return False
+    delete_schedule_db(user_id, file_name)
+    return True
+
+def load_schedules():
+    for user_id, file_name, spec, max_runtime, overlap in load_schedules_db():
+        try:
+            cron = CronSpec(spec)
+        except ValueError as e:
+            logger.warning(f"Ignoring schedule {user_id}_{file_name} ({spec}): {e}")
+            continue
+        sched = {"spec": cron, "max_runtime": max_runtime, "overlap": overlap, "next": cron.next_after(datetime.now())}
+        script_schedules[(user_id, file_name)] = sched
+        heapq.heappush(_schedule_heap, (sched["next"], (user_id, file_name)))
+    if script_schedules:
+        logger.info(f"Loaded {len(script_schedules)} schedule(s)")
+
+def finish_scheduled_run(info: dict):
+    """Record how a scheduled run ended; called from drop_script."""
+    try:
+        code = info["process"].poll()
+    except Exception:
+        code = None
+    status = info.get("run_status") or ("ok" if code == 0 else "failed" if code and code > 0 else "stopped")
+    try:
+        finish_script_run_db(info["run_id"], code, status)
+    except Exception as e:
+        logger.error(f"Recording run {info['run_id']} failed: {e}")
+
+def enforce_max_runtime():
+    now = datetime.now()
+    for key, info in list(bot_scripts.items()):
+        limit = info.get("max_runtime")
+        if not limit or (now - info["start_time"]).total_seconds() <= limit:
+            continue
+        logger.info(f"Scheduled run {key} exceeded {limit}s, stopping")
+        info["run_status"] = "timeout"
+        kill_process_tree(info)
+        drop_script(key, info)
+
+def fire_schedule(user_id: int, file_name: str, sched: dict):
+    key = f"{user_id}_{file_name}"
+    ft = get_user_file_type(user_id, file_name)
+    if ft is None:
+        logger.info(f"Schedule for {key}: file is gone, removing schedule")
+        remove_schedule(user_id, file_name)
+        return
+    if is_bot_running(user_id, file_name):
+        if sched["overlap"] == "skip":
+            add_script_run(user_id, file_name, "skipped")
+            return
+        stop_script(user_id, file_name)
+    run_id = add_script_run(user_id, file_name)
+    future = queue_start(user_id, file_name, ft, run={"run_id": run_id, "max_runtime": sched["max_runtime"]})
+
+    def on_done(f):
+        if not f.result():
+            finish_script_run_db(run_id, None, "failed")
+    future.add_done_callback(on_done)
+
+def schedule_loop():
+    while True:
+        with _schedule_cond:
+            while True:
+                if not _schedule_heap:
+                    _schedule_cond.wait()
+                    continue
+                when, key = _schedule_heap[0]
+                delay = (when - datetime.now()).total_seconds()
+                if delay <= 0:
+                    heapq.heappop(_schedule_heap)
+                    break
+                _schedule_cond.wait(timeout=min(delay, 60))
+        sched = script_schedules.get(key)
+        if not sched or sched["next"] != when:
+            continue  # changed or removed since this entry was pushed
+        # From the later of due time and now, so a stalled host doesn't replay missed runs.
+        sched["next"] = sched["spec"].next_after(max(when, datetime.now()))
+        _push_schedule(key, sched)
+        try:
+            with trace_span("schedule.fire", file_name=key[1]):
+                fire_schedule(key[0], key[1], sched)
+        except Exception as e:
+            logger.error(f"Scheduled start {key} failed: {e}", exc_info=True)
+
+def start_script_scheduler():
+    load_schedules()
+    threading.Thread(target=schedule_loop, daemon=True, name="script-scheduler").start()
+
+def schedule_summary(user_id: int, file_name: str) -> str:
+    sched = script_schedules.get((user_id, file_name))
+    if not sched:
+        return "⏰ Schedule: none (runs only when started)"
+    return (f"⏰ Schedule: `{sched['spec'].text}`, max {sched['max_runtime']}s, overlap {sched['overlap']}\n"
+            f"⏭️ Next: {sched['next']:%Y-%m-%d %H:%M:%S}")
+
+
+# =========================
+# SUBSCRIPTIONS
+# =========================
+# Tiers are a cached set lookup; the scheduler below keeps `premium_users` in
+# sync by sleeping until the earliest expiry in `_expiry_heap`. Heap entries
+# are never removed on renew/cancel: a popped entry is ignored unless it still
+# matches user_subscriptions.
+_expiry_cond = threading.Condition()
+
+def get_user_tier(user_id: int) -> str:
+    if user_id == OWNER_ID:
+        return "owner"
+    if user_id in admin_ids:
+        return "admin"
+    if user_id in premium_users:
+        return "premium"
+    return "free"
+
+def set_subscription(user_id: int, expiry: datetime):
+    save_subscription_db(user_id, expiry)
+    user_subscriptions[user_id] = {"expiry": expiry}
+    if expiry > datetime.now():
+        premium_users.add(user_id)
+    else:
+        premium_users.discard(user_id)
+    with _expiry_cond:
+        heapq.heappush(_expiry_heap, (expiry, user_id))
+        _expiry_cond.notify()
+
+def remove_subscription(user_id: int) -> list:
+    delete_subscription_db(user_id)
+    user_subscriptions.pop(user_id, None)
+    premium_users.discard(user_id)
+    return enforce_running_limit(user_id)
+
+def enforce_running_limit(user_id: int) -> list:
+    """Stop the most recently started scripts above the user's current limit."""
+    limit = get_user_file_limit(user_id)
+    if limit == float("inf"):
+        return []
+    mine = sorted(
+        (info for info in list(bot_scripts.values()) if info.get("script_owner_id") == user_id),
+        key=lambda info: info.get("start_time") or datetime.min
+    )
+    stopped = []
+    for info in mine[int(limit):]:
+        kill_process_tree(info)
+        drop_script(info["script_key"], info)
+        stopped.append(info["file_name"])
+    return stopped
+
+def expire_subscription(user_id: int):
+    stopped = remove_subscription(user_id)
+    logger.info(f"Subscription expired for {user_id}; stopped {len(stopped)} script(s)")
+    text = f"⌛ Your premium subscription has expired.\n🆓 You are now a Free user (limit: {FREE_USER_LIMIT})."
+    if stopped:
+        text += "\n🔴 Stopped: " + ", ".join(stopped)
+    try:
+        bot.send_message(user_id, text)
+    except Exception:
+        pass
+
+def expiry_scheduler_loop():
+    while True:
+        with _expiry_cond:
+            while True:
+                if not _expiry_heap:
+                    _expiry_cond.wait()
+                    continue
+                expiry, user_id = _expiry_heap[0]
+                delay = (expiry - datetime.now()).total_seconds()
+                if delay <= 0:
+                    heapq.heappop(_expiry_heap)
+                    break
+                # capped so wall-clock jumps are picked up within the hour
+                _expiry_cond.wait(timeout=min(delay, 3600))
+        sub = user_subscriptions.get(user_id)
+        if not sub or sub["expiry"] != expiry:
+            continue  # renewed or removed since this entry was pushed
+        try:
+            expire_subscription(user_id)
+        except Exception as e:
+            logger.error(f"Expire subscription {user_id} failed: {e}", exc_info=True)
+
+def start_expiry_scheduler():
+    threading.Thread(target=expiry_scheduler_loop, daemon=True, name="expiry-scheduler").start()
+
+
+# =========================
+# PRE-SCAN
+# =========================
+# Static risk scan run before the owner sees an upload. Each distinct finding
+# adds its weight once; results are cached by content hash.
+AUTO_APPROVE_KNOWN = os.environ.get("AUTO_APPROVE_KNOWN", "0") == "1"
+QUEUE_PAGE_SIZE = int(os.environ.get("QUEUE_PAGE_SIZE", "8"))
+
+PY_RISKY_IMPORTS = {
+    "subprocess": 3, "os": 1, "shutil": 2, "socket": 2, "ctypes": 4, "pty": 4,
+    "multiprocessing": 1, "marshal": 3, "pickle": 2, "importlib": 2, "signal": 1,
+}
+PY_RISKY_CALLS = {
+    "eval": 5, "exec": 5, "compile": 3, "__import__": 3, "getattr": 1,
+    "os.system": 5, "os.popen": 5, "os.fork": 3, "os.kill": 4, "os.killpg": 4,
+    "os.remove": 2, "os.unlink": 2, "os.rmdir": 2, "os.setuid": 5, "os.execv": 5, "os.execvp": 5,
+    "shutil.rmtree": 4, "subprocess.Popen": 4, "subprocess.run": 4, "subprocess.call": 4,
+    "subprocess.check_call": 4, "subprocess.check_output": 4, "subprocess.getoutput": 4,
+    "pty.spawn": 5, "socket.socket": 2, "ctypes.CDLL": 4, "marshal.loads": 4, "pickle.loads": 3,
+}
+JS_RISKY_PATTERNS = [
+    (re.compile(r"""(require\(\s*['"]|from\s+['"])(node:)?child_process['"]"""), "imports child_process", 4),
+    (re.compile(r"""(require\(\s*['"]|from\s+['"])(node:)?(vm|worker_threads|cluster)['"]"""), "imports vm/worker_threads/cluster", 2),
+    (re.compile(r"""(require\(\s*['"]|from\s+['"])(node:)?(net|dgram)['"]"""), "imports raw sockets", 2),
+    (re.compile(r"\b(execSync|execFile|execFileSync|spawn|spawnSync|fork)\s*\("), "spawns processes", 4),
+    (re.compile(r"\beval\s*\("), "eval()", 5),
+    (re.compile(r"\bnew\s+Function\s*\("), "new Function()", 4),
+    (re.compile(r"\b(rmSync|rmdirSync|unlinkSync)\s*\(|\bfs\.(promises\.)?(rm|rmdir|unlink)\s*\("), "deletes files", 2),
+    (re.compile(r"\bprocess\.(kill|exit|binding)\b"), "process.kill/exit/binding", 2),
+    (re.compile(r"\bprocess\.env\b"), "reads process.env", 1),
+]
+
+def _dotted_name(node) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else node.attr
+    return ""
+
+def scan_python_source(source: str):
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        return 3, [f"syntax error (line {e.lineno}), not analysable"]
+    found = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                root = alias.name.split(".")[0]
+                if root in PY_RISKY_IMPORTS:
+                    found[f"import {root}"] = PY_RISKY_IMPORTS[root]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            root = node.module.split(".")[0]
+            if root in PY_RISKY_IMPORTS:
+                found[f"import {root}"] = PY_RISKY_IMPORTS[root]
+            for alias in node.names:
+                dotted = f"{node.module}.{alias.name}"
+                if dotted in PY_RISKY_CALLS:
+                    found[f"from-import {dotted}"] = PY_RISKY_CALLS[dotted]
+        elif isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name in PY_RISKY_CALLS:
+                found[f"call {name}()"] = PY_RISKY_CALLS[name]
+    return sum(found.values()), sorted(found, key=lambda k: -found[k])
+
+def scan_js_source(source: str):
+    found = {label: weight for rx, label, weight in JS_RISKY_PATTERNS if rx.search(source)}
+    return sum(found.values()), sorted(found, key=lambda k: -found[k])
+
+def scan_tree(root: str):
+    score, findings = 0, []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in ("node_modules", "__pycache__", ".git")]
+        for fn in filenames:
+            if not fn.endswith((".py", ".js")):
+                continue
+            path = os.path.join(dirpath, fn)
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    src = f.read()
+            except OSError:
+                continue
+            s, fs = scan_python_source(src) if fn.endswith(".py") else scan_js_source(src)
+            rel = os.path.relpath(path, root)
+            score += s
+            findings.extend(f"{rel}: {x}" for x in fs)
+    return score, findings
+
+@traced("prescan")
+def prescan(content: bytes, kind: str, root: str = None):
+    """
+    Risk-scan an upload. `kind` is "py", "js" or "zip" (then `root` is the
+    extracted folder). Returns (content_hash, risk_score, findings).
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+    cached = get_scan_cache(content_hash)
+    if cached:
+        trace_annotate(cache="hit")
+        return (content_hash,) + cached
+    text = content.decode("utf-8", errors="ignore")
+    if kind == "zip":
+        score, findings = scan_tree(root)
+    elif kind == "js":
+        score, findings = scan_js_source(text)
+    else:
+        score, findings = scan_python_source(text)
+    save_scan_cache(content_hash, score, findings)
+    return content_hash, score, findings
+
+def risk_label(score: int) -> str:
+    if score >= 10:
+        return f"🔴 {score}"
+    if score >= 4:
+        return f"🟠 {score}"
+    return f"🟢 {score}"
+
+def format_findings(findings: list, limit: int = 6) -> str:
+    if not findings:
+        return "none"
+    more = f"\n  … +{len(findings) - limit} more" if len(findings) > limit else ""
+    return "\n".join(f"  • {md_escape(x)}" for x in findings[:limit]) + more
 
 
 # =========================
@@ -490,6 +2760,14 @@ def handle_zip_file(downloaded_file_content: bytes, file_name_zip: str, message)
                 p = os.path.abspath(os.path.join(temp_dir, m.filename))
                 if not p.startswith(os.path.abspath(temp_dir)):
                     raise zipfile.BadZipFile("Unsafe zip paths detected")
+            # quota on the uncompressed size, minus what the move below overwrites
+            incoming = sum(m.file_size for m in z.infolist())
+            top_level = {m.filename.split("/", 1)[0] for m in z.infolist()} - {"", file_name_zip}
+            replaced = sum(_path_size(os.path.join(user_folder, name)) for name in top_level)
+            quota_error = check_disk_quota(user_id, incoming, replaced)
+            if quota_error:
+                bot.reply_to(message, quota_error)
+                return
             z.extractall(temp_dir)
 
         # Detect main script
@@ -499,10 +2777,15 @@ def handle_zip_file(downloaded_file_content: bytes, file_name_zip: str, message)
 
         main_script_name = None
         file_type = None
-        for cand in ["main.py", "bot.py", "app.py"]:
-            if cand in py_files:
-                main_script_name, file_type = cand, "py"
-                break
+        if "package.json" in items:
+            main_script_name = package_json_main(temp_dir)
+            if main_script_name:
+                file_type = "js"
+        if not main_script_name:
+            for cand in ["main.py", "bot.py", "app.py"]:
+                if cand in py_files:
+                    main_script_name, file_type = cand, "py"
+                    break
         if not main_script_name:
             for cand in ["index.js", "main.js", "bot.js", "app.js"]:
                 if cand in js_files:
@@ -518,21 +2801,29 @@ def handle_zip_file(downloaded_file_content: bytes, file_name_zip: str, message)
             bot.reply_to(message, "❌ ZIP has no .py file.")
             return
 
+        content_hash, risk_score, findings = prescan(downloaded_file_content, "zip", root=temp_dir)
+
         # Move extracted to user folder (overwrite)
         for item in os.listdir(temp_dir):
             if item == file_name_zip:
                 continue
             src = os.path.join(temp_dir, item)
             dst = os.path.join(user_folder, item)
+            delta = _path_size(src) - _path_size(dst)
             if os.path.isdir(dst):
                 shutil.rmtree(dst)
             elif os.path.exists(dst):
                 os.remove(dst)
             shutil.move(src, dst)
+            disk_usage_add(user_id, delta)
 
         # Save file record (but DO NOT run)
         save_user_file(user_id, main_script_name, file_type)
-        pending_id = add_pending_approval(user_id, chat_id, main_script_name, file_type)
+        pending_id = add_pending_approval(user_id, chat_id, main_script_name, file_type, content_hash, risk_score)
+
+        if AUTO_APPROVE_KNOWN and is_hash_approved(content_hash):
+            auto_approve(pending_id, message, f"📦 ZIP `{file_name_zip}`")
+            return
 
         bot.reply_to(
             message,
@@ -544,10 +2835,11 @@ def handle_zip_file(downloaded_file_content: bytes, file_name_zip: str, message)
         try:
             owner_text = (
                 f"🛑 ZIP Approval Required\n\n"
-                f"👤 User: {message.from_user.first_name}\n"
+                f"👤 User: {md_escape(message.from_user.first_name)}\n"
                 f"🆔 ID: `{user_id}`\n"
                 f"📦 ZIP: `{file_name_zip}`\n"
-                f"▶️ Main: `{main_script_name}` ({file_type})\n\n"
+                f"▶️ Main: `{main_script_name}` ({file_type})\n"
+                f"⚠️ Risk: {risk_label(risk_score)}\n{format_findings(findings)}\n\n"
                 f"Approve or Reject:"
             )
             bot.send_message(OWNER_ID, owner_text, parse_mode="Markdown", reply_markup=approval_markup(pending_id))
@@ -568,92 +2860,98 @@ def handle_zip_file(downloaded_file_content: bytes, file_name_zip: str, message)
 # =========================
 # CORE LOGIC
 # =========================
-def _logic_send_welcome(message):
-    user_id = message.from_user.id
-    chat_id = message.chat.id
-    user_name = message.from_user.first_name
-    user_username = message.from_user.username
-
-    if bot_locked and user_id not in admin_ids:
-        bot.send_message(chat_id, "⚠️ Bot is locked by admin. Try later.")
-        return
-
-    if user_id not in active_users:
-        add_active_user(user_id)
-        try:
-            bot.send_message(
-                OWNER_ID,
-                f"🎉 New user!\n👤 Name: {user_name}\n✳️ User: @{user_username or 'N/A'}\n🆔 ID: `{user_id}`",
-                parse_mode="Markdown"
-            )
-        except Exception:
-            pass
+def new_user_text(user) -> str:
+    return f"🎉 New user!\n👤 Name: {user.first_name}\n✳️ User: @{user.username or 'N/A'}\n🆔 ID: `{user.id}`"
 
+def welcome_text(user) -> str:
+    user_id = user.id
     file_limit = get_user_file_limit(user_id)
     current_files = get_user_file_count(user_id)
     limit_str = str(file_limit) if file_limit != float("inf") else "Unlimited"
+    disk_quota = get_disk_quota(user_id)
+    disk_str = _fmt_bytes(disk_quota) if disk_quota != float("inf") else "Unlimited"
 
-    status = "🆓 Free User"
-    if user_id == OWNER_ID:
-        status = "👑 Owner"
-    elif user_id in admin_ids:
-        status = "🛡️ Admin"
-    elif user_id in user_subscriptions and user_subscriptions[user_id].get("expiry", datetime.min) > datetime.now():
-        status = "⭐ Premium"
+    status = TIER_LABELS[get_user_tier(user_id)]
 
-    text = (
-        f"〽️ Welcome, {user_name}!\n\n"
+    return (
+        f"〽️ Welcome, {user.first_name}!\n\n"
         f"🆔 Your ID: `{user_id}`\n"
-        f"✳️ Username: `@{user_username or 'Not set'}`\n"
+        f"✳️ Username: `@{user.username or 'Not set'}`\n"
         f"🔰 Status: {status}\n"
-        f"📁 Files: {current_files} / {limit_str}\n\n"
+        f"📁 Files: {current_files} / {limit_str}\n"
+        f"💾 Disk: {_fmt_bytes(get_disk_usage(user_id))} / {disk_str}\n\n"
         f"✅ Upload .py / .zip\n"
         f"🛑 Files run only after OWNER approval.\n"
         f"👤 OWNER :- `@ahmed_snde`\n"
     )
 
-    bot.send_message(chat_id, text, reply_markup=create_reply_keyboard_main_menu(user_id), parse_mode="Markdown")
-
-def _logic_upload_file(message):
+def _logic_send_welcome(message):
     user_id = message.from_user.id
+    chat_id = message.chat.id
+
     if bot_locked and user_id not in admin_ids:
-        bot.reply_to(message, "⚠️ Bot locked.")
+        bot.send_message(chat_id, "⚠️ Bot is locked by admin. Try later.")
         return
+
+    if not is_active_user(user_id):
+        add_active_user(user_id)
+        try:
+            bot.send_message(OWNER_ID, new_user_text(message.from_user), parse_mode="Markdown")
+        except Exception:
+            pass
+
+    text = welcome_text(message.from_user)
+    bot.send_message(chat_id, text, reply_markup=create_reply_keyboard_main_menu(user_id), parse_mode="Markdown")
+
+def upload_prompt(user_id: int) -> str:
+    if bot_locked and user_id not in admin_ids:
+        return "⚠️ Bot locked."
     file_limit = get_user_file_limit(user_id)
     if get_user_file_count(user_id) >= file_limit:
-        bot.reply_to(message, "⚠️ File limit reached. Delete some files first.")
-        return
-    bot.reply_to(message, "📤 Send `.py` / `.zip` file.\n🛑 It will wait for OWNER approval.")
+        return "⚠️ File limit reached. Delete some files first."
+    return "📤 Send `.py` / `.zip` file.\n🛑 It will wait for OWNER approval."
 
-def _logic_check_files(message):
-    user_id = message.from_user.id
-    files = user_files.get(user_id, [])
+def _logic_upload_file(message):
+    bot.reply_to(message, upload_prompt(message.from_user.id))
+
+def files_markup(user_id: int, back: bool = False):
+    """One button per file with its running state; None if the user has no files."""
+    files = get_user_files(user_id)
     if not files:
-        bot.reply_to(message, "📂 No files uploaded yet.")
-        return
+        return None
     m = types.InlineKeyboardMarkup(row_width=1)
     for fn, ft in sorted(files):
         running = is_bot_running(user_id, fn)
         icon = "🟢 Running" if running else "🔴 Stopped"
         m.add(types.InlineKeyboardButton(f"{fn} ({ft}) - {icon}", callback_data=f"file_{user_id}_{fn}"))
+    if back:
+        m.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
+    return m
+
+def _logic_check_files(message):
+    m = files_markup(message.from_user.id)
+    if m is None:
+        bot.reply_to(message, "📂 No files uploaded yet.")
+        return
     bot.reply_to(message, "📂 Your files:", reply_markup=m)
 
 def _logic_bot_speed(message):
-    t0 = time.time()
-    msg = bot.reply_to(message, "🏃 Testing...")
-    ms = round((time.time() - t0) * 1000, 2)
-    bot.edit_message_text(f"⚡ Pong: {ms} ms", message.chat.id, msg.message_id)
+    msg = bot.reply_to(message, f"🏃 Testing ({SPEED_TEST_ROUNDS} rounds)...")
+    samples = run_speed_suite(message.chat.id)
+    bot.edit_message_text(format_speed_report(samples), message.chat.id, msg.message_id, parse_mode="Markdown")
 
-def _logic_statistics(message):
-    user_id = message.from_user.id
-    total_users = len(active_users)
-    total_files = sum(len(v) for v in user_files.values())
-    running = sum(1 for k, v in list(bot_scripts.items()) if is_bot_running(int(k.split("_", 1)[0]), v["file_name"]))
-    your_running = sum(1 for fn, ft in user_files.get(user_id, []) if is_bot_running(user_id, fn))
-    bot.reply_to(
-        message,
-        f"📊 Stats\n\n👥 Users: {total_users}\n📂 Files: {total_files}\n🟢 Running bots: {running}\n🤖 Your running: {your_running}"
+def statistics_text(user_id: int) -> str:
+    snap = get_stats_snapshot(user_id)
+    text = (
+        f"📊 Stats\n\n👥 Users: {snap['total_users']}\n📂 Files: {snap['total_files']}\n"
+        f"🟢 Running bots: {snap['running']}\n🤖 Your running: {snap['your_running']}"
     )
+    if user_id in admin_ids:
+        text += "\n\n" + build_admin_stats()
+    return text
+
+def _logic_statistics(message):
+    bot.reply_to(message, statistics_text(message.from_user.id))
 
 def _logic_contact_owner(message):
     m = types.InlineKeyboardMarkup()
@@ -680,56 +2978,96 @@ BUTTON_TEXT_TO_LOGIC = {
 }
 
 
-# =========================
-# APPROVE / REJECT CALLBACKS
-# =========================
+# =========================
+# APPROVE / REJECT CALLBACKS
+# =========================
+def approve_pending(pending_id: int, status_message) -> str:
+    """
+    Queue dependency install + start of an approved upload. Returns "ok",
+    "handled" (no such row) or "missing" (file gone).
+    """
+    row = get_pending_approval(pending_id)
+    if not row:
+        return "handled"
+
+    _, user_id, chat_id, file_name, file_type, content_hash = row
+    user_id = int(user_id)
+    chat_id = int(chat_id)
+
+    user_folder = get_user_folder(user_id)
+    file_path = os.path.join(user_folder, file_name)
+    if not os.path.exists(file_path):
+        delete_pending_approval(pending_id)
+        return "missing"
+
+    # ✅ Install requirements only after approve (ZIP or folder cases), then run
+    queue_start(user_id, file_name, file_type, status_message, notify_chat_id=chat_id)
+
+    if content_hash:
+        mark_hash_approved(content_hash)
+    delete_pending_approval(pending_id)
+    return "ok"
+
+def reject_pending(pending_id: int) -> bool:
+    row = get_pending_approval(pending_id)
+    if not row:
+        return False
+
+    _, user_id, chat_id, file_name, file_type, _ = row
+    user_id = int(user_id)
+    chat_id = int(chat_id)
+
+    # Optional delete file
+    try:
+        user_folder = get_user_folder(user_id)
+        fp = os.path.join(user_folder, file_name)
+        if os.path.exists(fp):
+            size = _path_size(fp)
+            os.remove(fp)
+            disk_usage_add(user_id, -size)
+    except Exception:
+        pass
+
+    try:
+        remove_user_file_db(user_id, file_name)
+    except Exception:
+        pass
+
+    try:
+        bot.send_message(chat_id, "❌ FILE REJECTED ❌\n \nYour file has been rejected by the administrator.\nReason: The file contains suspicious code patterns that pose a security risk.\nPlease review your code and remove any potentially harmful operations.")
+    except Exception:
+        pass
+
+    delete_pending_approval(pending_id)
+    return True
+
+def auto_approve(pending_id: int, message, what: str):
+    """Approve an upload whose exact content the owner approved before."""
+    bot.reply_to(message, "✅ Uploaded. Identical code was approved before, starting automatically.")
+    result = approve_pending(pending_id, message)
+    try:
+        bot.send_message(
+            OWNER_ID,
+            f"🤖 Auto-approved {what} from `{message.from_user.id}` (known hash): {result}",
+            parse_mode="Markdown"
+        )
+    except Exception:
+        pass
+
 def approve_pending_callback(call):
     if call.from_user.id != OWNER_ID:
         bot.answer_callback_query(call.id, "Owner only.", show_alert=True)
         return
 
     pending_id = int(call.data.split("_", 1)[1])
-    row = get_pending_approval(pending_id)
-    if not row:
+    if not get_pending_approval(pending_id):
         bot.answer_callback_query(call.id, "Already handled.", show_alert=True)
         return
 
-    _, user_id, chat_id, file_name, file_type = row
-    user_id = int(user_id)
-    chat_id = int(chat_id)
-
-    user_folder = get_user_folder(user_id)
-    file_path = os.path.join(user_folder, file_name)
-    if not os.path.exists(file_path):
-        bot.answer_callback_query(call.id, "File missing.", show_alert=True)
-        delete_pending_approval(pending_id)
-        return
-
     bot.answer_callback_query(call.id, "Approved ✅")
     bot.edit_message_text("✅ Approved. Installing (if any) + starting ...", call.message.chat.id, call.message.message_id)
-
-    # ✅ Install requirements only after approve (ZIP or folder cases)
-    ok = install_requirements_if_present(user_folder, call.message)
-    if not ok:
-        try:
-            bot.send_message(chat_id, "❌ Your code was approved but dependencies failed to install. Re-upload with correct requirements.txt.")
-        except Exception:
-            pass
-        delete_pending_approval(pending_id)
-        return
-
-    # ✅ Run
-    if file_type == "py":
-        threading.Thread(target=run_script, args=(file_path, user_id, user_folder, file_name, call.message), daemon=True).start()
-    elif file_type == "js":
-        threading.Thread(target=run_js_script, args=(file_path, user_id, user_folder, file_name, call.message), daemon=True).start()
-
-    try:
-        bot.send_message(chat_id, f"✅ Approved. Now running `{file_name}`.", parse_mode="Markdown")
-    except Exception:
-        pass
-
-    delete_pending_approval(pending_id)
+    if approve_pending(pending_id, call.message) == "missing":
+        bot.edit_message_text("⚠️ File missing.", call.message.chat.id, call.message.message_id)
 
 def reject_pending_callback(call):
     if call.from_user.id != OWNER_ID:
@@ -737,81 +3075,597 @@ def reject_pending_callback(call):
         return
 
     pending_id = int(call.data.split("_", 1)[1])
-    row = get_pending_approval(pending_id)
-    if not row:
+    if not get_pending_approval(pending_id):
         bot.answer_callback_query(call.id, "Already handled.", show_alert=True)
         return
 
-    _, user_id, chat_id, file_name, file_type = row
-    user_id = int(user_id)
-    chat_id = int(chat_id)
-
     bot.answer_callback_query(call.id, "Rejected ❌")
     bot.edit_message_text("❌ Rejected. User notified.", call.message.chat.id, call.message.message_id)
+    reject_pending(pending_id)
 
-    # Optional delete file
+
+# =========================
+# APPROVAL QUEUE
+# =========================
+def render_queue_page(page: int):
+    total, rows = list_pending_approvals(page * QUEUE_PAGE_SIZE, QUEUE_PAGE_SIZE)
+    pages = max(1, (total + QUEUE_PAGE_SIZE - 1) // QUEUE_PAGE_SIZE)
+    if page >= pages and page > 0:
+        return render_queue_page(pages - 1)
+
+    m = types.InlineKeyboardMarkup(row_width=3)
+    if not rows:
+        return "📭 Approval queue is empty.", m, page
+
+    lines = [f"🗂️ Approval queue — {total} pending (page {page + 1}/{pages}, riskiest first)\n"]
+    for pid, uid, fn, ft, score, findings in rows:
+        top = json.loads(findings or "[]")[:2]
+        lines.append(f"#{pid} {risk_label(score)} `{fn}` ({ft}) · user `{uid}`")
+        lines.extend(f"    • {md_escape(x)}" for x in top)
+        m.add(
+            types.InlineKeyboardButton(f"✅ #{pid}", callback_data=f"qa_{pid}_{page}"),
+            types.InlineKeyboardButton(f"❌ #{pid}", callback_data=f"qr_{pid}_{page}"),
+        )
+    m.add(
+        types.InlineKeyboardButton("✅ Approve page", callback_data=f"qapprove_{page}"),
+        types.InlineKeyboardButton("❌ Reject page", callback_data=f"qreject_{page}"),
+    )
+    nav = []
+    if page > 0:
+        nav.append(types.InlineKeyboardButton("⬅️", callback_data=f"queue_{page - 1}"))
+    nav.append(types.InlineKeyboardButton("🔄", callback_data=f"queue_{page}"))
+    if page + 1 < pages:
+        nav.append(types.InlineKeyboardButton("➡️", callback_data=f"queue_{page + 1}"))
+    m.add(*nav)
+    return "\n".join(lines), m, page
+
+def show_queue(chat_id: int, page: int, message_id: int = None):
+    text, markup, _ = render_queue_page(page)
+    if message_id is None:
+        return bot.send_message(chat_id, text, parse_mode="Markdown", reply_markup=markup)
     try:
-        user_folder = get_user_folder(user_id)
-        fp = os.path.join(user_folder, file_name)
-        if os.path.exists(fp):
-            os.remove(fp)
+        return bot.edit_message_text(text, chat_id, message_id, parse_mode="Markdown", reply_markup=markup)
     except Exception:
-        pass
+        pass  # "message is not modified"
 
+def _apply_queue_action(pending_ids: list, approve: bool, status_message, page: int):
+    done = 0
+    for pid in pending_ids:
+        try:
+            ok = approve_pending(pid, status_message) == "ok" if approve else reject_pending(pid)
+            if ok:
+                done += 1
+        except Exception as e:
+            logger.error(f"Queue action on #{pid} failed: {e}", exc_info=True)
+    verb = "Approved" if approve else "Rejected"
     try:
-        remove_user_file_db(user_id, file_name)
+        bot.send_message(status_message.chat.id, f"{'✅' if approve else '❌'} {verb} {done}/{len(pending_ids)}.")
     except Exception:
         pass
+    show_queue(status_message.chat.id, page, status_message.message_id)
+
+def queue_callback(call):
+    if call.from_user.id != OWNER_ID:
+        bot.answer_callback_query(call.id, "Owner only.", show_alert=True)
+        return
+    action, rest = call.data.split("_", 1)
+    chat_id, message_id = call.message.chat.id, call.message.message_id
+
+    if action == "queue":
+        bot.answer_callback_query(call.id)
+        return show_queue(chat_id, int(rest), message_id)
+
+    if action in ("qa", "qr"):
+        pid_str, page_str = rest.split("_", 1)
+        ids, page = [int(pid_str)], int(page_str)
+    else:
+        page = int(rest)
+        _, rows = list_pending_approvals(page * QUEUE_PAGE_SIZE, QUEUE_PAGE_SIZE)
+        ids = [r[0] for r in rows]
+
+    approve = action in ("qa", "qapprove")
+    bot.answer_callback_query(call.id, f"{'Approving' if approve else 'Rejecting'} {len(ids)} ...")
+    # Installs can take a while; don't hold the callback worker.
+    threading.Thread(target=_apply_queue_action, args=(ids, approve, call.message, page), daemon=True).start()
+
+# =========================
+# SCRIPT ACTIONS (shared by the sync and async handlers)
+# =========================
+def stop_script(owner: int, file_name: str):
+    key = f"{owner}_{file_name}"
+    info = bot_scripts.get(key)
+    if info:
+        kill_process_tree(info)
+        drop_script(key)
+
+def file_panel_text(owner: int, file_name: str):
+    running = is_bot_running(owner, file_name)
+    ft = get_user_file_type(owner, file_name) or "?"
+    node = (bot_scripts.get(f"{owner}_{file_name}") or {}).get("node") if running else None
+    text = f"⚙️ `{file_name}` ({ft})\nStatus: {'🟢 Running' if running else '🔴 Stopped'}" + (f" on {node}" if node else "")
+    if (owner, file_name) in script_schedules:
+        text += "\n" + schedule_summary(owner, file_name)
+    return text, running
+
+def startable_file_type(owner: int, file_name: str):
+    """(file_type, None) if the script can be started, else (None, error text)."""
+    if is_bot_running(owner, file_name):
+        return None, "⚠️ Already running."
+    ft = get_user_file_type(owner, file_name)
+    if not ft:
+        return None, "⚠️ File record not found."
+    if not os.path.exists(os.path.join(get_user_folder(owner), file_name)):
+        remove_user_file_db(owner, file_name)
+        return None, "⚠️ File missing. Re-upload."
+    return ft, None
+
+def delete_script_files(owner: int, file_name: str):
+    remove_schedule(owner, file_name)
+    stop_script(owner, file_name)
+    folder = get_user_folder(owner)
+    fp = os.path.join(folder, file_name)
+    lp = os.path.join(folder, f"{os.path.splitext(file_name)[0]}.log")
+    for path in (fp, lp, lp + ".1"):
+        try:
+            if os.path.exists(path):
+                size = _path_size(path)
+                os.remove(path)
+                disk_usage_add(owner, -size)
+        except Exception:
+            pass
+    remove_user_file_db(owner, file_name)
+
+# Control channel: a line on the script's stdin, or a signal (SIGHUP = reload by convention).
+SCRIPT_INPUT_MAX = 4096  # PIPE_BUF: a line this short is written whole or not at all
+INPUT_PROMPT_TTL = int(os.environ.get("INPUT_PROMPT_TTL", "300"))
+CONTROL_SIGNALS = {"HUP": signal.SIGHUP, "USR1": signal.SIGUSR1, "USR2": signal.SIGUSR2,
+                   "INT": signal.SIGINT, "TERM": signal.SIGTERM}
+awaiting_input = {}  # {(chat_id, user_id): (owner, file_name, deadline)} after "⌨️ Send input"
 
+def write_stdin_line(stdin, text: str):
+    """
+    Write one line to a stdin pipe without ever blocking the caller. Raises
+    BlockingIOError if the script isn't reading (pipe full) and BrokenPipeError
+    if it closed stdin.
+    """
+    data = (text.rstrip("\n") + "\n").encode("utf-8")
+    fd = stdin.fileno()
+    os.set_blocking(fd, False)
+    os.write(fd, data)
+
+def send_script_input(owner: int, file_name: str, text: str):
+    """Write `text` as one line to the running script's stdin; None on success, else an error message."""
+    if len((text + "\n").encode("utf-8")) > SCRIPT_INPUT_MAX:
+        return f"⚠️ Input too long (max {SCRIPT_INPUT_MAX} bytes)."
+    info = bot_scripts.get(f"{owner}_{file_name}")
+    if not info or not is_bot_running(owner, file_name):
+        return "⚠️ Not running."
+    proc = info["process"]
     try:
-        bot.send_message(chat_id, "❌ FILE REJECTED ❌\n \nYour file has been rejected by the administrator.\nReason: The file contains suspicious code patterns that pose a security risk.\nPlease review your code and remove any potentially harmful operations.")
-    except Exception:
-        pass
+        if isinstance(proc, RemoteProcess):
+            proc.write_input(text)
+        elif proc.stdin is None or proc.stdin.closed:
+            return "⚠️ This script has no stdin."
+        else:
+            write_stdin_line(proc.stdin, text)
+    except BlockingIOError:
+        return "⚠️ The script isn't reading its input (pipe is full)."
+    except BrokenPipeError:
+        return "⚠️ The script closed its input."
+    except Exception as e:
+        return f"❌ Input failed: {e}"
+    return None
+
+def signal_script(owner: int, file_name: str, name: str):
+    """Deliver CONTROL_SIGNALS[name] to the running script; None on success, else an error message."""
+    sig = CONTROL_SIGNALS.get(name.upper().removeprefix("SIG"))
+    if sig is None:
+        return f"⚠️ Unknown signal (use one of {', '.join(CONTROL_SIGNALS)})."
+    info = bot_scripts.get(f"{owner}_{file_name}")
+    if not info or not is_bot_running(owner, file_name):
+        return "⚠️ Not running."
+    try:
+        info["process"].send_signal(sig)
+    except Exception as e:
+        return f"❌ Signal failed: {e}"
+    logger.info(f"Sent SIG{name.upper().removeprefix('SIG')} to {owner}_{file_name}")
+    return None
+
+def prompt_script_input(chat_id: int, user_id: int, owner: int, file_name: str) -> str:
+    now = time.monotonic()
+    for key, entry in list(awaiting_input.items()):
+        if entry[2] < now:
+            awaiting_input.pop(key, None)
+    awaiting_input[(chat_id, user_id)] = (owner, file_name, now + INPUT_PROMPT_TTL)
+    return f"⌨️ Send the line to write to `{file_name}`'s stdin, or /cancel."
+
+def is_awaiting_input(message) -> bool:
+    key = (message.chat.id, message.from_user.id)
+    entry = awaiting_input.get(key)
+    if entry is None:
+        return False
+    if entry[2] < time.monotonic():
+        awaiting_input.pop(key, None)
+        return False
+    return message.content_type == "text" and message.text not in BUTTON_TEXT_TO_LOGIC
+
+def answer_script_input(message) -> str:
+    owner, file_name, _ = awaiting_input.pop((message.chat.id, message.from_user.id), (None, None, None))
+    if owner is None:
+        return "⚠️ Input prompt expired."
+    if message.text.strip() == "/cancel":
+        return "❎ Cancelled."
+    error = send_script_input(owner, file_name, message.text)
+    return md_escape(error) if error else f"✅ Sent to `{file_name}`."
+
+SCHEDULE_ACTIONS = ("schedule", "runs", "schoff", *SCHEDULE_PRESETS)
+
+def schedule_panel(owner: int, file_name: str, action: str = "schedule"):
+    """Apply a preset / removal button, then (text, markup) of the schedule panel."""
+    if action == "schoff":
+        remove_schedule(owner, file_name)
+    elif action in SCHEDULE_PRESETS:
+        set_schedule(owner, file_name, SCHEDULE_PRESETS[action])
+    text = (
+        f"⏰ `{file_name}`\n{schedule_summary(owner, file_name)}\n\n"
+        f"Pick a preset, or send a cron spec:\n"
+        f"`/schedule {file_name} */15 * * * * max=300 overlap=skip`"
+    )
+    return text, create_schedule_buttons(owner, file_name, (owner, file_name) in script_schedules)
+
+def runs_text(owner: int, file_name: str) -> str:
+    rows = get_script_runs(owner, file_name)
+    if not rows:
+        return f"🕘 No scheduled runs of `{file_name}` yet."
+    icons = {"ok": "✅", "failed": "❌", "timeout": "⌛", "skipped": "⏭️", "stopped": "🛑", "running": "🟢"}
+    lines = [f"🕘 Last {len(rows)} runs of `{file_name}`"]
+    for started, finished, code, status in rows:
+        took = ""
+        if finished and status != "skipped":
+            took = f", {(datetime.fromisoformat(finished) - datetime.fromisoformat(started)).total_seconds():.0f}s"
+        exit_str = f", exit {code}" if code is not None else ""
+        lines.append(f"{icons.get(status, '•')} {started.replace('T', ' ')} {status}{took}{exit_str}")
+    return "\n".join(lines)
+
+def read_script_log(owner: int, file_name: str, limit: int = 3500):
+    """Last `limit` chars of the script's log, or None if there is none."""
+    lp = os.path.join(get_user_folder(owner), f"{os.path.splitext(file_name)[0]}.log")
+    remote = (bot_scripts.get(f"{owner}_{file_name}") or {}).get("process")
+    if os.path.exists(lp):
+        with open(lp, "r", encoding="utf-8", errors="ignore") as f:
+            txt = f.read()
+    elif isinstance(remote, RemoteProcess):
+        txt = remote.read_log(limit)
+    else:
+        return None
+    if not txt.strip():
+        txt = "(empty)"
+    return txt[-limit:]
 
-    delete_pending_approval(pending_id)
+
+# =========================
+# CONTROL API (automation over HTTP)
+# =========================
+# Routes on the keep-alive Flask app, enabled by CONTROL_API_TOKEN and sent as
+# "Authorization: Bearer <token>". Starts go through the install queue like
+# the ▶️ button; progress is logged instead of replied.
+#   GET  /api/scripts[?user_id=]                     running scripts
+#   GET  /api/scripts/<user_id>/<file>               status
+#   POST /api/scripts/<user_id>/<file>/start|stop
+#   POST /api/scripts/<user_id>/<file>/input         {"text": "..."}
+#   POST /api/scripts/<user_id>/<file>/signal        {"signal": "HUP"}
+def script_status(owner: int, file_name: str) -> dict:
+    info = bot_scripts.get(f"{owner}_{file_name}") or {}
+    running = is_bot_running(owner, file_name)
+    sched = script_schedules.get((owner, file_name))
+    return {
+        "user_id": owner,
+        "file_name": file_name,
+        "file_type": get_user_file_type(owner, file_name),
+        "running": running,
+        "pid": getattr(info.get("process"), "pid", None) if running else None,
+        "node": info.get("node") if running else None,
+        "started_at": info["start_time"].isoformat(timespec="seconds") if running and info.get("start_time") else None,
+        "schedule": sched["spec"].text if sched else None,
+    }
+
+def register_control_api(flask_app):
+    if not CONTROL_API_TOKEN:
+        return
+    from flask import jsonify, request
+
+    def api(rule, methods=("GET",)):
+        def deco(fn):
+            @wraps(fn)
+            def view(*args, **kwargs):
+                if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {CONTROL_API_TOKEN}"):
+                    return jsonify({"error": "unauthorized"}), 401
+                with trace_span(f"control_api.{fn.__name__}"):
+                    return fn(*args, **kwargs)
+            return flask_app.route(rule, methods=list(methods))(view)
+        return deco
+
+    def known_file(user_id, file_name):
+        if get_user_file_type(user_id, file_name) is None:
+            return jsonify({"error": "no such file"}), 404
+        return None
+
+    @api("/api/scripts")
+    def api_list():
+        user_id = request.args.get("user_id", type=int)
+        infos = [i for i in list(bot_scripts.values()) if user_id is None or i["script_owner_id"] == user_id]
+        return jsonify({"scripts": [script_status(i["script_owner_id"], i["file_name"]) for i in infos]})
+
+    @api("/api/scripts/<int:user_id>/<path:file_name>")
+    def api_status(user_id, file_name):
+        return known_file(user_id, file_name) or jsonify(script_status(user_id, file_name))
+
+    @api("/api/scripts/<int:user_id>/<path:file_name>/start", methods=("POST",))
+    def api_start(user_id, file_name):
+        ft, error = startable_file_type(user_id, file_name)
+        if error:
+            return jsonify({"error": error}), 409
+        futures_wait([queue_start(user_id, file_name, ft)], timeout=START_WAIT_SECONDS)
+        status = script_status(user_id, file_name)
+        return jsonify(status), 200 if status["running"] else 202
+
+    @api("/api/scripts/<int:user_id>/<path:file_name>/stop", methods=("POST",))
+    def api_stop(user_id, file_name):
+        missing = known_file(user_id, file_name)
+        if missing:
+            return missing
+        stop_script(user_id, file_name)
+        return jsonify(script_status(user_id, file_name))
+
+    @api("/api/scripts/<int:user_id>/<path:file_name>/input", methods=("POST",))
+    def api_input(user_id, file_name):
+        text = (request.get_json(silent=True) or {}).get("text")
+        if not isinstance(text, str):
+            return jsonify({"error": "expected JSON {\"text\": \"...\"}"}), 400
+        error = known_file(user_id, file_name)
+        if error:
+            return error
+        error = send_script_input(user_id, file_name, text)
+        return (jsonify({"error": error}), 409) if error else jsonify({"ok": True})
+
+    @api("/api/scripts/<int:user_id>/<path:file_name>/signal", methods=("POST",))
+    def api_signal(user_id, file_name):
+        name = str((request.get_json(silent=True) or {}).get("signal", "HUP"))
+        error = known_file(user_id, file_name)
+        if error:
+            return error
+        error = signal_script(user_id, file_name, name)
+        return (jsonify({"error": error}), 409) if error else jsonify({"ok": True})
+
+    logger.info("Control API enabled on /api/scripts")
 
 
 # =========================
 # HANDLERS
 # =========================
 @bot.message_handler(commands=["start", "help"])
+@traced("handler.start")
 def cmd_start(message):
     _logic_send_welcome(message)
 
+@bot.message_handler(commands=["profile"])
+@traced("handler.profile")
+def cmd_profile(message):
+    if message.from_user.id not in admin_ids:
+        bot.reply_to(message, "⚠️ Admin only.")
+        return
+    parts = (message.text or "").split()
+    try:
+        seconds = int(parts[1]) if len(parts) > 1 else 10
+    except ValueError:
+        bot.reply_to(message, "Usage: /profile [seconds]")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    if not _profile_lock.acquire(blocking=False):
+        bot.reply_to(message, "⚠️ A profile capture is already running.")
+        return
+    bot.reply_to(message, f"🔬 Profiling all threads for {seconds}s ...")
+    threading.Thread(target=_run_profile_capture, args=(message, seconds), daemon=True).start()
+
+def _run_profile_capture(message, seconds: int):
+    path = os.path.join(IROTECH_DIR, f"profile_{datetime.now():%Y%m%d_%H%M%S}.folded")
+    try:
+        folded = capture_profile(seconds)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(folded)
+        with open(path, "rb") as f:
+            bot.send_document(
+                message.chat.id, f,
+                caption=f"🔬 {seconds}s profile (folded stacks for flamegraph.pl / speedscope)"
+            )
+    except Exception as e:
+        logger.error(f"Profile capture failed: {e}", exc_info=True)
+        try:
+            bot.reply_to(message, f"❌ Profile error: {e}")
+        except Exception:
+            pass
+    finally:
+        _profile_lock.release()
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+@bot.message_handler(commands=["addsub", "delsub"])
+@traced("handler.subscription")
+def cmd_subscription(message):
+    if message.from_user.id not in admin_ids:
+        bot.reply_to(message, "⚠️ Admin only.")
+        return
+    parts = (message.text or "").split()
+    try:
+        target = int(parts[1])
+        days = int(parts[2]) if parts[0].startswith("/addsub") else 0
+    except (IndexError, ValueError):
+        bot.reply_to(message, "Usage: /addsub <user_id> <days> | /delsub <user_id>")
+        return
+
+    if parts[0].startswith("/delsub"):
+        stopped = remove_subscription(target)
+        bot.reply_to(message, f"✅ Subscription removed for `{target}`. Stopped: {len(stopped)}", parse_mode="Markdown")
+        return
+
+    base = user_subscriptions.get(target, {}).get("expiry")
+    base = base if base and base > datetime.now() else datetime.now()
+    expiry = base + timedelta(days=days)
+    set_subscription(target, expiry)
+    bot.reply_to(message, f"✅ `{target}` is Premium until {expiry:%Y-%m-%d %H:%M}", parse_mode="Markdown")
+    try:
+        bot.send_message(target, f"⭐ You are now Premium until {expiry:%Y-%m-%d %H:%M}.")
+    except Exception:
+        pass
+
+@bot.message_handler(commands=["queue"])
+@traced("handler.queue")
+def cmd_queue(message):
+    if message.from_user.id != OWNER_ID:
+        bot.reply_to(message, "⚠️ Owner only.")
+        return
+    show_queue(message.chat.id, 0)
+
+@bot.message_handler(commands=["topdisk"])
+@traced("handler.topdisk")
+def cmd_topdisk(message):
+    if message.from_user.id not in admin_ids:
+        bot.reply_to(message, "⚠️ Admin only.")
+        return
+    parts = (message.text or "").split()
+    n = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 10
+    rows = top_disk_users(min(n, 50))
+    if not rows:
+        bot.reply_to(message, "💾 Disk index is empty (reconcile still running?).")
+        return
+    lines = [f"💾 Top {len(rows)} disk users"]
+    for uid, size in rows:
+        quota = get_disk_quota(uid)
+        pct = f" ({size / quota * 100:.0f}%)" if quota != float("inf") else ""
+        lines.append(f"`{uid}`: {_fmt_bytes(size)}{pct}")
+    bot.reply_to(message, "\n".join(lines), parse_mode="Markdown")
+
+@bot.message_handler(commands=["schedule"])
+@traced("handler.schedule")
+def cmd_schedule(message):
+    """
+    /schedule                                   list your schedules
+    /schedule <file> off
+    /schedule <file> <spec> [max=<sec>] [overlap=skip|replace]
+    """
+    user_id = message.from_user.id
+    parts = (message.text or "").split()
+    if len(parts) == 1:
+        mine = sorted(fn for uid, fn in script_schedules if uid == user_id)
+        if not mine:
+            bot.reply_to(message, "⏰ No schedules.\nUsage: `/schedule <file> <cron|every 10m> [max=600] [overlap=skip|replace]`", parse_mode="Markdown")
+            return
+        bot.reply_to(message, "\n\n".join(f"`{fn}`\n{schedule_summary(user_id, fn)}" for fn in mine), parse_mode="Markdown")
+        return
+    file_name = parts[1]
+    if get_user_file_type(user_id, file_name) is None:
+        bot.reply_to(message, "⚠️ File record not found.")
+        return
+    if len(parts) == 3 and parts[2] == "off":
+        removed = remove_schedule(user_id, file_name)
+        bot.reply_to(message, "✅ Schedule removed." if removed else "⚠️ No schedule for that file.")
+        return
+    options = dict(p.split("=", 1) for p in parts[2:] if "=" in p)
+    spec = " ".join(p for p in parts[2:] if "=" not in p)
+    try:
+        set_schedule(user_id, file_name, spec, options.get("max"), options.get("overlap", "skip"))
+    except ValueError as e:
+        bot.reply_to(message, f"❌ {e}")
+        return
+    bot.reply_to(message, f"✅ `{file_name}` scheduled.\n{schedule_summary(user_id, file_name)}", parse_mode="Markdown")
+
+@bot.message_handler(commands=["backup"])
+@traced("handler.backup")
+def cmd_backup(message):
+    if message.from_user.id not in admin_ids:
+        bot.reply_to(message, "⚠️ Admin only.")
+        return
+    parts = (message.text or "").split()
+    if len(parts) > 1 and parts[1] == "list":
+        names = list_backups()
+        if not names:
+            bot.reply_to(message, "💾 No backups yet.")
+            return
+        bot.reply_to(message, "💾 Backups (newest last):\n" + "\n".join(f"`{n}`" for n in names[-10:]), parse_mode="Markdown")
+        return
+    status = bot.reply_to(message, "💾 Backing up...")
+    try:
+        r = run_backup()
+    except Exception as e:
+        bot.edit_message_text(f"❌ Backup failed: {e}", message.chat.id, status.message_id)
+        return
+    bot.edit_message_text(
+        f"✅ Backup `{r['name']}` in {r['seconds']}s\n"
+        f"📁 {r['files']} files, {_fmt_bytes(r['bytes'])}\n"
+        f"🆕 Stored {r['stored_files']} new ({_fmt_bytes(r['stored_bytes'])})\n"
+        f"🗄️ DB {_fmt_bytes(r['db_bytes'])}" + (f"\n🧹 Pruned {r['pruned']} old" if r["pruned"] else ""),
+        message.chat.id, status.message_id, parse_mode="Markdown"
+    )
+
+@bot.message_handler(func=is_awaiting_input)
+@traced("handler.script_input")
+def handle_script_input(message):
+    bot.reply_to(message, answer_script_input(message), parse_mode="Markdown")
+
 @bot.message_handler(func=lambda m: m.text in BUTTON_TEXT_TO_LOGIC)
+@traced("handler.button")
 def handle_buttons(message):
+    trace_annotate(button=message.text)
     BUTTON_TEXT_TO_LOGIC[message.text](message)
 
 @bot.message_handler(content_types=["document"])
+@traced("handler.upload")
 def handle_file_upload_doc(message):
-    user_id = message.from_user.id
-    chat_id = message.chat.id
+    error = upload_precheck(message)
+    if error:
+        bot.reply_to(message, error)
+        return
 
-    if bot_locked and user_id not in admin_ids:
-        bot.reply_to(message, "⚠️ Bot locked.")
+    # download
+    file_name = message.document.file_name
+    bot.reply_to(message, f"⏳ Downloading `{file_name}` ...", parse_mode="Markdown")
+    try:
+        fi = bot.get_file(message.document.file_id)
+        content = bot.download_file(fi.file_path)
+    except Exception as e:
+        bot.reply_to(message, f"❌ Download error: {e}")
         return
+    finish_upload(message, content)
+
+def upload_precheck(message):
+    """Lock, file-count, extension and disk-quota checks; returns an error text or None."""
+    user_id = message.from_user.id
+    if bot_locked and user_id not in admin_ids:
+        return "⚠️ Bot locked."
 
     # limits
     file_limit = get_user_file_limit(user_id)
     if get_user_file_count(user_id) >= file_limit:
-        bot.reply_to(message, "⚠️ File limit reached. Delete files first.")
-        return
+        return "⚠️ File limit reached. Delete files first."
 
     doc = message.document
     file_name = doc.file_name or ""
     ext = os.path.splitext(file_name)[1].lower()
     if ext not in [".py", ".js", ".zip"]:
-        bot.reply_to(message, "⚠️ Only .py .zip allowed.")
-        return
+        return "⚠️ Only .py .zip allowed."
 
-    # download
-    bot.reply_to(message, f"⏳ Downloading `{file_name}` ...", parse_mode="Markdown")
-    try:
-        fi = bot.get_file(doc.file_id)
-        content = bot.download_file(fi.file_path)
-    except Exception as e:
-        bot.reply_to(message, f"❌ Download error: {e}")
-        return
+    # disk quota (ZIPs are re-checked uncompressed before extraction)
+    replaced = 0 if ext == ".zip" else _path_size(os.path.join(get_user_folder(user_id), file_name))
+    return check_disk_quota(user_id, doc.file_size or 0, replaced)
+
+def finish_upload(message, content: bytes):
+    """Store a downloaded upload, pre-scan it and queue it for approval."""
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    file_name = message.document.file_name
+    ext = os.path.splitext(file_name)[1].lower()
 
     # handle zip
     if ext == ".zip":
@@ -821,14 +3675,21 @@ def handle_file_upload_doc(message):
     # save file
     user_folder = get_user_folder(user_id)
     file_path = os.path.join(user_folder, file_name)
+    replaced = _path_size(file_path)
     with open(file_path, "wb") as f:
         f.write(content)
+    disk_usage_add(user_id, len(content) - replaced)
 
     file_type = "js" if ext == ".js" else "py"
     save_user_file(user_id, file_name, file_type)
+    content_hash, risk_score, findings = prescan(content, file_type)
 
     # ✅ PENDING APPROVAL (DO NOT RUN)
-    pending_id = add_pending_approval(user_id, chat_id, file_name, file_type)
+    pending_id = add_pending_approval(user_id, chat_id, file_name, file_type, content_hash, risk_score)
+
+    if AUTO_APPROVE_KNOWN and is_hash_approved(content_hash):
+        auto_approve(pending_id, message, f"📄 `{file_name}`")
+        return
 
     bot.reply_to(message, "✅ File uploaded.\n⏳ Waiting for OWNER approval before running/hosting.")
 
@@ -836,9 +3697,10 @@ def handle_file_upload_doc(message):
     try:
         owner_text = (
             f"🛑 Approval Required\n\n"
-            f"👤 User: {message.from_user.first_name}\n"
+            f"👤 User: {md_escape(message.from_user.first_name)}\n"
             f"🆔 ID: `{user_id}`\n"
-            f"📄 File: `{file_name}` ({file_type})\n\n"
+            f"📄 File: `{file_name}` ({file_type})\n"
+            f"⚠️ Risk: {risk_label(risk_score)}\n{format_findings(findings)}\n\n"
             f"Approve or Reject:"
         )
         bot.send_message(OWNER_ID, owner_text, parse_mode="Markdown", reply_markup=approval_markup(pending_id))
@@ -848,14 +3710,18 @@ def handle_file_upload_doc(message):
 
 
 @bot.callback_query_handler(func=lambda c: True)
+@traced("handler.callback")
 def handle_callbacks(call):
     data = call.data
+    trace_annotate(action=data.split("_", 1)[0])
 
     # approve/reject
     if data.startswith("approve_"):
         return approve_pending_callback(call)
     if data.startswith("reject_"):
         return reject_pending_callback(call)
+    if data.split("_", 1)[0] in ("queue", "qa", "qr", "qapprove", "qreject"):
+        return queue_callback(call)
 
     user_id = call.from_user.id
     chat_id = call.message.chat.id
@@ -886,16 +3752,10 @@ def handle_callbacks(call):
 
     if data == "check_files":
         bot.answer_callback_query(call.id)
-        files = user_files.get(user_id, [])
-        m = types.InlineKeyboardMarkup(row_width=1)
-        if not files:
-            m.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
+        m = files_markup(user_id, back=True)
+        if m is None:
+            m = types.InlineKeyboardMarkup().add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
             return bot.edit_message_text("📂 No files.", chat_id, call.message.message_id, reply_markup=m)
-        for fn, ft in sorted(files):
-            running = is_bot_running(user_id, fn)
-            icon = "🟢 Running" if running else "🔴 Stopped"
-            m.add(types.InlineKeyboardButton(f"{fn} ({ft}) - {icon}", callback_data=f"file_{user_id}_{fn}"))
-        m.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
         return bot.edit_message_text("📂 Your files:", chat_id, call.message.message_id, reply_markup=m)
 
     if data == "back_main":
@@ -909,10 +3769,9 @@ def handle_callbacks(call):
         owner = int(owner_str)
         if not (user_id == owner or user_id in admin_ids):
             return bot.send_message(chat_id, "⚠️ You can only manage your own files.")
-        running = is_bot_running(owner, fn)
-        ft = next((x[1] for x in user_files.get(owner, []) if x[0] == fn), "?")
+        text, running = file_panel_text(owner, fn)
         return bot.edit_message_text(
-            f"⚙️ `{fn}` ({ft})\nStatus: {'🟢 Running' if running else '🔴 Stopped'}",
+            text,
             chat_id, call.message.message_id,
             parse_mode="Markdown",
             reply_markup=create_control_buttons(owner, fn, running)
@@ -924,23 +3783,11 @@ def handle_callbacks(call):
         owner = int(owner_str)
         if not (user_id == owner or user_id in admin_ids):
             return bot.send_message(chat_id, "⚠️ Permission denied.")
-        if is_bot_running(owner, fn):
-            return bot.send_message(chat_id, "⚠️ Already running.")
-        ft = next((x[1] for x in user_files.get(owner, []) if x[0] == fn), None)
-        if not ft:
-            return bot.send_message(chat_id, "⚠️ File record not found.")
-        folder = get_user_folder(owner)
-        fp = os.path.join(folder, fn)
-        if not os.path.exists(fp):
-            remove_user_file_db(owner, fn)
-            return bot.send_message(chat_id, "⚠️ File missing. Re-upload.")
-        # install requirements only when owner starts? (safe)
-        install_requirements_if_present(folder, call.message)
-        if ft == "py":
-            threading.Thread(target=run_script, args=(fp, owner, folder, fn, call.message), daemon=True).start()
-        else:
-            threading.Thread(target=run_js_script, args=(fp, owner, folder, fn, call.message), daemon=True).start()
-        time.sleep(1)
+        ft, error = startable_file_type(owner, fn)
+        if error:
+            return bot.send_message(chat_id, error)
+        # install dependencies + start on the install queue; wait briefly so quick starts show as running
+        futures_wait([queue_start(owner, fn, ft, call.message)], timeout=START_WAIT_SECONDS)
         running = is_bot_running(owner, fn)
         return bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=create_control_buttons(owner, fn, running))
 
@@ -950,10 +3797,7 @@ def handle_callbacks(call):
         owner = int(owner_str)
         if not (user_id == owner or user_id in admin_ids):
             return bot.send_message(chat_id, "⚠️ Permission denied.")
-        key = f"{owner}_{fn}"
-        if key in bot_scripts:
-            kill_process_tree(bot_scripts[key])
-            bot_scripts.pop(key, None)
+        stop_script(owner, fn)
         return bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=create_control_buttons(owner, fn, False))
 
     if data.startswith("restart_"):
@@ -962,20 +3806,10 @@ def handle_callbacks(call):
         owner = int(owner_str)
         if not (user_id == owner or user_id in admin_ids):
             return bot.send_message(chat_id, "⚠️ Permission denied.")
-        key = f"{owner}_{fn}"
-        if key in bot_scripts:
-            kill_process_tree(bot_scripts[key])
-            bot_scripts.pop(key, None)
-        time.sleep(1)
-        ft = next((x[1] for x in user_files.get(owner, []) if x[0] == fn), None)
-        folder = get_user_folder(owner)
-        fp = os.path.join(folder, fn)
-        install_requirements_if_present(folder, call.message)
-        if ft == "py":
-            threading.Thread(target=run_script, args=(fp, owner, folder, fn, call.message), daemon=True).start()
-        else:
-            threading.Thread(target=run_js_script, args=(fp, owner, folder, fn, call.message), daemon=True).start()
+        stop_script(owner, fn)
         time.sleep(1)
+        ft = get_user_file_type(owner, fn)
+        futures_wait([queue_start(owner, fn, ft, call.message)], timeout=START_WAIT_SECONDS)
         running = is_bot_running(owner, fn)
         return bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=create_control_buttons(owner, fn, running))
 
@@ -985,67 +3819,387 @@ def handle_callbacks(call):
         owner = int(owner_str)
         if not (user_id == owner or user_id in admin_ids):
             return bot.send_message(chat_id, "⚠️ Permission denied.")
-        key = f"{owner}_{fn}"
-        if key in bot_scripts:
-            kill_process_tree(bot_scripts[key])
-            bot_scripts.pop(key, None)
-        folder = get_user_folder(owner)
-        fp = os.path.join(folder, fn)
-        lp = os.path.join(folder, f"{os.path.splitext(fn)[0]}.log")
-        try:
-            if os.path.exists(fp):
-                os.remove(fp)
-            if os.path.exists(lp):
-                os.remove(lp)
-        except Exception:
-            pass
-        remove_user_file_db(owner, fn)
+        delete_script_files(owner, fn)
         return bot.edit_message_text("🗑️ Deleted.", chat_id, call.message.message_id, reply_markup=create_main_menu_inline(user_id))
 
+    if data.startswith(("input_", "sighup_")):
+        bot.answer_callback_query(call.id)
+        action, owner_str, fn = data.split("_", 2)
+        owner = int(owner_str)
+        if not (user_id == owner or user_id in admin_ids):
+            return bot.send_message(chat_id, "⚠️ Permission denied.")
+        if action == "input":
+            return bot.send_message(chat_id, prompt_script_input(chat_id, user_id, owner, fn), parse_mode="Markdown")
+        error = signal_script(owner, fn, "HUP")
+        return bot.send_message(chat_id, md_escape(error) if error else f"📣 SIGHUP sent to `{fn}`.", parse_mode="Markdown")
+
+    if data.split("_", 1)[0] in SCHEDULE_ACTIONS:
+        bot.answer_callback_query(call.id)
+        action, owner_str, fn = data.split("_", 2)
+        owner = int(owner_str)
+        if not (user_id == owner or user_id in admin_ids):
+            return bot.send_message(chat_id, "⚠️ Permission denied.")
+        if action == "runs":
+            return bot.send_message(chat_id, runs_text(owner, fn), parse_mode="Markdown")
+        text, markup = schedule_panel(owner, fn, action)
+        return bot.edit_message_text(text, chat_id, call.message.message_id, parse_mode="Markdown", reply_markup=markup)
+
     if data.startswith("logs_"):
         bot.answer_callback_query(call.id)
         _, owner_str, fn = data.split("_", 2)
         owner = int(owner_str)
         if not (user_id == owner or user_id in admin_ids):
             return bot.send_message(chat_id, "⚠️ Permission denied.")
-        folder = get_user_folder(owner)
-        lp = os.path.join(folder, f"{os.path.splitext(fn)[0]}.log")
-        if not os.path.exists(lp):
-            return bot.send_message(chat_id, "⚠️ No log file.")
         try:
-            with open(lp, "r", encoding="utf-8", errors="ignore") as f:
-                txt = f.read()
-            if not txt.strip():
-                txt = "(empty)"
-            if len(txt) > 3500:
-                txt = txt[-3500:]
-            return bot.send_message(chat_id, f"📜 Logs for `{fn}`:\n```\n{txt}\n```", parse_mode="Markdown")
+            txt = read_script_log(owner, fn)
         except Exception as e:
             return bot.send_message(chat_id, f"❌ Log read error: {e}")
+        if txt is None:
+            return bot.send_message(chat_id, "⚠️ No log file.")
+        return bot.send_message(chat_id, f"📜 Logs for `{fn}`:\n```\n{txt}\n```", parse_mode="Markdown")
 
     bot.answer_callback_query(call.id, "Unknown action.")
 
 
 # =========================
-# CLEANUP
+# ASYNC MODE (optional)
 # =========================
-def cleanup():
-    logger.warning("Shutdown cleanup...")
-    for key in list(bot_scripts.keys()):
+# ASYNC_MODE=1 polls with AsyncTeleBot: user-facing handlers run as coroutines
+# on one event loop, Bot API calls go through aiohttp, and blocking work
+# (SQLite, disk, psutil, killing process trees, storing uploads) runs on
+# bounded executors, so in-flight updates cost a coroutine, not a thread.
+# Rare admin/owner paths (approvals, queue, profile, speed test, lock) reuse
+# the sync handlers on the blocking pool. Hosted scripts stay Popen children
+# reaped by the supervisor thread; handlers only await their start futures.
+ASYNC_MODE = os.environ.get("ASYNC_MODE", "0") == "1"
+ASYNC_DB_WORKERS = int(os.environ.get("ASYNC_DB_WORKERS", "4"))
+ASYNC_BLOCKING_WORKERS = int(os.environ.get("ASYNC_BLOCKING_WORKERS", "16"))
+ASYNC_MAX_INFLIGHT = int(os.environ.get("ASYNC_MAX_INFLIGHT", "10000"))
+ASYNC_API_CONNECTIONS = int(os.environ.get("ASYNC_API_CONNECTIONS", "100"))
+
+abot = None
+db_executor = None
+blocking_executor = None
+_inflight = None
+
+async def to_thread(fn, *args, pool=None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool or blocking_executor, partial(fn, *args))
+
+async def adb(fn, *args):
+    return await to_thread(fn, *args, pool=db_executor)
+
+async def _atrace(name: str, awaitable, **attrs):
+    # Coroutines interleave on one thread, so these are root spans outside the thread-local stack.
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return await awaitable
+    start_wall = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        return await awaitable
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _export_span({
+            "trace_id": os.urandom(8).hex(),
+            "span_id": os.urandom(4).hex(),
+            "parent_id": None,
+            "name": name,
+            "ts": start_wall,
+            "duration_ms": round((time.perf_counter() - t0) * 1000, 3),
+            "thread": "asyncio",
+            "error": error,
+            **attrs,
+        })
+
+def atraced(name: str, attrs=None):
+    def deco(fn):
+        @wraps(fn)
+        async def wrapper(obj):
+            async with _inflight:
+                return await _atrace(name, fn(obj), **(attrs(obj) if attrs else {}))
+        return wrapper
+    return deco
+
+def offload(sync_handler):
+    """Run a sync handler (and its sync Bot API calls) on the blocking pool."""
+    @wraps(sync_handler)
+    async def wrapper(obj):
+        async with _inflight:
+            await to_thread(sync_handler, obj)
+    return wrapper
+
+async def _await_start(future, timeout: float):
+    await asyncio.wait([asyncio.wrap_future(future)], timeout=timeout)
+
+@atraced("handler.start")
+async def a_cmd_start(message):
+    user = message.from_user
+    if bot_locked and user.id not in admin_ids:
+        return await abot.send_message(message.chat.id, "⚠️ Bot is locked by admin. Try later.")
+    if not await adb(is_active_user, user.id):
+        await adb(add_active_user, user.id)
         try:
-            kill_process_tree(bot_scripts[key])
+            await abot.send_message(OWNER_ID, new_user_text(user), parse_mode="Markdown")
         except Exception:
             pass
-        bot_scripts.pop(key, None)
-    logger.warning("Cleanup done.")
+    text = await adb(welcome_text, user)
+    await abot.send_message(message.chat.id, text, reply_markup=create_reply_keyboard_main_menu(user.id), parse_mode="Markdown")
+
+@atraced("handler.button", lambda m: {"button": m.text})
+async def a_handle_buttons(message):
+    user_id = message.from_user.id
+    text = message.text
+    if text == "📂 Check Files":
+        m = await to_thread(files_markup, user_id)
+        if m is None:
+            return await abot.reply_to(message, "📂 No files uploaded yet.")
+        return await abot.reply_to(message, "📂 Your files:", reply_markup=m)
+    if text == "📊 Statistics":
+        return await abot.reply_to(message, await to_thread(statistics_text, user_id))
+    if text == "📤 Upload File":
+        return await abot.reply_to(message, await adb(upload_prompt, user_id))
+    if text == "📢 Updates Channel":
+        m = types.InlineKeyboardMarkup().add(types.InlineKeyboardButton("📢 Channel", url=UPDATE_CHANNEL))
+        return await abot.reply_to(message, "Updates:", reply_markup=m)
+    # speed test, lock, contact
+    await to_thread(BUTTON_TEXT_TO_LOGIC[text], message)
+
+@atraced("handler.script_input")
+async def a_handle_script_input(message):
+    await abot.reply_to(message, await to_thread(answer_script_input, message), parse_mode="Markdown")
+
+@atraced("handler.upload")
+async def a_handle_upload(message):
+    error = await adb(upload_precheck, message)
+    if error:
+        return await abot.reply_to(message, error)
+    file_name = message.document.file_name
+    await abot.reply_to(message, f"⏳ Downloading `{file_name}` ...", parse_mode="Markdown")
+    try:
+        fi = await abot.get_file(message.document.file_id)
+        content = await abot.download_file(fi.file_path)
+    except Exception as e:
+        return await abot.reply_to(message, f"❌ Download error: {e}")
+    await to_thread(finish_upload, message, content)
+
+ASYNC_SCRIPT_ACTIONS = ("file", "start", "stop", "restart", "delete", "logs", "input", "sighup", *SCHEDULE_ACTIONS)
+
+@atraced("handler.callback", lambda c: {"action": c.data.split("_", 1)[0]})
+async def a_script_callback(call):
+    data = call.data
+    user_id = call.from_user.id
+    chat_id = call.message.chat.id
+    message_id = call.message.message_id
+    await abot.answer_callback_query(call.id)
+
+    if data == "upload":
+        return await abot.send_message(chat_id, "📤 Send `.py` / `.zip` (waits for OWNER approval).")
+    if data == "back_main":
+        return await abot.edit_message_text("〽️ Main Menu", chat_id, message_id, reply_markup=create_main_menu_inline(user_id))
+    if data == "check_files":
+        m = await to_thread(files_markup, user_id, True)
+        if m is None:
+            m = types.InlineKeyboardMarkup().add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
+            return await abot.edit_message_text("📂 No files.", chat_id, message_id, reply_markup=m)
+        return await abot.edit_message_text("📂 Your files:", chat_id, message_id, reply_markup=m)
+
+    action, owner_str, fn = data.split("_", 2)
+    owner = int(owner_str)
+    if not (user_id == owner or user_id in admin_ids):
+        denied = "⚠️ You can only manage your own files." if action == "file" else "⚠️ Permission denied."
+        return await abot.send_message(chat_id, denied)
+
+    if action == "file":
+        text, running = await to_thread(file_panel_text, owner, fn)
+        return await abot.edit_message_text(text, chat_id, message_id, parse_mode="Markdown",
+                                            reply_markup=create_control_buttons(owner, fn, running))
+    if action in ("start", "restart"):
+        if action == "restart":
+            await to_thread(stop_script, owner, fn)
+            await asyncio.sleep(1)
+            ft = await adb(get_user_file_type, owner, fn)
+        else:
+            ft, error = await adb(startable_file_type, owner, fn)
+            if error:
+                return await abot.send_message(chat_id, error)
+        # install dependencies + start on the install queue; wait briefly so quick starts show as running
+        await _await_start(queue_start(owner, fn, ft, call.message), START_WAIT_SECONDS)
+        running = await to_thread(is_bot_running, owner, fn)
+        return await abot.edit_message_reply_markup(chat_id, message_id, reply_markup=create_control_buttons(owner, fn, running))
+    if action == "stop":
+        await to_thread(stop_script, owner, fn)
+        return await abot.edit_message_reply_markup(chat_id, message_id, reply_markup=create_control_buttons(owner, fn, False))
+    if action == "delete":
+        await to_thread(delete_script_files, owner, fn)
+        return await abot.edit_message_text("🗑️ Deleted.", chat_id, message_id, reply_markup=create_main_menu_inline(user_id))
+    if action == "input":
+        return await abot.send_message(chat_id, prompt_script_input(chat_id, user_id, owner, fn), parse_mode="Markdown")
+    if action == "sighup":
+        error = await to_thread(signal_script, owner, fn, "HUP")
+        return await abot.send_message(chat_id, md_escape(error) if error else f"📣 SIGHUP sent to `{fn}`.", parse_mode="Markdown")
+    if action == "runs":
+        return await abot.send_message(chat_id, await adb(runs_text, owner, fn), parse_mode="Markdown")
+    if action in SCHEDULE_ACTIONS:
+        text, markup = await adb(schedule_panel, owner, fn, action)
+        return await abot.edit_message_text(text, chat_id, message_id, parse_mode="Markdown", reply_markup=markup)
+    if action == "logs":
+        try:
+            txt = await to_thread(read_script_log, owner, fn)
+        except Exception as e:
+            return await abot.send_message(chat_id, f"❌ Log read error: {e}")
+        if txt is None:
+            return await abot.send_message(chat_id, "⚠️ No log file.")
+        return await abot.send_message(chat_id, f"📜 Logs for `{fn}`:\n```\n{txt}\n```", parse_mode="Markdown")
+
+def _is_async_script_callback(call) -> bool:
+    return call.data in ("upload", "back_main", "check_files") or call.data.split("_", 1)[0] in ASYNC_SCRIPT_ACTIONS
+
+async def _traced_process_request(token, url, *args, **kwargs):
+    result = await _atrace(f"api.{url}", _orig_process_request(token, url, *args, **kwargs))
+    if url == "getUpdates" and "first_update" not in startup_marks:
+        mark_startup("first_poll")
+        if result:
+            mark_startup("first_update")
+            logger.info(f"Startup: {startup_report()}")
+    return result
+
+def create_async_bot():
+    global abot, db_executor, blocking_executor, _inflight, _orig_process_request
+    from telebot import asyncio_helper
+    from telebot.async_telebot import AsyncTeleBot
+
+    if BOT_API_URL:
+        asyncio_helper.API_URL = BOT_API_URL + "/bot{0}/{1}"
+        asyncio_helper.FILE_URL = BOT_API_URL + "/file/bot{0}/{1}"
+    asyncio_helper.REQUEST_LIMIT = ASYNC_API_CONNECTIONS
+    _orig_process_request = asyncio_helper._process_request
+    asyncio_helper._process_request = _traced_process_request
+
+    db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_WORKERS, thread_name_prefix="async-db")
+    blocking_executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix="async-blocking")
+    _inflight = asyncio.Semaphore(ASYNC_MAX_INFLIGHT)
+
+    abot = AsyncTeleBot(TOKEN)
+    abot.register_message_handler(a_cmd_start, commands=["start", "help"])
+    abot.register_message_handler(offload(cmd_profile), commands=["profile"])
+    abot.register_message_handler(offload(cmd_subscription), commands=["addsub", "delsub"])
+    abot.register_message_handler(offload(cmd_queue), commands=["queue"])
+    abot.register_message_handler(offload(cmd_topdisk), commands=["topdisk"])
+    abot.register_message_handler(offload(cmd_backup), commands=["backup"])
+    abot.register_message_handler(offload(cmd_schedule), commands=["schedule"])
+    abot.register_message_handler(a_handle_script_input, func=is_awaiting_input)
+    abot.register_message_handler(a_handle_buttons, func=lambda m: m.text in BUTTON_TEXT_TO_LOGIC)
+    abot.register_message_handler(a_handle_upload, content_types=["document"])
+    abot.register_callback_query_handler(a_script_callback, func=_is_async_script_callback)
+    abot.register_callback_query_handler(offload(handle_callbacks), func=lambda c: True)
+    return abot
+
+async def run_async_polling():
+    create_async_bot()
+    logger.info(f"Async mode: {ASYNC_DB_WORKERS} DB / {ASYNC_BLOCKING_WORKERS} blocking workers, "
+                f"max {ASYNC_MAX_INFLIGHT} in-flight updates")
+    await abot.infinity_polling(timeout=30, request_timeout=60)
+
+
+# =========================
+# CLEANUP
+# =========================
+_shutdown_lock = threading.Lock()
+_shutdown_done = False
+
+def cleanup():
+    global _shutdown_done
+    with _shutdown_lock:
+        if _shutdown_done:
+            return
+        _shutdown_done = True
+
+    logger.warning("Shutdown cleanup...")
+    t0 = time.monotonic()
+
+    # Flush pending writes first: queued trace spans, then any in-flight DB write.
+    flush_traces()
+    if DB_LOCK.acquire(timeout=5):
+        DB_LOCK.release()
+
+    infos = [info for info in (drop_script(key) for key in list(bot_scripts.keys())) if info]
+    killed = 0
+    try:
+        killed = terminate_process_trees(infos, SHUTDOWN_GRACE)
+    except Exception as e:
+        logger.error(f"Shutdown terminate error: {e}", exc_info=True)
+    stop_zygote()
+    logger.warning(f"Cleanup done: {len(infos)} scripts stopped in {time.monotonic() - t0:.1f}s ({killed} force-killed).")
+
+def _handle_shutdown_signal(signum, frame):
+    logger.warning(f"Received {signal.Signals(signum).name}, shutting down...")
+    try:
+        bot.stop_polling()
+    except Exception:
+        pass
+    cleanup()
+    sys.exit(0)
+
+def install_signal_handlers():
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, _handle_shutdown_signal)
 
 atexit.register(cleanup)
 
 
+# =========================
+# STARTUP
+# =========================
+def warm_imports():
+    """Import lazily-loaded modules in the background once polling is under way."""
+    try:
+        psutil.cpu_count()
+    except Exception:
+        pass
+    mark_startup("warm_imports")
+
+def startup_import_report(top: int = 25) -> str:
+    """Run `-X importtime` on `import bot` and list the slowest modules (cumulative)."""
+    r = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        cwd=BASE_DIR, capture_output=True, text=True, encoding="utf-8", errors="ignore"
+    )
+    rows = []
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            self_us, cum_us, name = line.split(":", 1)[1].split("|")
+            rows.append((int(cum_us), int(self_us), name.strip()))
+        except ValueError:
+            continue
+    rows.sort(reverse=True)
+    lines = [f"{'cumulative ms':>14} {'self ms':>9}  module"]
+    for cum_us, self_us, name in rows[:top]:
+        lines.append(f"{cum_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    return "\n".join(lines)
+
+mark_startup("module_loaded")
+
+
 # =========================
 # MAIN
 # =========================
 if __name__ == "__main__":
+    if "--startup-profile" in sys.argv:
+        print(startup_import_report())
+        sys.exit(0)
+    if "--backup" in sys.argv:
+        print(json.dumps(run_backup(), indent=2))
+        sys.exit(0)
+    if "--restore" in sys.argv:
+        args = sys.argv[sys.argv.index("--restore") + 1:]
+        print(json.dumps(restore_backup(args[0] if args else None), indent=2))
+        sys.exit(0)
+
     logger.info("=" * 55)
     logger.info("🤖 Bot starting...")
     logger.info(f"Python: {sys.version.split()[0]}")
@@ -1056,7 +4210,21 @@ if __name__ == "__main__":
     logger.info(f"Admins: {admin_ids}")
     logger.info("=" * 55)
 
+    install_signal_handlers()
+
+    # Flask (imported on its own thread), the supervisor and polling start together.
     keep_alive()
+    start_supervisor()
+    start_expiry_scheduler()
+    start_disk_reconciler()
+    start_backup_scheduler()
+    start_script_scheduler()
+    threading.Thread(target=warm_imports, daemon=True, name="warm-imports").start()
+    threading.Thread(target=warm_zygote, daemon=True, name="warm-zygote").start()
+
+    if ASYNC_MODE:
+        asyncio.run(run_async_polling())
+        sys.exit(0)
 
     while True:
         try:
@@ -0,0 +1,305 @@
+"""
+Local fake Telegram Bot API server for benchmarks and load tests.
+
+Point telebot at it with:
+    telebot.apihelper.API_URL = server.api_url
+    telebot.apihelper.FILE_URL = server.file_url
+or run bot.py with BOT_API_URL=<server.base_url>.
+
+Updates are injected with inject_message()/inject_callback() and served by
+getUpdates; everything the bot sends to a chat lands in that chat's outbox,
+which wait_for() blocks on.
+"""
+import json
+import time
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+FAKE_BOT_USER = {"id": 1000000001, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+def fake_user(user_id: int) -> dict:
+    return {"id": int(user_id), "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops SYNs under concurrent clients (aiohttp
+    # opens many connections at once), which shows up as 1s retransmit stalls.
+    request_queue_size = 1024
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.lock = threading.Lock()
+        self.next_message_id = 1
+        self.calls = {}        # {method: count}
+        self.updates = []      # not yet confirmed by a getUpdates offset
+        self.next_update_id = 1
+        self.updates_cond = threading.Condition()
+        self.files = {}        # {file_path: bytes}
+        self.outbox = {}       # {chat_id: [message dict + "method", "t"]}
+        self.outbox_cond = threading.Condition()
+        self.server = _Server((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        return self.base_url + "/bot{0}/{1}"
+
+    @property
+    def file_url(self) -> str:
+        return self.base_url + "/file/bot{0}/{1}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="fake-bot-api")
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.updates_cond:
+            self.updates_cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- test-side API ---
+    def _new_message_id(self) -> int:
+        with self.lock:
+            message_id = self.next_message_id
+            self.next_message_id += 1
+        return message_id
+
+    def _push_update(self, key: str, payload: dict) -> int:
+        with self.updates_cond:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append({"update_id": update_id, key: payload})
+            self.updates_cond.notify_all()
+        return update_id
+
+    def add_file(self, content: bytes, file_name: str) -> dict:
+        """Store an upload; returns the Document dict to put in a message."""
+        with self.lock:
+            n = len(self.files) + 1
+            file_path = f"documents/file_{n}_{file_name}"
+            self.files[file_path] = content
+        return {"file_id": file_path, "file_unique_id": f"u{n}", "file_name": file_name, "file_size": len(content)}
+
+    def inject_message(self, user_id: int, text: str = None, document: dict = None) -> dict:
+        msg = {
+            "message_id": self._new_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(user_id), "type": "private"},
+            "from": fake_user(user_id),
+        }
+        if text is not None:
+            msg["text"] = text
+            if text.startswith("/"):
+                msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        if document is not None:
+            msg["document"] = document
+        self._push_update("message", msg)
+        return msg
+
+    def inject_callback(self, user_id: int, data: str, message: dict) -> int:
+        """Press an inline button on `message` (an outbox entry)."""
+        msg = {k: v for k, v in message.items() if k not in ("method", "t")}
+        query = {
+            "id": str(self._new_message_id()),
+            "from": fake_user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": msg,
+        }
+        return self._push_update("callback_query", query)
+
+    def outbox_len(self, chat_id: int) -> int:
+        with self.outbox_cond:
+            return len(self.outbox.get(int(chat_id), ()))
+
+    def wait_for(self, chat_id: int, since: int = 0, predicate=None, timeout: float = 30.0):
+        """First outbox entry at index >= since matching predicate, as (index, entry), or None."""
+        chat_id = int(chat_id)
+        deadline = time.monotonic() + timeout
+        with self.outbox_cond:
+            while True:
+                box = self.outbox.get(chat_id, [])
+                for i in range(since, len(box)):
+                    if predicate is None or predicate(box[i]):
+                        return i, box[i]
+                since = len(box)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.outbox_cond.wait(remaining)
+
+    def _record(self, method: str, msg: dict):
+        entry = dict(msg, method=method, t=time.monotonic())
+        with self.outbox_cond:
+            self.outbox.setdefault(msg["chat"]["id"], []).append(entry)
+            self.outbox_cond.notify_all()
+
+    # --- Bot API methods ---
+    def _message(self, chat_id, text=None, message_id=None):
+        if message_id is None:
+            message_id = self._new_message_id()
+        msg = {
+            "message_id": int(message_id),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": FAKE_BOT_USER,
+        }
+        if text is not None:
+            msg["text"] = text
+        return msg
+
+    def _get_updates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = min(float(params.get("timeout") or 0), 30.0)
+        deadline = time.monotonic() + timeout
+        with self.updates_cond:
+            if offset:
+                self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.updates_cond.wait(remaining)
+            return self.updates[:limit]
+
+    def handle(self, method: str, params: dict):
+        if method == "getMe":
+            return FAKE_BOT_USER
+        if method == "getUpdates":
+            return self._get_updates(params)
+        if method == "getFile":
+            file_path = params.get("file_id", "")
+            with self.lock:
+                content = self.files.get(file_path)
+            if content is None:
+                return None
+            return {"file_id": file_path, "file_unique_id": file_path, "file_size": len(content), "file_path": file_path}
+        if method in ("deleteMessage", "answerCallbackQuery"):
+            return True
+
+        chat_id = params.get("chat_id", 0)
+        if method == "sendMessage":
+            msg = self._message(chat_id, params.get("text"))
+        elif method == "sendDocument":
+            msg = self._message(chat_id)
+            if params.get("caption"):
+                msg["caption"] = params["caption"]
+            doc = params.get("document")
+            msg["document"] = doc if isinstance(doc, dict) else {"file_id": str(doc), "file_unique_id": str(doc)}
+        elif method == "editMessageText":
+            msg = self._message(chat_id, params.get("text"), params.get("message_id"))
+        elif method == "editMessageReplyMarkup":
+            msg = self._message(chat_id, None, params.get("message_id"))
+        elif method == "forwardMessage":
+            msg = self._message(chat_id)
+            msg["forward_from_chat"] = {"id": int(params.get("from_chat_id", 0)), "type": "private"}
+        else:
+            return None
+        markup = params.get("reply_markup")
+        if markup:
+            markup = json.loads(markup) if isinstance(markup, str) else markup
+            # Like Telegram, only inline keyboards come back attached to a message.
+            if "inline_keyboard" in markup:
+                msg["reply_markup"] = markup
+        self._record(method, msg)
+        return msg
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _params(self) -> dict:
+                url = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                ctype = self.headers.get("Content-Type", "")
+                if body and ctype.startswith("application/x-www-form-urlencoded"):
+                    params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+                elif body and ctype.startswith("application/json"):
+                    params.update(json.loads(body))
+                elif body and ctype.startswith("multipart/form-data"):
+                    form = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + ctype.encode() + b"\r\n\r\n" + body)
+                    for part in form.iter_parts():
+                        name = part.get_param("name", header="content-disposition")
+                        data = part.get_payload(decode=True) or b""
+                        if part.get_filename():
+                            params[name] = {"file_id": part.get_filename(), "file_unique_id": part.get_filename(),
+                                            "file_name": part.get_filename(), "file_size": len(data)}
+                        else:
+                            params[name] = data.decode("utf-8", "replace")
+                return params
+
+            def _send_bytes(self, data: bytes, ctype: str, status: int = 200):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_json(self, payload, status=200):
+                self._send_bytes(json.dumps(payload).encode(), "application/json", status)
+
+            def _download(self, parts):
+                # /file/bot<token>/<file_path>
+                with api.lock:
+                    api.calls["download"] = api.calls.get("download", 0) + 1
+                    content = api.files.get("/".join(parts[2:]))
+                if content is None:
+                    return self._send_json({"ok": False, "error_code": 404, "description": "Not Found"}, 404)
+                self._send_bytes(content, "application/octet-stream")
+
+            def _dispatch(self):
+                parts = urlparse(self.path).path.strip("/").split("/")
+                if len(parts) > 2 and parts[0] == "file" and parts[1].startswith("bot"):
+                    return self._download(parts)
+                if len(parts) != 2 or not parts[0].startswith("bot"):
+                    return self._send_json({"ok": False, "error_code": 404, "description": "Not Found"}, 404)
+                method = parts[1]
+                params = self._params()
+                if api.latency_ms:
+                    time.sleep(api.latency_ms / 1000)
+                with api.lock:
+                    api.calls[method] = api.calls.get(method, 0) + 1
+                result = api.handle(method, params)
+                if result is None:
+                    return self._send_json({"ok": False, "error_code": 400, "description": f"Unsupported method {method}"}, 400)
+                self._send_json({"ok": True, "result": result})
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Run a local fake Telegram Bot API server.")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+    srv = FakeBotAPI(port=args.port, latency_ms=args.latency_ms).start()
+    print(f"Fake Bot API listening on {srv.base_url}")
+    try:
+        srv.thread.join()
+    except KeyboardInterrupt:
+        srv.stop()
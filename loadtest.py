@@ -0,0 +1,408 @@
+"""
+Load test: N simulated users against bot.py running on a local fake Bot API.
+
+Each user does /start, Check Files, uploads a .py or a ZIP, waits for the
+owner (simulated too) to approve or reject it, then opens the file, views its
+logs and stops it. bot.py runs as a subprocess with TRACE_SAMPLE_RATE=1, so
+per-handler latency and DB lock contention come from its own spans.
+
+    python loadtest.py --users 200 --concurrency 50
+    python loadtest.py --users 200 --baseline loadtest_results/<old>.json   # exit 1 on regression
+
+Results (incl. git rev) are saved to loadtest_results/ for comparison across versions.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import socket
+import zipfile
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from fake_bot_api import FakeBotAPI
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+OWNER_ID = 1
+FIRST_USER_ID = 100000
+
+SCRIPT = "import time\nprint('up {uid}', flush=True)\ntime.sleep({hold})\n"
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def summarize(values) -> dict:
+    return {
+        "n": len(values),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2) if values else 0.0,
+    }
+
+
+def git_rev() -> str:
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=BASE_DIR)
+        return rev + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def text_has(*needles):
+    return lambda m: any(n in (m.get("text") or "") for n in needles)
+
+
+def has_button(prefix):
+    def pred(m):
+        rows = (m.get("reply_markup") or {}).get("inline_keyboard", [])
+        return any(b.get("callback_data", "").startswith(prefix) for row in rows for b in row)
+    return pred
+
+
+class LoadTest:
+    def __init__(self, api: FakeBotAPI, args):
+        self.api = api
+        self.args = args
+        self.lock = threading.Lock()
+        self.steps = {}      # {step: [ms]}
+        self.failures = {}   # {step: count}
+        self.stop = threading.Event()
+        self.approve_ratio = args.approve_ratio
+
+    def record(self, step: str, ms):
+        with self.lock:
+            if ms is None:
+                self.failures[step] = self.failures.get(step, 0) + 1
+            else:
+                self.steps.setdefault(step, []).append(ms)
+
+    def _step(self, step: str, uid: int, inject, predicate=None, since: int = None):
+        """
+        Inject an update and wait for the bot's matching reply in the user's
+        chat. Returns (outbox index, message) or None on timeout.
+        """
+        if since is None:
+            since = self.api.outbox_len(uid)
+        t0 = time.perf_counter()
+        inject()
+        found = self.api.wait_for(uid, since, predicate, self.args.timeout)
+        self.record(step, (time.perf_counter() - t0) * 1000 if found else None)
+        if self.args.think_ms:
+            time.sleep(self.args.think_ms / 1000)
+        return found
+
+    def _upload(self, uid: int, rnd: random.Random):
+        body = SCRIPT.format(uid=uid, hold=self.args.hold)
+        if rnd.random() < self.args.zip_ratio:
+            buf = io.BytesIO()
+            with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+                z.writestr("main.py", "import helpers\n" + body)
+                z.writestr("helpers.py", f"USER = {uid}\n" + "# padding\n" * 200)
+                z.writestr("README.txt", "load test\n")
+            doc = self.api.add_file(buf.getvalue(), f"bot_{uid}.zip")
+            step, file_name = "upload_zip", "main.py"
+        else:
+            doc = self.api.add_file(body.encode(), f"bot_{uid}.py")
+            step, file_name = "upload_py", f"bot_{uid}.py"
+        found = self._step(step, uid, lambda: self.api.inject_message(uid, document=doc),
+                           text_has("Waiting for OWNER approval", "starting automatically", "⚠️", "❌"))
+        if found is None or "⚠️" in found[1].get("text", "") or "❌" in found[1].get("text", ""):
+            return None, None
+        return file_name, found[0] + 1
+
+    def user_session(self, uid: int):
+        rnd = random.Random(self.args.seed * 1000003 + uid)
+        self._step("start", uid, lambda: self.api.inject_message(uid, "/start"), text_has("Welcome"))
+        self._step("check_files", uid, lambda: self.api.inject_message(uid, "📂 Check Files"), text_has("files", "No files"))
+
+        file_name, since = self._upload(uid, rnd)
+        if file_name is None:
+            return
+        # The owner actor answers asynchronously; this step includes its decision time.
+        verdict = self._step("approval", uid, lambda: None, text_has("Now running", "REJECTED"), since=since)
+        if verdict is None or "REJECTED" in verdict[1].get("text", ""):
+            return
+
+        listing = self._step("check_files", uid, lambda: self.api.inject_message(uid, "📂 Check Files"),
+                             has_button(f"file_{uid}_"))
+        if listing is None:
+            return
+        listing = listing[1]
+        panel = self._step("file_panel", uid,
+                           lambda: self.api.inject_callback(uid, f"file_{uid}_{file_name}", listing),
+                           has_button(f"logs_{uid}_"))
+        if panel is None:
+            return
+        panel = panel[1]
+        self._step("logs", uid, lambda: self.api.inject_callback(uid, f"logs_{uid}_{file_name}", panel),
+                   text_has("Logs for", "No log file", "Log read error"))
+        self._step("stop", uid, lambda: self.api.inject_callback(uid, f"stop_{uid}_{file_name}", panel),
+                   lambda m: m["method"] == "editMessageReplyMarkup")
+
+    def owner_loop(self):
+        """Approve (or reject, per --approve-ratio) every approval request the owner receives."""
+        rnd = random.Random(self.args.seed)
+        seen = 0
+        while not self.stop.is_set():
+            found = self.api.wait_for(OWNER_ID, seen, has_button("approve_"), timeout=0.2)
+            if found is None:
+                continue
+            seen, msg = found[0] + 1, found[1]
+            data = next(b["callback_data"] for row in msg["reply_markup"]["inline_keyboard"] for b in row
+                        if b.get("callback_data", "").startswith("approve_"))
+            if rnd.random() >= self.approve_ratio:
+                data = "reject_" + data.split("_", 1)[1]
+            self.api.inject_callback(OWNER_ID, data, msg)
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True, name="rss-sampler")
+        self.proc = psutil.Process(pid)
+        self.interval = interval
+        self.samples = []    # (t, rss, children)
+        self.halt = threading.Event()
+
+    def run(self):
+        while not self.halt.is_set():
+            try:
+                self.samples.append((time.monotonic(), self.proc.memory_info().rss, len(self.proc.children(recursive=True))))
+            except psutil.Error:
+                return
+            self.halt.wait(self.interval)
+
+    def report(self) -> dict:
+        if not self.samples:
+            return {}
+        mb = 1024 * 1024
+        rss = [s[1] for s in self.samples]
+        return {
+            "start_mb": round(rss[0] / mb, 1),
+            "peak_mb": round(max(rss) / mb, 1),
+            "end_mb": round(rss[-1] / mb, 1),
+            "growth_mb": round((rss[-1] - rss[0]) / mb, 1),
+            "peak_children": max(s[2] for s in self.samples),
+        }
+
+
+def analyze_traces(path: str, wall_s: float) -> dict:
+    handlers, db_ops, lock_waits, api_calls = {}, {}, [], {}
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return {}
+    with f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            name, ms = span.get("name", ""), span.get("duration_ms", 0.0)
+            if name.startswith("handler."):
+                label = span.get("action") or span.get("button")
+                handlers.setdefault(f"{name}[{label}]" if label else name, []).append(ms)
+            elif name == "db.lock.wait":
+                lock_waits.append(ms)
+            elif name.startswith("db."):
+                db_ops.setdefault(name, []).append(ms)
+            elif name.startswith("api.") and name != "api.getUpdates":
+                api_calls.setdefault(name, []).append(ms)
+    db_total = sum(len(v) for v in db_ops.values())
+    handled = sum(len(v) for v in handlers.values())
+    return {
+        "handled_updates": handled,
+        "handled_per_s": round(handled / wall_s, 1) if wall_s else 0.0,
+        "handlers": {k: summarize(v) for k, v in sorted(handlers.items())},
+        "db_ops": {k: summarize(v) for k, v in sorted(db_ops.items())},
+        "db_lock": {
+            "ops": db_total,
+            "contended": len(lock_waits),
+            "contended_pct": round(len(lock_waits) / db_total * 100, 2) if db_total else 0.0,
+            "wait_total_ms": round(sum(lock_waits), 1),
+            "wait": summarize(lock_waits),
+        },
+        "api": {k: summarize(v) for k, v in sorted(api_calls.items())},
+    }
+
+
+def start_bot(api: FakeBotAPI, work: str, args):
+    trace_file = os.path.join(work, "traces.jsonl")
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "1:loadtest",
+        "BOT_API_URL": api.base_url,
+        "OWNER_ID": str(OWNER_ID),
+        "ADMIN_ID": str(OWNER_ID),
+        "UPLOAD_BOTS_DIR": os.path.join(work, "upload_bots"),
+        "IROTECH_DIR": os.path.join(work, "inf"),
+        "TRACE_SAMPLE_RATE": "1",
+        "TRACE_FILE": trace_file,
+        "PORT": str(free_port()),
+        "FAST_START": "1" if args.fast_start else "0",
+        "ASYNC_MODE": "1" if args.async_mode else "0",
+    })
+    log = open(os.path.join(work, "bot.log"), "w")
+    proc = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "bot.py")], cwd=work, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    deadline = time.monotonic() + 60
+    while api.calls.get("getUpdates", 0) == 0:
+        if proc.poll() is not None:
+            sys.exit(f"bot.py exited with {proc.returncode}, see {work}/bot.log")
+        if time.monotonic() > deadline:
+            proc.kill()
+            sys.exit(f"bot.py never polled, see {work}/bot.log")
+        time.sleep(0.05)
+    return proc, trace_file
+
+
+def print_report(res: dict):
+    print(f"rev {res['git_rev']}  users {res['params']['users']}  concurrency {res['params']['concurrency']}  "
+          f"wall {res['wall_s']:.1f}s")
+    print(f"throughput: {res['updates_injected']} updates in, {res['throughput_updates_per_s']} updates/s, "
+          f"{res['traces'].get('handled_per_s', 0)} handled/s")
+    print("\nstep (end-to-end ms)        n     p50     p95     p99   fail")
+    for name, s in res["steps"].items():
+        print(f"  {name:<22} {s['n']:>5} {s['p50']:>7.1f} {s['p95']:>7.1f} {s['p99']:>7.1f} {res['failures'].get(name, 0):>6}")
+    print("\nhandler (in-bot ms)                      n     p50     p95     p99")
+    for name, s in res["traces"].get("handlers", {}).items():
+        print(f"  {name:<36} {s['n']:>5} {s['p50']:>7.1f} {s['p95']:>7.1f} {s['p99']:>7.1f}")
+    lock = res["traces"].get("db_lock", {})
+    if lock:
+        print(f"\nDB lock: {lock['contended']}/{lock['ops']} ops waited ({lock['contended_pct']}%), "
+              f"total wait {lock['wait_total_ms']:.0f} ms, p95 wait {lock['wait']['p95']:.1f} ms")
+    rss = res.get("rss", {})
+    if rss:
+        print(f"RSS: {rss['start_mb']} -> {rss['end_mb']} MB (peak {rss['peak_mb']}, growth {rss['growth_mb']}), "
+              f"peak hosted processes {rss['peak_children']}")
+
+
+def compare(res: dict, baseline_path: str, tolerance: float) -> list:
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    if base.get("params") != res["params"]:
+        print(f"warning: baseline was run with different parameters: {base.get('params')}")
+    failed = []
+    for name, cur in res["steps"].items():
+        ref = base.get("steps", {}).get(name, {}).get("p95")
+        if ref and cur["p95"] > ref * tolerance:
+            failed.append(f"steps.{name}: p95 {cur['p95']:.1f}ms > {ref:.1f}ms x {tolerance}")
+    for name, cur in res["traces"].get("handlers", {}).items():
+        ref = base.get("traces", {}).get("handlers", {}).get(name, {}).get("p95")
+        if ref and cur["p95"] > ref * tolerance:
+            failed.append(f"handlers.{name}: p95 {cur['p95']:.1f}ms > {ref:.1f}ms x {tolerance}")
+    ref_tput = base.get("throughput_updates_per_s")
+    if ref_tput and res["throughput_updates_per_s"] < ref_tput / tolerance:
+        failed.append(f"throughput {res['throughput_updates_per_s']}/s < {ref_tput}/s / {tolerance}")
+    return failed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=25, help="users active at the same time")
+    ap.add_argument("--zip-ratio", type=float, default=0.3, help="share of users uploading a ZIP")
+    ap.add_argument("--approve-ratio", type=float, default=0.8, help="share of uploads the owner approves")
+    ap.add_argument("--hold", type=int, default=60, help="seconds a hosted script stays up unless stopped")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's steps")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated network latency per API call")
+    ap.add_argument("--timeout", type=float, default=60.0, help="max wait for a reply before a step fails")
+    ap.add_argument("--fast-start", action="store_true", help="run bot.py with FAST_START=1")
+    ap.add_argument("--async", dest="async_mode", action="store_true", help="run bot.py with ASYNC_MODE=1")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="result file (default loadtest_results/<time>-<rev>.json)")
+    ap.add_argument("--baseline", help="compare against a previous result file")
+    ap.add_argument("--tolerance", type=float, default=1.5, help="allowed p95 / throughput ratio vs. baseline")
+    ap.add_argument("--keep", action="store_true", help="keep the work dir (bot.log, traces, uploads)")
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="loadtest_")
+    api = FakeBotAPI(latency_ms=args.latency_ms).start()
+    bot_proc, trace_file = start_bot(api, work, args)
+    sampler = RSSSampler(bot_proc.pid)
+    sampler.start()
+
+    lt = LoadTest(api, args)
+    owner = threading.Thread(target=lt.owner_loop, daemon=True, name="owner")
+    owner.start()
+
+    users = range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lt.user_session, users))
+    wall = time.perf_counter() - t0
+    lt.stop.set()
+    sampler.halt.set()
+    sampler.join()
+
+    # SIGTERM runs bot.py's cleanup, which also flushes pending spans.
+    bot_proc.send_signal(signal.SIGTERM)
+    try:
+        bot_proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        bot_proc.kill()
+    api.stop()
+
+    injected = api.next_update_id - 1
+    res = {
+        "git_rev": git_rev(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "keep")},
+        "wall_s": round(wall, 2),
+        "updates_injected": injected,
+        "throughput_updates_per_s": round(injected / wall, 1),
+        "steps": {k: summarize(v) for k, v in sorted(lt.steps.items())},
+        "failures": lt.failures,
+        "traces": analyze_traces(trace_file, wall),
+        "rss": sampler.report(),
+        "api_calls": dict(sorted(api.calls.items())),
+    }
+    print_report(res)
+
+    out = args.out or os.path.join(BASE_DIR, "loadtest_results",
+                                   f"{datetime.now():%Y%m%d-%H%M%S}-{res['git_rev']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(res, f, indent=2)
+    print(f"\nsaved {out}")
+    if args.keep:
+        print(f"work dir {work}")
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if args.baseline:
+        failed = compare(res, args.baseline, args.tolerance)
+        if failed:
+            print("REGRESSION:\n  " + "\n  ".join(failed))
+            sys.exit(1)
+        print("No regression vs. baseline.")
+
+
+if __name__ == "__main__":
+    main()
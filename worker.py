@@ -0,0 +1,262 @@
+"""
+Worker agent: runs hosted scripts on this machine for a bot.py controller.
+
+    WORKER_TOKEN=secret python worker.py --port 9101 --name node-a
+
+bot.py started with WORKER_NODES=http://host:9101,http://host:9102 and the
+same WORKER_TOKEN places each script on the node with the most free memory
+and idle CPU. upload_bots/ must be at the same path on every node (shared
+filesystem), and so must the pip/npm dependencies the controller installs.
+
+HTTP/JSON API; every request carries the X-Worker-Token header:
+    GET  /status                    node load and running count
+    GET  /scripts                   {key: {pid, returncode, started}}
+    POST /start   {key, kind, script, cwd, log_path}  -> {pid}
+    POST /stop    {keys, timeout}   -> {stopped, killed}
+    POST /signal  {key, signal}
+    POST /input   {key, text}       one line to the script's stdin
+    GET  /logs?key=<key>&tail=<bytes>
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import signal
+import argparse
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import psutil
+
+EXITED_RETENTION = 600  # seconds an exited script stays visible to the controller
+
+
+def _proc_alive(p) -> bool:
+    try:
+        return p.is_running() and p.status() != psutil.STATUS_ZOMBIE
+    except psutil.Error:
+        return False
+
+
+def _wait_until_gone(procs, timeout):
+    # Not psutil.wait_procs: it would reap our Popen children and lose their exit codes.
+    deadline = time.monotonic() + timeout
+    alive = [p for p in procs if _proc_alive(p)]
+    while alive and time.monotonic() < deadline:
+        time.sleep(0.05)
+        alive = [p for p in alive if _proc_alive(p)]
+    return alive
+
+
+class Agent:
+    def __init__(self, name: str, interval: float = 1.0):
+        self.name = name
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.scripts = {}  # {key: {"proc", "log_file", "log_path", "started", "exited_at"}}
+        self.cpu_percent = psutil.cpu_percent(None)
+
+    # --- local supervisor ---
+    def supervise(self):
+        while True:
+            self.cpu_percent = psutil.cpu_percent(None)
+            now = time.time()
+            with self.lock:
+                for key, s in list(self.scripts.items()):
+                    if s["exited_at"] is None and s["proc"].poll() is not None:
+                        s["exited_at"] = now
+                        s["log_file"].close()
+                    elif s["exited_at"] is not None and now - s["exited_at"] > EXITED_RETENTION:
+                        del self.scripts[key]
+            time.sleep(self.interval)
+
+    def running(self) -> int:
+        with self.lock:
+            return sum(1 for s in self.scripts.values() if s["exited_at"] is None)
+
+    # --- API ---
+    def status(self, params):
+        vm = psutil.virtual_memory()
+        return {
+            "node": self.name,
+            "mem_available": vm.available,
+            "mem_total": vm.total,
+            "cpu_percent": self.cpu_percent,
+            "cpu_count": os.cpu_count(),
+            "running": self.running(),
+        }
+
+    def list_scripts(self, params):
+        with self.lock:
+            return {
+                key: {"pid": s["proc"].pid, "returncode": s["proc"].returncode, "started": s["started"]}
+                for key, s in self.scripts.items()
+            }
+
+    def start(self, params):
+        key = params["key"]
+        cmd = [sys.executable, params["script"]] if params.get("kind", "py") == "py" else ["node", params["script"]]
+        with self.lock:
+            old = self.scripts.get(key)
+            if old and old["exited_at"] is None and old["proc"].poll() is None:
+                raise ValueError(f"{key} is already running (PID {old['proc'].pid})")
+            log_file = open(params["log_path"], "a", encoding="utf-8", errors="ignore")
+            log_file.truncate(0)
+            try:
+                proc = subprocess.Popen(
+                    cmd, cwd=params["cwd"], stdout=log_file, stderr=log_file,
+                    stdin=subprocess.PIPE, start_new_session=True
+                )
+            except Exception:
+                log_file.close()
+                raise
+            self.scripts[key] = {"proc": proc, "log_file": log_file, "log_path": params["log_path"],
+                                 "started": time.time(), "exited_at": None}
+        return {"pid": proc.pid}
+
+    def stop(self, params):
+        """SIGTERM all requested trees, one shared deadline, then SIGKILL."""
+        with self.lock:
+            targets = [self.scripts[k] for k in params.get("keys", []) if k in self.scripts]
+        procs = []
+        for s in targets:
+            try:
+                parent = psutil.Process(s["proc"].pid)
+                procs.extend(parent.children(recursive=True))
+                procs.append(parent)
+            except psutil.Error:
+                pass
+        for p in procs:
+            try:
+                p.terminate()
+            except psutil.Error:
+                pass
+        alive = _wait_until_gone(procs, float(params.get("timeout", 3)))
+        for p in alive:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        for s in targets:
+            try:
+                s["proc"].wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+        return {"stopped": len(targets), "killed": len(alive)}
+
+    def send_signal(self, params):
+        with self.lock:
+            s = self.scripts.get(params["key"])
+        if not s or s["proc"].poll() is not None:
+            raise KeyError(params["key"])
+        s["proc"].send_signal(int(params["signal"]))
+        return {"ok": True}
+
+    def send_input(self, params):
+        with self.lock:
+            s = self.scripts.get(params["key"])
+        if not s or s["proc"].poll() is not None:
+            raise KeyError(params["key"])
+        fd = s["proc"].stdin.fileno()
+        os.set_blocking(fd, False)  # a script that never reads must not hang this request
+        try:
+            os.write(fd, (params["text"].rstrip("\n") + "\n").encode("utf-8"))
+        except BlockingIOError:
+            raise ValueError("script isn't reading its input (pipe is full)")
+        return {"ok": True}
+
+    def logs(self, params):
+        with self.lock:
+            s = self.scripts.get(params["key"])
+        if not s:
+            raise KeyError(params["key"])
+        tail = int(params.get("tail", 3500))
+        with open(s["log_path"], "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - tail))
+            return {"text": f.read().decode("utf-8", "ignore")}
+
+
+def make_handler(agent: Agent, token: str):
+    routes = {
+        ("GET", "/status"): agent.status,
+        ("GET", "/scripts"): agent.list_scripts,
+        ("GET", "/logs"): agent.logs,
+        ("POST", "/start"): agent.start,
+        ("POST", "/stop"): agent.stop,
+        ("POST", "/signal"): agent.send_signal,
+        ("POST", "/input"): agent.send_input,
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, method):
+            url = urlparse(self.path)
+            if not hmac.compare_digest(self.headers.get("X-Worker-Token", ""), token):
+                return self._send_json({"error": "unauthorized"}, 401)
+            fn = routes.get((method, url.path))
+            if fn is None:
+                return self._send_json({"error": "not found"}, 404)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                params.update(json.loads(self.rfile.read(length)))
+            try:
+                self._send_json(fn(params))
+            except KeyError as e:
+                self._send_json({"error": f"unknown script {e}"}, 404)
+            except Exception as e:
+                self._send_json({"error": repr(e)}, 400)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9101)
+    ap.add_argument("--name", default=None, help="node name shown to admins (default host:port)")
+    ap.add_argument("--token", default=os.environ.get("WORKER_TOKEN", ""))
+    args = ap.parse_args()
+    if not args.token:
+        sys.exit("WORKER_TOKEN (or --token) is required")
+
+    agent = Agent(args.name or f"{args.host}:{args.port}")
+    threading.Thread(target=agent.supervise, daemon=True, name="worker-supervisor").start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(agent, args.token))
+    server.daemon_threads = True
+
+    def shutdown(signum, frame):
+        # Scripts die with their worker, like they do with a local bot.py.
+        with agent.lock:
+            keys = list(agent.scripts)
+        agent.stop({"keys": keys, "timeout": 5})
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"worker {agent.name} listening on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
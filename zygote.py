@@ -0,0 +1,187 @@
+"""
+Fork-server ("zygote") for fast Python script starts.
+
+The zygote imports the heavy libraries hosted scripts usually need once, then
+forks a child per script. Children share the preloaded modules copy-on-write
+and skip interpreter startup and those imports entirely.
+
+Server:  python zygote.py <socket_path>
+Client:  spawn(socket_path, script, cwd, stdin_fd, out_fd, env) -> pid
+
+Protocol (AF_UNIX stream): the client sends one JSON line
+{"script", "cwd", "env"} together with two fds (stdin, stdout/stderr) via
+SCM_RIGHTS; the zygote answers {"pid": ...} or {"error": ...}.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import runpy
+import traceback
+import importlib
+import subprocess
+
+DEFAULT_PRELOAD = "telebot,requests,bs4"
+
+
+def preload(modules):
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+def _recv_request(conn):
+    data, fds, _, _ = socket.recv_fds(conn, 1 << 16, 2)
+    while not data.endswith(b"\n"):
+        more = conn.recv(1 << 16)
+        if not more:
+            break
+        data += more
+    return json.loads(data), fds
+
+
+def _run_child(req, fds, listener, conn):
+    """Runs in the forked child; never returns."""
+    code = 1
+    try:
+        listener.close()
+        conn.close()
+        os.setsid()
+        for sig in (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGPIPE):
+            signal.signal(sig, signal.SIG_DFL)
+
+        stdin_fd, out_fd = fds
+        os.dup2(stdin_fd, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(out_fd, 2)
+        os.closerange(3, os.sysconf("SC_OPEN_MAX") if hasattr(os, "sysconf") else 1024)
+
+        os.chdir(req["cwd"])
+        os.environ.clear()
+        os.environ.update(req["env"])
+
+        sys.stdin = open(0, "r", encoding="utf-8", errors="ignore", closefd=False)
+        sys.stdout = open(1, "w", encoding="utf-8", errors="ignore", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", encoding="utf-8", errors="ignore", buffering=1, closefd=False)
+
+        script = req["script"]
+        sys.argv = [script]
+        sys.path[0] = os.path.dirname(os.path.abspath(script))
+        try:
+            runpy.run_path(script, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code)
+
+
+def serve(socket_path, modules):
+    loaded = preload(modules)
+    # Auto-reap children; the controller tracks them by pid.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    try:
+        os.remove(socket_path)
+    except FileNotFoundError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path + ".tmp")
+    os.chmod(socket_path + ".tmp", 0o600)
+    listener.listen(64)
+    # Only appear at socket_path once we're ready to accept.
+    os.replace(socket_path + ".tmp", socket_path)
+    print(f"zygote ready on {socket_path}, preloaded: {', '.join(loaded) or 'nothing'}", flush=True)
+
+    while True:
+        conn, _ = listener.accept()
+        fds = []
+        try:
+            req, fds = _recv_request(conn)
+            if len(fds) != 2:
+                raise ValueError("expected 2 fds (stdin, output)")
+            pid = os.fork()
+            if pid == 0:
+                _run_child(req, fds, listener, conn)
+            conn.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+        except Exception as e:
+            try:
+                conn.sendall(json.dumps({"error": repr(e)}).encode() + b"\n")
+            except Exception:
+                pass
+        finally:
+            for fd in fds:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            conn.close()
+
+
+# --- client side ---
+def start_server(socket_path, log_path=None, preload_modules=None, timeout=60):
+    """Launch a zygote process and wait until its socket is accepting."""
+    try:
+        os.remove(socket_path)
+    except FileNotFoundError:
+        pass
+    env = dict(os.environ)
+    if preload_modules is not None:
+        env["ZYGOTE_PRELOAD"] = ",".join(preload_modules)
+    out = open(log_path, "a") if log_path else subprocess.DEVNULL
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), socket_path],
+        stdout=out, stderr=out, stdin=subprocess.DEVNULL, env=env, start_new_session=True
+    )
+    if log_path:
+        out.close()
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(socket_path):
+        if proc.poll() is not None:
+            raise RuntimeError(f"zygote exited with code {proc.returncode}")
+        if time.monotonic() > deadline:
+            proc.kill()
+            raise TimeoutError("zygote did not become ready")
+        time.sleep(0.02)
+    return proc
+
+
+def spawn(socket_path, script, cwd, stdin_fd, out_fd, env=None, timeout=10):
+    """Ask the zygote to fork `script`; returns the child's pid."""
+    payload = json.dumps({"script": script, "cwd": cwd, "env": dict(os.environ if env is None else env)})
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        socket.send_fds(s, [payload.encode() + b"\n"], [stdin_fd, out_fd])
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    resp = json.loads(data or b"{}")
+    if "pid" not in resp:
+        raise RuntimeError(resp.get("error", "no response from zygote"))
+    return resp["pid"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python zygote.py <socket_path>")
+    mods = [m.strip() for m in os.environ.get("ZYGOTE_PRELOAD", DEFAULT_PRELOAD).split(",") if m.strip()]
+    serve(sys.argv[1], mods)